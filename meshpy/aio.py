@@ -0,0 +1,160 @@
+"""Coroutines for running the mesh generators from :mod:`asyncio` code."""
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from functools import partial
+
+from meshpy.common import MeshingAbortedError
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# per event loop: (limiter for all builds, limiter for TetGen builds)
+_limiters = weakref.WeakKeyDictionary()
+
+
+def get_max_workers():
+    """Return the number of meshing calls that may run at the same time,
+    which is the number of CPUs.
+    """
+    return os.cpu_count() or 1
+
+
+def _get_executor():
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _executor = ThreadPoolExecutor(
+                    max_workers=get_max_workers(),
+                    thread_name_prefix="meshpy")
+        return _executor
+
+
+def _get_limiters(loop):
+    try:
+        return _limiters[loop]
+    except KeyError:
+        max_workers = get_max_workers()
+        # TetGen builds leave one slot for quick Triangle builds
+        result = _limiters[loop] = (
+                asyncio.Semaphore(max_workers),
+                asyncio.Semaphore(max(1, max_workers - 1)))
+        return result
+
+
+class _Cancellation:
+    """A progress callback for one build, which stops the mesh generator
+    with :exc:`~meshpy.common.MeshingAbortedError` once :meth:`cancel` has
+    been called, and otherwise passes the reports on to *progress*.
+    """
+
+    def __init__(self, progress):
+        self.progress = progress
+        self.cancelled = False
+        self.start = time.monotonic()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def __call__(self, phase, points, elements, bad_elements):
+        if self.cancelled:
+            raise MeshingAbortedError(
+                    f"meshing cancelled during {phase}", "cancelled", {
+                        "phase": phase,
+                        "points": points,
+                        "elements": elements,
+                        "bad_elements": bad_elements,
+                        "elapsed": time.monotonic() - self.start,
+                        })
+
+        if self.progress is not None:
+            self.progress(phase, points, elements, bad_elements)
+
+
+async def _run(func, limiters, executor, cancellation):
+    loop = asyncio.get_running_loop()
+    if executor is None:
+        executor = _get_executor()
+
+    acquired = []
+    try:
+        for limiter in limiters:
+            await limiter.acquire()
+            acquired.append(limiter)
+
+        future = executor.submit(func)
+    except BaseException:
+        for limiter in acquired:
+            limiter.release()
+        raise
+
+    def release(_future):
+        # The slots stay taken until the native call has actually returned,
+        # even if the awaiting coroutine was cancelled before.
+        def release_all():
+            for limiter in acquired:
+                limiter.release()
+
+        try:
+            loop.call_soon_threadsafe(release_all)
+        except RuntimeError:
+            # event loop closed
+            pass
+
+    future.add_done_callback(release)
+
+    # Cancelling this removes the call from the executor's queue if it has
+    # not started yet. A call that has started is stopped by cancellation.
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        cancellation.cancel()
+        raise
+
+
+async def build(mesh_info, executor=None, **kwargs):
+    """Mesh *mesh_info* like :func:`meshpy.triangle.build` or
+    :func:`meshpy.tet.build`, depending on whether it is a
+    :class:`meshpy.triangle.MeshInfo` or a :class:`meshpy.tet.MeshInfo`,
+    without blocking the event loop. *kwargs* are passed on to ``build``.
+
+    :arg executor: a :class:`concurrent.futures.Executor` to run the call
+        in. Defaults to a shared thread pool with one thread per CPU.
+
+    At most :func:`get_max_workers` builds run at the same time, and
+    TetGen builds leave one of those slots for Triangle builds, so that
+    small requests are still served while large 3D meshes are being
+    generated. Further calls wait their turn.
+
+    The mesh generators run with the global interpreter lock released,
+    unless a Python *refinement_func* is given. If the coroutine is
+    cancelled before the mesh generator has started, the call is
+    dropped. A call that is already running is stopped at its next
+    progress report (see the *progress* argument of ``build``), and keeps
+    its slot until it has returned.
+    """
+    from meshpy import tet, triangle
+
+    cancellation = _Cancellation(kwargs.pop("progress", None))
+    kwargs["progress"] = cancellation
+
+    if isinstance(mesh_info, tet.MeshInfo):
+        func = partial(tet.build, mesh_info, **kwargs)
+        heavy = True
+    elif isinstance(mesh_info, triangle.MeshInfo):
+        func = partial(triangle.build, mesh_info, **kwargs)
+        heavy = False
+    else:
+        raise TypeError(
+                f"expected a triangle or tet MeshInfo, not "
+                f"'{type(mesh_info).__name__}'")
+
+    all_limiter, tet_limiter = _get_limiters(asyncio.get_running_loop())
+    limiters = [tet_limiter, all_limiter] if heavy else [all_limiter]
+    return await _run(func, limiters, executor, cancellation)
@@ -0,0 +1,361 @@
+"""Meshing many independent geometries in worker processes."""
+
+import os
+import sys
+import time
+
+
+class BuildJob:
+    """A geometry to be meshed by :func:`build_many`, along with the
+    arguments for :func:`meshpy.triangle.build` or :func:`meshpy.tet.build`.
+
+    :arg points: an array of shape *(npoints, dim)*. Two-dimensional points
+        are meshed with Triangle, three-dimensional ones with TetGen.
+    :arg facets: the facets, as passed to the ``set_facets`` method of
+        :class:`meshpy.triangle.MeshInfo` or :class:`meshpy.tet.MeshInfo`.
+    :arg build_kwargs: keyword arguments for ``build``. For TetGen,
+        *options* may be given as a switch string. All arguments, including
+        any *refinement_func*, must be picklable.
+    """
+
+    def __init__(self, points, facets, holes=None, regions=None,
+            point_markers=None, facet_markers=None, **build_kwargs):
+        self.points = points
+        self.facets = facets
+        self.holes = holes
+        self.regions = regions
+        self.point_markers = point_markers
+        self.facet_markers = facet_markers
+        self.build_kwargs = build_kwargs
+
+    @property
+    def dimensions(self):
+        import numpy as np
+        return np.shape(self.points)[-1]
+
+    def build(self):
+        """Mesh the geometry in the current process and return the
+        resulting :class:`~meshpy.triangle.MeshInfo` or
+        :class:`~meshpy.tet.MeshInfo`.
+        """
+        build_kwargs = dict(self.build_kwargs)
+
+        if self.dimensions == 2:
+            from meshpy import triangle as mod
+        elif self.dimensions == 3:
+            from meshpy import tet as mod
+            if isinstance(build_kwargs.get("options"), str):
+                build_kwargs["options"] = mod.Options(build_kwargs["options"])
+        else:
+            raise ValueError("points must be two- or three-dimensional")
+
+        mesh_info = mod.MeshInfo()
+        mesh_info.set_points(self.points, self.point_markers)
+        mesh_info.set_facets(self.facets, self.facet_markers)
+        if self.holes is not None:
+            mesh_info.set_holes(self.holes)
+        if self.regions is not None:
+            mesh_info.set_regions(self.regions)
+
+        return mod.build(mesh_info, **build_kwargs)
+
+
+class BuildResult:
+    """The outcome of one :class:`BuildJob` in :func:`build_many`.
+
+    .. attribute:: index
+
+        The position of the job in the sequence passed to
+        :func:`build_many`.
+
+    .. attribute:: arrays
+
+        A :class:`dict` mapping names of output arrays of the mesh (such
+        as ``"points"``, ``"elements"``, ``"faces"`` or ``"neighbors"``) to
+        :mod:`numpy` arrays, or *None* if the job failed. Arrays that were
+        not generated are omitted.
+
+    .. attribute:: error
+
+        *None* on success. Otherwise the exception raised by the job, a
+        :exc:`TimeoutError`, or a :exc:`WorkerCrashedError`.
+    """
+
+    def __init__(self, index, arrays=None, error=None):
+        self.index = index
+        self.arrays = arrays
+        self.error = error
+
+    def __repr__(self):
+        status = "ok" if self.error is None else repr(self.error)
+        return f"{type(self).__name__}({self.index}, {status})"
+
+
+class WorkerCrashedError(RuntimeError):
+    """Raised (as :attr:`BuildResult.error`) if the worker process running
+    a job terminated, e.g. because the mesh generator called ``exit()`` or
+    crashed.
+    """
+
+
+_OUTPUT_ARRAYS = [
+        "points", "point_attributes", "point_markers",
+        "elements", "element_attributes", "neighbors",
+        "faces", "face_markers", "adjacent_elements",
+        "edges", "edge_markers",
+        ]
+
+
+# {{{ shared memory transfer
+
+def _to_shared_memory(arrays):
+    """Copy *arrays* into a new block of shared memory. Return its name and
+    a layout description for :func:`_from_shared_memory`.
+    """
+    from multiprocessing import shared_memory
+
+    import numpy as np
+
+    layout = []
+    offset = 0
+    for name, ary in arrays.items():
+        layout.append((name, ary.dtype.str, ary.shape, offset))
+        offset += -(-ary.nbytes // 16) * 16
+
+    # The receiving process takes over the block and unlinks it, so it must
+    # not be tracked (and unlinked at exit) by this process.
+    size = max(offset, 1)
+    if sys.version_info >= (3, 13):
+        shm = shared_memory.SharedMemory(create=True, size=size, track=False)
+    else:
+        shm = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        for name, dtype, shape, offset in layout:
+            np.ndarray(shape, dtype, buffer=shm.buf, offset=offset)[...] = \
+                    arrays[name]
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+
+    if sys.version_info < (3, 13):
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    shm.close()
+
+    return shm.name, layout
+
+
+def _from_shared_memory(shm_name, layout):
+    from multiprocessing import shared_memory
+
+    import numpy as np
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        return {
+                name: np.ndarray(shape, dtype, buffer=shm.buf, offset=offset).copy()
+                for name, dtype, shape, offset in layout}
+    finally:
+        shm.close()
+        shm.unlink()
+
+# }}}
+
+
+# {{{ worker
+
+_JOB_STARTED = "started"
+
+
+def _worker_main(conn):
+    import numpy as np
+
+    # part of the worker's startup, not of its first job
+    import meshpy.tet  # ruff: ignore[unused-import]
+    import meshpy.triangle  # ruff: ignore[unused-import]
+
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+        if msg is None:
+            break
+
+        index, job = msg
+        conn.send(_JOB_STARTED)
+        try:
+            mesh = job.build()
+            arrays = {}
+            for name in _OUTPUT_ARRAYS:
+                ary = getattr(mesh, name, None)
+                if (ary is not None and ary.allocated
+                        and len(ary) and ary.unit):
+                    arrays[name] = np.array(ary)
+
+            conn.send((index, _to_shared_memory(arrays), None))
+        except Exception as e:  # ruff: ignore[blind-except]
+            import pickle
+            try:
+                pickle.dumps(e)
+            except Exception:  # ruff: ignore[blind-except]
+                e = RuntimeError(f"{type(e).__name__}: {e}")
+            conn.send((index, None, e))
+
+
+class _Worker:
+    def __init__(self, mp_context):
+        self.conn, child_conn = mp_context.Pipe()
+        self.process = mp_context.Process(
+                target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+        self.index = None
+        self.timeout = None
+        self.deadline = None
+
+    def submit(self, index, job, timeout):
+        self.conn.send((index, job))
+        self.index = index
+        self.timeout = timeout
+        # The deadline starts once the worker has picked up the job, so that
+        # the startup of a fresh worker does not count against it.
+        self.deadline = None
+
+    def receive(self):
+        """Return the result of the current job, or *None* if the message
+        received only acknowledged the job.
+        """
+        msg = self.conn.recv()
+        if msg == _JOB_STARTED:
+            if self.timeout is not None:
+                self.deadline = time.monotonic() + self.timeout
+            return None
+        return msg
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+
+        # release the shared memory of a result that was not received
+        try:
+            while self.conn.poll():
+                msg = self.conn.recv()
+                if msg == _JOB_STARTED:
+                    continue
+                _, shm_info, _ = msg
+                if shm_info is not None:
+                    _from_shared_memory(*shm_info)
+        except (EOFError, OSError):
+            pass
+
+        self.conn.close()
+
+    def shutdown(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+# }}}
+
+
+def build_many(jobs, max_workers=None, timeout=None, mp_context=None):
+    """Mesh each of *jobs*, a sequence of :class:`BuildJob` instances,
+    in a pool of worker processes.
+
+    :arg max_workers: the number of worker processes. Defaults to the
+        number of CPUs.
+    :arg timeout: the maximum time in seconds a single job may run,
+        counted from when a worker starts on it (and so excluding the
+        startup of the worker). A worker exceeding it is killed and
+        replaced.
+    :arg mp_context: a :mod:`multiprocessing` context used to start the
+        workers.
+    :returns: a generator of :class:`BuildResult` objects, in the order in
+        which the jobs complete.
+
+    Each job runs in a separate process, so that a mesh generator
+    terminating its process (as Triangle does on fatal errors) or
+    crashing only fails that job. Its worker is then replaced. The
+    output arrays are handed back through shared memory rather than
+    being pickled. Closing the generator terminates the workers.
+    """
+    from multiprocessing.connection import wait
+
+    if mp_context is None:
+        import multiprocessing
+        mp_context = multiprocessing.get_context()
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1")
+
+    pending = list(enumerate(jobs))
+    pending.reverse()
+    idle = []
+    busy = []
+
+    try:
+        while pending or busy:
+            while pending and len(busy) < max_workers:
+                worker = idle.pop() if idle else _Worker(mp_context)
+                index, job = pending.pop()
+                worker.submit(index, job, timeout)
+                busy.append(worker)
+
+            deadlines = [w.deadline for w in busy if w.deadline is not None]
+            wait_timeout = (
+                    max(0, min(deadlines) - time.monotonic())
+                    if deadlines else None)
+
+            ready = wait(
+                    [w.conn for w in busy] + [w.process.sentinel for w in busy],
+                    wait_timeout)
+
+            for worker in list(busy):
+                if worker.conn in ready:
+                    try:
+                        msg = worker.receive()
+                    except EOFError:
+                        pass
+                    else:
+                        if msg is None:
+                            continue
+                        index, shm_info, error = msg
+                        busy.remove(worker)
+                        idle.append(worker)
+                        yield BuildResult(index,
+                                arrays=(None if shm_info is None
+                                    else _from_shared_memory(*shm_info)),
+                                error=error)
+                        continue
+
+                if worker.process.sentinel in ready or worker.conn in ready:
+                    worker.process.join()
+                    busy.remove(worker)
+                    worker.conn.close()
+                    yield BuildResult(worker.index, error=WorkerCrashedError(
+                        f"worker exited with code {worker.process.exitcode}"))
+
+                elif (worker.deadline is not None
+                        and time.monotonic() >= worker.deadline):
+                    busy.remove(worker)
+                    worker.kill()
+                    yield BuildResult(worker.index, error=TimeoutError(
+                        f"job exceeded the time limit of {timeout} s"))
+
+    finally:
+        for worker in busy:
+            worker.kill()
+        for worker in idle:
+            worker.shutdown()
+
+# vim: foldmethod=marker
@@ -1,3 +1,121 @@
+import threading
+from contextlib import contextmanager
+
+
+_locale_lock = threading.Lock()
+_locale_users = 0
+_prev_numeric_locale = None
+
+
+@contextmanager
+def c_numeric_locale():
+    """Switch to the "C" numeric locale for the duration of the block, so
+    that the mesh generators do not mis-parse switches like "a0.01".
+
+    Meshing calls may overlap in several threads. The locale is switched
+    by the first of them and restored by the last.
+    """
+    global _locale_users, _prev_numeric_locale
+
+    try:
+        import locale
+    except ImportError:
+        yield
+        return
+
+    with _locale_lock:
+        if _locale_users == 0:
+            _prev_numeric_locale = locale.getlocale(locale.LC_NUMERIC)
+            locale.setlocale(locale.LC_NUMERIC, "C")
+        _locale_users += 1
+
+    try:
+        yield
+    finally:
+        with _locale_lock:
+            _locale_users -= 1
+            if _locale_users == 0:
+                # restore previous locale
+                locale.setlocale(locale.LC_NUMERIC, _prev_numeric_locale)
+
+
+class MeshingAbortedError(RuntimeError):
+    """Raised if a mesh generator was stopped because a limit such as
+    *deadline* or *max_elements* was exceeded.
+
+    .. attribute:: reason
+
+        The name of the limit that was exceeded, e.g. ``"deadline"`` or
+        ``"max_elements"``.
+
+    .. attribute:: progress
+
+        A :class:`dict` describing the state of the mesh when meshing was
+        stopped, with the keys ``"phase"`` (such as ``"refinement"``),
+        ``"points"``, ``"elements"``, ``"bad_elements"`` (the number of
+        elements queued for refinement) and ``"elapsed"`` (in seconds).
+    """
+
+    def __init__(self, message, reason, progress):
+        super().__init__(message)
+        self.reason = reason
+        self.progress = progress
+
+    def __reduce__(self):
+        return type(self), (str(self), self.reason, self.progress)
+
+
+class BuildStats:
+    """Statistics gathered by the mesh generator during one meshing call,
+    available as the *stats* attribute of the returned mesh.
+
+    .. attribute:: phase_times
+
+        A :class:`dict` mapping the names of the phases of meshing that were
+        run, such as ``"delaunay"``, ``"refinement"`` or ``"output"``, to
+        their wall times in seconds, in the order they were run.
+
+    .. attribute:: counts
+
+        A :class:`dict` with the numbers of ``"points"``, ``"elements"`` and
+        ``"steiner_points"`` (the points added by the mesh generator) in the
+        output. For TetGen, it also holds the numbers of Steiner points
+        ``"steiner_points_on_segments"``, ``"steiner_points_on_facets"``
+        and ``"steiner_points_in_volume"`` and the numbers of flips
+        ``"flips_23"``, ``"flips_32"`` and ``"flips_44"``.
+
+    .. attribute:: peak_pool_items
+
+        A :class:`dict` mapping the names of the mesh generator's memory
+        pools, such as ``"tetrahedrons"`` or ``"triangles"``, to the
+        largest number of items each held at the same time.
+
+    .. attribute:: peak_pool_bytes
+
+        Like :attr:`peak_pool_items`, but in bytes.
+
+    .. attribute:: total_time
+
+        The sum of :attr:`phase_times`.
+    """
+
+    def __init__(self, phase_times, counts, peak_pool_items, peak_pool_bytes):
+        self.phase_times = phase_times
+        self.counts = counts
+        self.peak_pool_items = peak_pool_items
+        self.peak_pool_bytes = peak_pool_bytes
+
+    @property
+    def total_time(self):
+        return sum(self.phase_times.values())
+
+    def __repr__(self):
+        return (f"{type(self).__name__}(phase_times={self.phase_times!r}, "
+                f"counts={self.counts!r}, "
+                f"peak_pool_items={self.peak_pool_items!r}, "
+                f"peak_pool_bytes={self.peak_pool_bytes!r})")
+
+
 class _Table:
     def __init__(self):
         self.Rows = []
@@ -32,6 +150,9 @@ def _linebreak_list(list, per_line=10, pad=None):
 
 
 class MeshInfoBase:
+    # a BuildStats for meshes returned by the mesh generators
+    stats = None
+
     @property
     def face_vertex_indices_to_face_marker(self):
         try:
@@ -45,24 +166,41 @@ class MeshInfoBase:
             self._fvi2fm = result
             return result
 
+    @property
+    def nbytes(self):
+        """The number of bytes of memory held by the arrays of the mesh."""
+        return sum(self.nbytes_by_array().values())
+
+    def nbytes_by_array(self):
+        """Return a :class:`dict` mapping the names of the arrays of the
+        mesh, such as ``"points"`` or ``"elements"``, to the number of bytes
+        of memory each holds.
+        """
+        return {name: getattr(self, name).nbytes for name in self._constituents}
+
     def set_points(self, points, point_markers=None):
+        """Set the input points (and, optionally, their markers).
+
+        :param points: an array-like of shape *(N, dim)*. Contiguous
+            :mod:`numpy` arrays of the right data type are copied into
+            the mesh generator's storage in bulk.
+        """
         if point_markers is not None:
             assert len(point_markers) == len(points)
 
-        self.points.resize(len(points))
-
-        for i, pt in enumerate(points):
-            self.points[i] = pt
+        self.points.assign(points)
 
         if point_markers is not None:
-            self.point_markers.setup()
-            for i, mark in enumerate(point_markers):
-                self.point_markers[i] = mark
+            self.point_markers.assign(point_markers)
 
     def set_holes(self, hole_starts):
-        self.holes.resize(len(hole_starts))
-        for i, hole in enumerate(hole_starts):
-            self.holes[i] = hole
+        self.holes.assign(hole_starts)
+
+    def set_regions(self, regions):
+        """Set region attribute/constraint records, each of the form
+        *(x, y, [z,] attribute, max_volume)*.
+        """
+        self.regions.assign(regions)
 
     def write_neu(self, outfile, bc=None, periodicity=None,
             description="MeshPy Output"):
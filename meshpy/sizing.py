@@ -0,0 +1,110 @@
+import numpy as np
+
+import meshpy._internals as internals
+
+
+class GridSizeField(internals.GridSizeField):
+    """A sizing field given by samples on a regular grid.
+
+    :arg values: a 2D or 3D array of element size bounds (maximum triangle
+        area in 2D, maximum tetrahedron volume in 3D) at the grid nodes.
+        Axis *i* of *values* runs along coordinate *i*.
+    :arg origin: coordinates of the grid node ``values[0, 0(, 0)]``.
+    :arg spacing: distance between grid nodes along each axis, either one
+        number per axis or a single number for all axes.
+
+    The field is interpolated multilinearly between grid nodes and is
+    constant beyond the boundary of the grid. Pass an instance as
+    *refinement_func* to :func:`meshpy.triangle.build`,
+    :func:`meshpy.triangle.refine` or :func:`meshpy.tet.build`. An element
+    is refined if its area (volume) exceeds the value of the field at
+    its centroid. The field is evaluated in compiled code, without calling
+    back into Python.
+    """
+
+    def __init__(self, values, origin, spacing):
+        values = np.asarray(values, dtype=np.float64)
+        spacing = np.broadcast_to(
+                np.asarray(spacing, dtype=np.float64), (values.ndim,))
+        internals.GridSizeField.__init__(self, values, origin, spacing)
+
+
+def _is_cffi_cdata(obj):
+    return type(obj).__module__ == "_cffi_backend"
+
+
+def _get_address(obj):
+    import ctypes
+
+    if isinstance(obj, int):
+        return obj
+    if _is_cffi_cdata(obj):
+        # cffi pointers, arrays and function pointers
+        import cffi
+        return int(cffi.FFI().cast("uintptr_t", obj))
+    if isinstance(obj, ctypes._CFuncPtr):
+        return ctypes.cast(obj, ctypes.c_void_p).value
+    if isinstance(obj, ctypes._SimpleCData | ctypes.Structure | ctypes.Array):
+        return ctypes.addressof(obj)
+
+    # numba.cfunc
+    address = getattr(obj, "address", None)
+    if isinstance(address, int):
+        return address
+
+    # numpy arrays
+    array_ctypes = getattr(obj, "ctypes", None)
+    if array_ctypes is not None and isinstance(
+            getattr(array_ctypes, "data", None), int):
+        return array_ctypes.data
+
+    raise TypeError(f"cannot determine the address of '{type(obj).__name__}'")
+
+
+class CRefinementFunction(internals.CRefinementFunction):
+    """A compiled Triangle refinement function with the signature::
+
+        int func(double *org, double *dest, double *apex, double area,
+                 void *user_data)
+
+    It returns nonzero if the triangle with vertices *org*, *dest* and
+    *apex* (each pointing to two coordinates) and area *area* is too large.
+
+    :arg func: the function, as a :mod:`ctypes` or :mod:`cffi` function
+        pointer, a :func:`numba.cfunc`, or its address as an :class:`int`.
+    :arg user_data: passed to *func* unchanged. May be an :class:`int`
+        address, a :mod:`ctypes` object, a :mod:`cffi` pointer or array or a
+        :mod:`numpy` array. A reference to it is kept for the lifetime of
+        this object.
+
+    Pass an instance as *refinement_func* to :func:`meshpy.triangle.build` or
+    :func:`meshpy.triangle.refine`. The function is called directly from
+    Triangle with the global interpreter lock released, so it must not
+    call into Python.
+    """
+
+    def __init__(self, func, user_data=None):
+        self._func = func
+        self._user_data = user_data
+        internals.CRefinementFunction.__init__(self,
+                _get_address(func),
+                0 if user_data is None else _get_address(user_data))
+
+
+def _as_native_refinement_func(func):
+    """Wrap *func* in a :class:`CRefinementFunction` if it is a compiled
+    function (:mod:`ctypes` or :mod:`cffi` function pointer or
+    :func:`numba.cfunc`). Otherwise, return it unchanged.
+    """
+    import ctypes
+
+    if isinstance(func, ctypes._CFuncPtr) or (
+            isinstance(getattr(func, "address", None), int)
+            and hasattr(func, "ctypes")):
+        return CRefinementFunction(func)
+    if _is_cffi_cdata(func):
+        import cffi
+        if cffi.FFI().typeof(func).kind == "function":
+            return CRefinementFunction(func)
+
+    return func
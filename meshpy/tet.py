@@ -1,8 +1,29 @@
+from typing import ClassVar
+
 import meshpy._internals as internals
-from meshpy.common import MeshInfoBase, dump_array
+from meshpy.common import (
+    BuildStats,
+    MeshInfoBase,
+    MeshingAbortedError,  # ruff: ignore[unused-import]
+    c_numeric_locale,
+    dump_array,
+)
 
 
 class MeshInfo(internals.TetMeshInfo, MeshInfoBase):
+    _constituents: ClassVar[list[str]] = [
+            "points", "point_attributes", "point_metric_tensors",
+            "point_markers",
+            "elements", "element_attributes", "element_volumes",
+            "neighbors",
+            "facets", "facet_markers",
+            "holes",
+            "regions",
+            "facet_constraints", "segment_constraints",
+            "faces", "adjacent_elements", "face_markers",
+            "edges", "edge_markers", "edge_adjacent_elements",
+            ]
+
     def set_facets(self, facets, markers=None):
         """Set a list of simple, single-polygon factes. Unlike :meth:`set_facets_ex`,
         :meth:`set_facets` does not allow hole and only lets you use a single
@@ -18,9 +39,19 @@ class MeshInfo(internals.TetMeshInfo, MeshInfoBase):
           also accepted instead.
         """
 
-        if markers:
+        if markers is not None and len(markers):
             assert len(markers) == len(facets)
 
+        import numpy as np
+        if isinstance(facets, np.ndarray) and facets.ndim == 2:
+            # triangle (or quad, ...) soup: skip the per-facet Python loop
+            nfacets, nvertices = facets.shape
+            self.set_facets_csr(
+                    facets.reshape(-1),
+                    np.arange(0, nfacets*nvertices + 1, nvertices, dtype=np.int32),
+                    markers=markers)
+            return
+
         self.facets.resize(len(facets))
 
         for i, vlist in enumerate(facets):
@@ -32,10 +63,8 @@ class MeshInfo(internals.TetMeshInfo, MeshInfoBase):
             for j, pt_idx in enumerate(vlist):
                 poly.vertices[j] = pt_idx
 
-        if markers:
-            self.facet_markers.setup()
-            for i, mark in enumerate(markers):
-                self.facet_markers[i] = mark
+        if markers is not None and len(markers):
+            self.facet_markers.assign(markers)
 
     def set_facets_ex(self, facets, facet_holestarts=None, markers=None):
         """Set a list of complicated factes. Unlike :meth:`set_facets`,
@@ -85,9 +114,45 @@ class MeshInfo(internals.TetMeshInfo, MeshInfoBase):
                         facet_holes[i_hole, i_coordinate] = co_value
 
         if markers:
-            self.facet_markers.setup()
-            for i, mark in enumerate(markers):
-                self.facet_markers[i] = mark
+            self.facet_markers.assign(markers)
+
+    def set_facets_csr(self, vertex_indices, polygon_offsets,
+            facet_offsets=None, facet_holes=None, facet_hole_offsets=None,
+            markers=None):
+        """Set facets from flat arrays in compressed sparse row (CSR) form.
+        The facet data structures are built natively, without visiting
+        each facet from Python.
+
+        :param vertex_indices: a 1D integer array of point indices of all
+            polygons, concatenated. They must refer to points already set
+            with :meth:`set_points`.
+        :param polygon_offsets: a 1D integer array of length
+            *npolygons + 1*. The vertices of polygon *i* are
+            ``vertex_indices[polygon_offsets[i]:polygon_offsets[i+1]]``.
+        :param facet_offsets: a 1D integer array of length *nfacets + 1*.
+            Facet *i* consists of polygons *facet_offsets[i]* through
+            *facet_offsets[i+1]-1*. If *None*, each polygon forms its own
+            facet.
+        :param facet_holes: Either None or an array of shape *(nholes, 3)*
+            of hole starting points for all facets, concatenated.
+        :param facet_hole_offsets: a 1D integer array of length
+            *nfacets + 1* indicating which entries of *facet_holes* belong
+            to which facet. Required if *facet_holes* is given.
+        :param markers: Either None or a list of integers of the same
+            length as the number of facets.
+        """
+        import numpy as np
+
+        polygon_offsets = np.asarray(polygon_offsets, dtype=np.int32)
+        if facet_offsets is None:
+            facet_offsets = np.arange(len(polygon_offsets), dtype=np.int32)
+
+        internals.TetMeshInfo.set_facets_csr(self,
+                facet_offsets, polygon_offsets, vertex_indices,
+                facet_hole_offsets, facet_holes)
+
+        if markers is not None:
+            self.facet_markers.assign(markers)
 
     def dump(self):
         for name in ["points"]:
@@ -108,10 +173,44 @@ class MeshInfo(internals.TetMeshInfo, MeshInfoBase):
         vtkelements.tofile(filename)
 
     def set_elements(self, elements):
-        self.elements.resize(len(elements))
+        self.elements.assign(elements)
 
-        for i, element in enumerate(elements):
-            self.elements[i] = element
+    def set_point_metric_tensors(self, metrics):
+        """Set the desired local mesh size at each input point, for use with
+        :func:`build`'s *metric* argument (TetGen's ``-m`` switch).
+
+        :param metrics: an array of shape *(N,)* giving an isotropic mesh
+          size *h* at each of the *N* points, or of shape *(N, 6)* giving
+          a symmetric metric tensor per point as its upper triangle
+          *(m11, m12, m13, m22, m23, m33)*.
+
+        TetGen only supports isotropic sizing. A metric tensor *M* is
+        therefore reduced to the smallest size it prescribes,
+        *1/sqrt(lambda_max(M))*. Metric tensors must be symmetric positive
+        definite, otherwise :exc:`ValueError` is raised.
+        """
+        import numpy as np
+
+        metrics = np.asarray(metrics, dtype=np.float64)
+        if metrics.ndim == 2 and metrics.shape[1] == 6:
+            m11, m12, m13, m22, m23, m33 = metrics.T
+            tensors = np.stack([
+                np.stack([m11, m12, m13], axis=-1),
+                np.stack([m12, m22, m23], axis=-1),
+                np.stack([m13, m23, m33], axis=-1),
+                ], axis=-2)
+            eigenvalues = np.linalg.eigvalsh(tensors)
+            if not (eigenvalues[:, 0] > 0).all():
+                raise ValueError("metric tensors must be positive definite")
+            metrics = 1/np.sqrt(eigenvalues[:, -1])
+        elif metrics.ndim != 1:
+            raise ValueError("metrics must have shape (npoints,) or (npoints, 6)")
+
+        if len(metrics) != len(self.points):
+            raise ValueError("need one metric entry per point")
+
+        self.number_of_point_metric_tensors = 1
+        self.point_metric_tensors.assign(metrics)
 
     def set_element_constraints(self, element_constraints):
         self.element_volumes.setup()
@@ -143,32 +242,39 @@ class Options(internals.Options):
                 setattr(self, k, v)
 
 
-def tetrahedralize(mesh_info, options):
+def tetrahedralize(mesh_info, options, refinement_func=None,
+        batched_refinement=False, background_mesh=None, insert_points=None,
+        deadline=None, max_elements=None, progress=None):
     mesh = MeshInfo()
-
-    # restore "C" locale--otherwise tetgen might mis-parse stuff like "a0.01"
-    try:
-        import locale
-    except ImportError:
-        have_locale = False
-    else:
-        have_locale = True
-        prev_num_locale = locale.getlocale(locale.LC_NUMERIC)
-        locale.setlocale(locale.LC_NUMERIC, "C")
-
-    try:
-        internals.tetrahedralize(options, mesh_info, mesh)
-    finally:
-        # restore previous locale if we've changed it
-        if have_locale:
-            locale.setlocale(locale.LC_NUMERIC, prev_num_locale)
-
+    with c_numeric_locale():
+        stats = internals.tetrahedralize(options, mesh_info, mesh,
+                addin=insert_points,
+                refinement_func=refinement_func,
+                batched_refinement=batched_refinement,
+                bgmin=background_mesh,
+                deadline=deadline,
+                max_elements=max_elements,
+                progress=progress)
+
+    mesh.stats = BuildStats(**stats)
     return mesh
 
 
 def build(mesh_info, options=None, verbose=False,
         attributes=False, volume_constraints=False, max_volume=None,
-        diagnose=False, insert_points=None):
+        diagnose=False, insert_points=None, refinement_func=None,
+        batched_refinement=False, metric=False, background_mesh=None,
+        deadline=None, max_elements=None, progress=None):
+    """Tetrahedralize the domain given in *mesh_info*.
+
+    If *batched_refinement* is *True*, *refinement_func* is called with
+    batches of tetrahedra instead of one tetrahedron at a time.
+    If meshing takes longer than *deadline* seconds or produces more than
+    *max_elements* tetrahedra, :exc:`MeshingAbortedError` is raised.
+    *progress* is called periodically as
+    ``progress(phase, points, tets, bad_tets)``.
+    See :func:`meshpy.tet.build` in the documentation for details.
+    """
     if options is None:
         options = Options("pq")
 
@@ -176,6 +282,10 @@ def build(mesh_info, options=None, verbose=False,
         options.quiet = 1
 
     if insert_points is not None:
+        if not isinstance(insert_points, MeshInfo):
+            points = insert_points
+            insert_points = MeshInfo()
+            insert_points.set_points(points)
         options.insertaddpoints = 1
 
     if attributes:
@@ -187,5 +297,276 @@ def build(mesh_info, options=None, verbose=False,
         options.maxvolume = max_volume
     if diagnose:
         options.diagnose = 1
+    if refinement_func is not None:
+        options.quality = 1
+    if background_mesh is not None:
+        if (len(background_mesh.elements) == 0
+                or background_mesh.number_of_point_metric_tensors == 0):
+            raise ValueError("background_mesh must have elements and "
+                    "point metric tensors")
+        metric = True
+    if metric:
+        options.metric = 1
+        options.quality = 1
+
+    return tetrahedralize(mesh_info, options, refinement_func,
+            batched_refinement, background_mesh, insert_points,
+            deadline, max_elements, progress)
+
+
+def _barycentric_coordinates(vertices, points):
+    """Return the barycentric coordinates of *points* (shape *(N, 3)*) in
+    the tetrahedra with the given *vertices* (shape *(N, 4, 3)*). Entries
+    for degenerate tetrahedra are *-inf*.
+    """
+    import numpy as np
+
+    def volumes(a, b, c, d):
+        return np.einsum("ij,ij->i", b - a, np.cross(c - a, d - a))
+
+    v0, v1, v2, v3 = vertices.transpose(1, 0, 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = np.stack([
+            volumes(points, v1, v2, v3),
+            volumes(v0, points, v2, v3),
+            volumes(v0, v1, points, v3),
+            volumes(v0, v1, v2, points),
+            ], axis=1) / volumes(v0, v1, v2, v3)[:, np.newaxis]
+    result[~np.isfinite(result)] = -np.inf
+    return result
+
+
+def _element_neighbors(elements):
+    """Return an array of the shape of *elements* whose entry *(i, j)* is
+    the element that shares the face opposite vertex *j* of element *i*,
+    or -1 on the boundary.
+    """
+    import numpy as np
+
+    nelements = len(elements)
+    faces = np.sort(
+            np.stack([np.delete(elements, j, axis=1) for j in range(4)],
+                axis=1).reshape(-1, 3),
+            axis=1)
+    order = np.lexsort(faces.T[::-1])
+    shared = (faces[order[1:]] == faces[order[:-1]]).all(axis=1)
+    first = order[:-1][shared]
+    second = order[1:][shared]
+
+    result = np.full(4*nelements, -1, dtype=np.int32)
+    result[first] = second // 4
+    result[second] = first // 4
+    return result.reshape(nelements, 4)
+
+
+def _bucket_locate(vertices, points):
+    """Return the index of the element with the given *vertices* (shape
+    *(M, 4, 3)*) that contains each of *points*, or that comes closest to
+    containing it by barycentric coordinates. The elements are sorted into
+    a uniform grid of about *M* cells by their bounding boxes, and each
+    point is only tested against the elements in its cell. Points in empty
+    cells, which lie outside the mesh, are tested against all elements.
+    """
+    import numpy as np
+
+    lower = vertices.min(axis=1)
+    upper = vertices.max(axis=1)
+    origin = lower.min(axis=0)
+    ncells = max(1, int(np.ceil(len(vertices)**(1/3))))
+    cell_size = (upper.max(axis=0) - origin) / ncells
+    cell_size[cell_size <= 0] = 1
+
+    def cell_indices(coordinates):
+        return np.clip(np.floor((coordinates - origin) / cell_size),
+                0, ncells - 1).astype(np.intp)
+
+    def cell_numbers(indices):
+        return (indices[..., 0]*ncells + indices[..., 1])*ncells + indices[..., 2]
+
+    # the cells overlapped by each element, in CSR form by cell number
+    first_cells = cell_indices(lower)
+    spans = cell_indices(upper) - first_cells + 1
+    counts = spans.prod(axis=1)
+    element_numbers = np.repeat(np.arange(len(vertices)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+            counts)
+    element_spans = spans[element_numbers]
+    cells = first_cells[element_numbers] + np.stack([
+            offsets // (element_spans[:, 1]*element_spans[:, 2]),
+            offsets // element_spans[:, 2] % element_spans[:, 1],
+            offsets % element_spans[:, 2],
+            ], axis=1)
+    cells = cell_numbers(cells)
+    order = np.argsort(cells, kind="stable")
+    cells = cells[order]
+    element_numbers = element_numbers[order]
+
+    point_cells = cell_numbers(cell_indices(points))
+    starts = np.searchsorted(cells, point_cells, side="left")
+    ncandidates = np.searchsorted(cells, point_cells, side="right") - starts
+
+    result = np.empty(len(points), dtype=np.intp)
+    found = ncandidates > 0
+    pair_points = np.repeat(np.flatnonzero(found), ncandidates[found])
+    pair_elements = element_numbers[
+            np.arange(len(pair_points))
+            - np.repeat(np.cumsum(ncandidates[found]) - ncandidates[found],
+                ncandidates[found])
+            + np.repeat(starts[found], ncandidates[found])]
+    scores = _barycentric_coordinates(
+            vertices[pair_elements], points[pair_points]).min(axis=1)
+    best = np.lexsort((-scores, pair_points))
+    first = np.ones(len(best), dtype=bool)
+    first[1:] = pair_points[best[1:]] != pair_points[best[:-1]]
+    result[pair_points[best[first]]] = pair_elements[best[first]]
+
+    for i in np.flatnonzero(~found):
+        bary = _barycentric_coordinates(
+                vertices, np.broadcast_to(points[i], (len(vertices), 3)))
+        result[i] = np.argmax(bary.min(axis=1))
+
+    return result
+
+
+def _locate_points(mesh_points, elements, points, guesses, max_steps=100,
+        tolerance=1e-10):
+    """Return the index of an element containing each of *points*, found
+    by walking from the elements in *guesses* toward the points. Points
+    that the walk does not reach, e.g. because a hole is in the way, are
+    looked up with :func:`_bucket_locate`.
+    """
+    import numpy as np
+
+    vertices = mesh_points[elements]
+    neighbors = _element_neighbors(elements)
+
+    result = guesses.copy()
+    pending = np.arange(len(points))
+    stranded = []
+    for _ in range(max_steps):
+        bary = _barycentric_coordinates(vertices[result[pending]], points[pending])
+        exit_faces = np.argmin(bary, axis=1)
+        outside = bary[np.arange(len(pending)), exit_faces] < -tolerance
+        pending = pending[outside]
+        if not len(pending):
+            break
+
+        next_elements = neighbors[result[pending], exit_faces[outside]]
+        at_boundary = next_elements < 0
+        stranded.append(pending[at_boundary])
+        pending = pending[~at_boundary]
+        result[pending] = next_elements[~at_boundary]
+
+    stranded.append(pending)
+    stranded = np.concatenate(stranded)
+    if len(stranded):
+        result[stranded] = _bucket_locate(vertices, points[stranded])
+
+    return result
+
+
+class AdaptiveRefiner:
+    """Refine an existing tetrahedral mesh according to per-element volume
+    bounds, as in an adaptive solve-estimate-refine loop.
+
+    :arg switches: additional TetGen switches used for each refinement,
+        e.g. ``"q"`` (the default) to also enforce mesh quality. The
+        switches ``r`` (reconstruct) and ``a`` (volume constraints) are
+        always added.
+    :arg verbose: whether TetGen may print progress information.
+    """
+
+    def __init__(self, switches="q", verbose=False):
+        self.switches = switches
+        self.verbose = verbose
+
+    def refine(self, mesh, max_volumes):
+        """Refine *mesh*, which is typically the output of :func:`build` or
+        of a previous call to this method.
+
+        :arg max_volumes: an array with one maximum volume per element of
+            *mesh*. Elements with a non-positive entry are not constrained.
+        :returns: a tuple *(new_mesh, parents)*. ``parents[i]`` is the index
+            of the element of *mesh* that contains the centroid of element
+            *i* of *new_mesh*, for transferring element-wise data to the
+            new mesh.
+
+        *mesh* is not modified. TetGen is handed a copy of its points,
+        elements, faces and edges, together with the volume bounds and the
+        bookkeeping for *parents*.
+        """
+        import numpy as np
+
+        nelements = len(mesh.elements)
+        max_volumes = np.asarray(max_volumes, dtype=np.float64)
+        if max_volumes.shape != (nelements,):
+            raise ValueError("need one maximum volume per element")
+
+        # Each element carries its own index as an extra attribute, which
+        # TetGen passes on to all elements that replace it. The attribute
+        # goes first since TetGen treats the last attribute as a region
+        # marker and would insert interfaces between different values.
+        nattributes = mesh.number_of_element_attributes
+        attributes = np.zeros((nelements, max(nattributes, 1) + 1))
+        attributes[:, 0] = np.arange(nelements)
+        if nattributes:
+            attributes[:, 1:] = np.asarray(mesh.element_attributes).reshape(
+                    nelements, nattributes)
+
+        # TetGen works on a copy of mesh, so that mesh is never seen in a
+        # modified state. Arrays tied to another one are copied after it.
+        input_mesh = MeshInfo()
+        input_mesh.number_of_point_attributes = mesh.number_of_point_attributes
+        input_mesh.number_of_point_metric_tensors = \
+                mesh.number_of_point_metric_tensors
+        input_mesh.number_of_element_vertices = mesh.number_of_element_vertices
+        input_mesh.number_of_element_attributes = attributes.shape[1]
+        for name in ["points", "point_attributes", "point_metric_tensors",
+                "point_markers", "elements", "faces", "face_markers",
+                "edges", "edge_markers"]:
+            if getattr(mesh, name).allocated:
+                getattr(input_mesh, name).assign(np.asarray(getattr(mesh, name)))
+        input_mesh.element_attributes.assign(attributes)
+        input_mesh.element_volumes.assign(max_volumes)
+
+        options = Options("r" + self.switches)
+        options.varvolume = 1
+        if self.verbose:
+            options.quiet = 0
+
+        new_mesh = tetrahedralize(input_mesh, options)
+
+        # TetGen's attribute is inherited from a neighboring element
+        # wherever refinement flipped faces, so it only serves as a
+        # starting point for finding the actual parent.
+        new_attributes = np.array(new_mesh.element_attributes)
+        new_elements = np.array(new_mesh.elements)[:, :4]
+        parents = _locate_points(
+                np.array(mesh.points), np.array(mesh.elements)[:, :4],
+                np.array(new_mesh.points)[new_elements].mean(axis=1),
+                new_attributes[:, 0].astype(np.int32))
+
+        new_mesh.number_of_element_attributes = nattributes
+        if nattributes:
+            new_mesh.element_attributes.assign(new_attributes[:, 1:])
+
+        return new_mesh, parents
+
+
+def delaunay(points):
+    """Compute the Delaunay tetrahedralization of *points*, an array of
+    shape *(N, 3)*.
+
+    :returns: a tuple *(tetrahedra, neighbors)* of :mod:`numpy` arrays of
+        shape *(M, 4)*. *tetrahedra* holds indices into *points*.
+        ``neighbors[i, j]`` is the tetrahedron opposite vertex *j* of
+        tetrahedron *i*, or -1 on the boundary of the convex hull.
+    """
+    import numpy as np
+
+    mesh_info = MeshInfo()
+    mesh_info.set_points(points)
 
-    return tetrahedralize(mesh_info, options)
+    mesh = tetrahedralize(mesh_info, Options("Qn"))
+    # views of the arrays filled in by TetGen, which keep mesh alive
+    return np.asarray(mesh.elements), np.asarray(mesh.neighbors)
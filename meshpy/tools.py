@@ -1,93 +1,299 @@
+from itertools import pairwise
+
+
+class UniformRefinement:
+    """A uniformly refined mesh together with the operators relating it
+    to the coarse mesh, as computed by :func:`uniform_refine`.
+
+    .. attribute:: points
+
+        An array of shape *(nfine_points, dim)*. The coarse points come
+        first, in their original order.
+
+    .. attribute:: elements
+
+        An array of shape *(nfine_elements, dim+1)*, with the same
+        orientation as the coarse elements.
+
+    .. attribute:: parents
+
+        An array of shape *(nfine_elements,)* with the coarse element
+        each fine element was obtained from. The children of each coarse
+        element are numbered consecutively.
+
+    .. attribute:: interpolation_indices
+    .. attribute:: interpolation_weights
+
+        Arrays of shape *(nfine_points, nsources)*. Fine point *i* is
+        the combination of the coarse points
+        ``interpolation_indices[i]`` with the weights
+        ``interpolation_weights[i]``, which sum to one.
+    """
+
+    def __init__(self, points, elements, parents,
+            interpolation_indices, interpolation_weights):
+        self.points = points
+        self.elements = elements
+        self.parents = parents
+        self.interpolation_indices = interpolation_indices
+        self.interpolation_weights = interpolation_weights
+
+    def prolongation(self):
+        """Return the piecewise linear interpolation from the coarse to
+        the fine points as a :class:`scipy.sparse.csr_matrix` of shape
+        *(nfine_points, ncoarse_points)*.
+
+        This needs :mod:`scipy`, which can be installed with the ``scipy``
+        extra of MeshPy (``pip install meshpy[scipy]``).
+        """
+        import numpy as np
+        import scipy.sparse as sp
+
+        nfine, nsources = self.interpolation_indices.shape
+        ncoarse = self.interpolation_indices.max() + 1 if nfine else 0
+        return sp.csr_matrix(
+                (self.interpolation_weights.reshape(-1),
+                    (np.repeat(np.arange(nfine), nsources),
+                        self.interpolation_indices.reshape(-1))),
+                shape=(nfine, ncoarse))
+
+    def restriction(self):
+        """Return the transpose of :meth:`prolongation`, which maps fine
+        residuals to the coarse points, as a
+        :class:`scipy.sparse.csr_matrix`. Like :meth:`prolongation`, this
+        needs :mod:`scipy`.
+        """
+        return self.prolongation().T.tocsr()
+
+
+_TET_EDGES = [(0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3)]
+
+# children of a tetrahedron, in terms of its vertices followed by its edge
+# midpoints in the order of _TET_EDGES
+_TET_CHILDREN = [
+        (0, 4, 5, 6), (4, 1, 7, 8), (5, 7, 2, 9), (6, 8, 9, 3),
+        # the inner octahedron, split along the diagonal m02-m13
+        (8, 5, 4, 6), (8, 5, 6, 9), (8, 5, 9, 7), (8, 5, 7, 4),
+        ]
+
+
+def _get_unique_edges(elements, local_edges, npoints):
+    """Return a tuple *(edges, edge_index)*. *edges* is an array of shape
+    *(nedges, 2)* of the distinct edges of *elements*, with
+    ``edges[:, 0] < edges[:, 1]``. ``edge_index[i, k]`` is the index in
+    *edges* of the local edge ``local_edges[k]`` of element *i*.
+    """
+    import numpy as np
+
+    edge_pairs = np.sort(elements[:, local_edges], axis=-1).reshape(-1, 2)
+    edge_keys, edge_index = np.unique(
+            edge_pairs[:, 0].astype(np.int64)*npoints + edge_pairs[:, 1],
+            return_inverse=True)
+    edges = np.stack([edge_keys // npoints, edge_keys % npoints],
+            axis=-1).astype(np.intp)
+
+    return edges, edge_index.reshape(len(elements), len(local_edges))
+
+
+def _get_triangle_lattice(factor):
+    """Return a tuple *(lattice, children)* describing the subdivision of a
+    triangle *(a, b, c)* into *factor**2* triangles. *lattice* is an array
+    of the lattice points *(i, j)* at ``a + (i*(b-a) + j*(c-a))/factor``,
+    with the vertices first, followed by the points on the edges
+    *ab*, *bc* and *ac* (each ordered from the first vertex of the edge
+    to the second) and then the interior points. *children* holds
+    the subtriangles as indices into *lattice*.
+    """
+    import numpy as np
+
+    steps = range(1, factor)
+    lattice = (
+            [(0, 0), (factor, 0), (0, factor)]
+            + [(i, 0) for i in steps]
+            + [(factor-j, j) for j in steps]
+            + [(0, j) for j in steps]
+            + [(i, j) for i in steps for j in range(1, factor-i)])
+    lattice_index = {ij: n for n, ij in enumerate(lattice)}
+
+    children = []
+    for i in range(factor):
+        for j in range(factor-i):
+            children.append((
+                lattice_index[i, j],
+                lattice_index[i+1, j],
+                lattice_index[i, j+1]))
+            if i+j+2 <= factor:
+                children.append((
+                    lattice_index[i+1, j+1],
+                    lattice_index[i, j+1],
+                    lattice_index[i+1, j]))
+
+    return np.array(lattice), np.array(children)
+
+
+def uniform_refine(points, elements, factor=2):
+    """Uniformly refine a triangle or tetrahedral mesh.
+
+    Triangles are split into *factor**2* congruent triangles by dividing
+    each edge into *factor* equal parts. Tetrahedra are split regularly
+    into eight tetrahedra by splitting each edge at its midpoint and
+    cutting the inner octahedron along a fixed diagonal; only
+    *factor* = 2 is supported for them.
+
+    :arg points: an array of shape *(npoints, dim)*, with *dim* 2 or 3.
+    :arg elements: an array of shape *(nelements, dim+1)*.
+    :returns: a :class:`UniformRefinement` object.
+
+    Applying this repeatedly yields a mesh hierarchy for geometric
+    multigrid, with :meth:`UniformRefinement.prolongation` and
+    :meth:`UniformRefinement.restriction` as transfer operators between
+    the levels.
+    """
+    import numpy as np
+
+    points = np.asarray(points, dtype=np.float64)
+    npoints, dim = points.shape
+    elements = np.asarray(elements).astype(np.intp)
+    nelements = len(elements)
+
+    if dim not in (2, 3):
+        raise ValueError("points must be two- or three-dimensional")
+    if elements.ndim != 2 or elements.shape[1] != dim+1:
+        raise ValueError(f"elements must have shape (nelements, {dim+1})")
+    if factor < 1 or (dim == 3 and factor != 2):
+        raise ValueError(f"unsupported refinement factor: {factor}")
+
+    if dim == 3:
+        edges, edge_index = _get_unique_edges(elements, _TET_EDGES, npoints)
+
+        local_points = np.concatenate([elements, npoints + edge_index], axis=1)
+        new_elements = local_points[:, _TET_CHILDREN].reshape(-1, 4)
+        parents = np.repeat(np.arange(nelements), len(_TET_CHILDREN))
+
+        interpolation_indices = np.concatenate([
+            np.repeat(np.arange(npoints)[:, np.newaxis], 2, axis=1),
+            edges])
+        interpolation_weights = np.full(interpolation_indices.shape, 0.5)
+        new_points = np.concatenate([points, points[edges].mean(axis=1)])
+
+        return UniformRefinement(new_points, new_elements, parents,
+                interpolation_indices, interpolation_weights)
+
+    local_edges = [(0, 1), (1, 2), (0, 2)]
+    edges, edge_index = _get_unique_edges(elements, local_edges, npoints)
+    nedges = len(edges)
+    lattice, children = _get_triangle_lattice(factor)
+
+    # {{{ global numbers of the lattice points of each element
+
+    # coarse points, then factor-1 points per edge from edges[:, 0] to
+    # edges[:, 1], then the interior points of each element
+    nedge_points = factor - 1
+    ninterior = len(lattice) - 3 - 3*nedge_points
+
+    edge_steps = np.arange(1, factor)
+    edge_points = []
+    for k, (a, b) in enumerate(local_edges):
+        flipped = elements[:, a] > elements[:, b]
+        steps = np.where(flipped[:, np.newaxis], factor - edge_steps, edge_steps)
+        edge_points.append(
+                npoints + nedge_points*edge_index[:, k, np.newaxis] + steps - 1)
+
+    interior_start = npoints + nedges*nedge_points
+    local_points = np.concatenate([
+        elements,
+        *edge_points,
+        interior_start + ninterior*np.arange(nelements)[:, np.newaxis]
+        + np.arange(ninterior)], axis=1)
+
+    # }}}
+
+    new_elements = local_points[:, children].reshape(-1, 3)
+    parents = np.repeat(np.arange(nelements), len(children))
+
+    # {{{ new points as combinations of coarse points
+
+    edge_weights = edge_steps/factor
+    lattice_weights = np.stack([
+        factor - lattice.sum(axis=1), lattice[:, 0], lattice[:, 1]],
+        axis=-1)[3+3*nedge_points:] / factor
+
+    interpolation_indices = np.concatenate([
+        np.repeat(np.arange(npoints)[:, np.newaxis], 3, axis=1),
+        np.repeat(edges[:, [0, 1, 0]], nedge_points, axis=0),
+        np.repeat(elements, ninterior, axis=0),
+        ])
+    interpolation_weights = np.concatenate([
+        np.repeat([[1, 0, 0]], npoints, axis=0),
+        np.tile(np.stack([
+            1 - edge_weights, edge_weights, np.zeros(nedge_points)],
+            axis=-1), (nedges, 1)),
+        np.tile(lattice_weights, (nelements, 1)),
+        ]).astype(np.float64)
+
+    # }}}
+
+    edge_vertices = points[edges]
+    new_points = np.concatenate([
+        points,
+        (edge_vertices[:, :1] + edge_weights[:, np.newaxis]
+            * (edge_vertices[:, 1:] - edge_vertices[:, :1])).reshape(-1, dim),
+        (lattice_weights @ points[elements]).reshape(-1, dim),
+        ])
+
+    return UniformRefinement(new_points, new_elements, parents,
+            interpolation_indices, interpolation_weights)
+
+
 def uniform_refine_triangles(points, elements, factor=2):
-    new_points = points[:]
-    new_elements = []
-    old_face_to_new_faces = {}
-    face_point_dict = {}
+    """Uniformly refine a triangle mesh, splitting each triangle into
+    *factor**2* triangles.
 
-    points_per_edge = factor+1
+    :returns: a tuple *(new_points, new_elements, old_face_to_new_faces)*.
+        *new_points* is a list of point arrays, with the coarse points
+        first, and *new_elements* a list of tuples of point indices.
+        *old_face_to_new_faces* is a :class:`dict` mapping each coarse
+        edge, as a :class:`frozenset` of its two point indices, to a list
+        of the *factor* fine edges it was split into, in order along the
+        edge.
 
-    def get_refined_face(a, b):
-        if a > b:
-            a, b = b, a
-            flipped = True
-        else:
-            flipped = False
+    :func:`uniform_refine` returns the same mesh as arrays, without
+    building these lists, along with the relationship between the coarse
+    and the fine mesh. Prefer it for large meshes.
+    """
+    import numpy as np
 
-        try:
-            face_points = face_point_dict[a, b]
-        except KeyError:
-            a_pt, b_pt = (points[idx] for idx in (a, b))
-            dx = (b_pt - a_pt)/factor
+    refinement = uniform_refine(points, elements, factor)
 
-            # build subdivided facet
-            face_points = [a]
+    npoints = len(points)
+    elements = np.asarray(elements).astype(np.intp)
+    edges, _ = _get_unique_edges(elements, [(0, 1), (1, 2), (0, 2)], npoints)
+    edge_chains = np.concatenate([
+        edges[:, :1],
+        npoints + (factor-1)*np.arange(len(edges))[:, np.newaxis]
+        + np.arange(factor-1),
+        edges[:, 1:]], axis=1)
 
-            for i in range(1, points_per_edge-1):
-                face_points.append(len(new_points))
-                new_points.append(a_pt + dx*i)
+    old_face_to_new_faces = {
+            frozenset(edge): list(pairwise(chain))
+            for edge, chain in zip(edges.tolist(), edge_chains.tolist(),
+                strict=True)}
 
-            face_points.append(b)
+    return (list(refinement.points),
+            [tuple(element) for element in refinement.elements.tolist()],
+            old_face_to_new_faces)
 
-            face_point_dict[a, b] = face_points
 
-            # build old_face_to_new_faces
-            old_face_to_new_faces[frozenset([a, b])] = [
-                    (face_points[i], face_points[i+1])
-                    for i in range(factor)]
+def uniform_refine_tetrahedra(points, elements):
+    """Uniformly refine a tetrahedral mesh, splitting each tetrahedron into
+    eight. See :func:`uniform_refine`, which also provides the relationship
+    between the coarse and the fine mesh.
 
-        if flipped:
-            return face_points[::-1]
-        else:
-            return face_points
-
-    for a, b, c in elements:
-        a_pt, b_pt, c_pt = (points[idx] for idx in (a, b, c))
-        dr = (b_pt - a_pt)/factor
-        ds = (c_pt - a_pt)/factor
-
-        ab_refined, bc_refined, ac_refined = (
-                get_refined_face(*pt_indices)
-                for pt_indices in [(a, b), (b, c), (a, c)])
-
-        el_point_dict = {}
-
-        # fill out edges of el_point_dict
-        for i in range(points_per_edge):
-            el_point_dict[i, 0] = ab_refined[i]
-            el_point_dict[0, i] = ac_refined[i]
-            el_point_dict[points_per_edge-1-i, i] = bc_refined[i]
-
-        # fill out interior of el_point_dict
-        for i in range(1, points_per_edge-1):
-            for j in range(1, points_per_edge-1-i):
-                el_point_dict[i, j] = len(new_points)
-                new_points.append(a_pt + dr*i + ds*j)
-
-        # generate elements
-        for i in range(points_per_edge-1):
-            for j in range(points_per_edge-1-i):
-                new_elements.append((
-                    el_point_dict[i, j],
-                    el_point_dict[i+1, j],
-                    el_point_dict[i, j+1],
-                    ))
-                if i+1+j+1 <= factor:
-                    new_elements.append((
-                        el_point_dict[i+1, j+1],
-                        el_point_dict[i+1, j],
-                        el_point_dict[i, j+1],
-                        ))
-
-    from meshpy.triangle import MeshInfo
-    mi = MeshInfo()
-    mi.set_points(new_points)
-    mi.elements.resize(len(new_elements))
-    for i, el in enumerate(new_elements):
-        mi.elements[i] = el
-    from meshpy.triangle import write_gnuplot_mesh
-    write_gnuplot_mesh("mesh.dat", mi)
-
-    return new_points, new_elements, old_face_to_new_faces
+    :returns: a tuple *(new_points, new_elements)* of arrays, with the
+        coarse points first.
+    """
+    refinement = uniform_refine(points, elements)
+    return refinement.points, refinement.elements
 
 
 def make_swizzle_matrix(spec):
@@ -119,3 +325,188 @@ def make_swizzle_matrix(spec):
         result[final_axis, imp_axis] = sign
 
     return result
+
+
+class DualControlVolumes:
+    """Control volumes of the dual mesh, as computed by
+    :func:`dual_control_volumes`.
+
+    .. attribute:: volumes
+
+        An array of shape *(npoints,)* with the volume (area in 2D) of the
+        control volume around each point.
+
+    .. attribute:: edges
+
+        An array of shape *(nedges, 2)* of the mesh edges, with
+        ``edges[:, 0] < edges[:, 1]``.
+
+    .. attribute:: normals
+
+        An array of shape *(nedges, dim)*. ``normals[e]`` is the normal of
+        the dual face crossing edge *e*, scaled by the face's area (length
+        in 2D), and pointing from the control volume of ``edges[e, 0]`` to
+        that of ``edges[e, 1]``.
+
+    .. attribute:: offsets
+    .. attribute:: neighbors
+    .. attribute:: edge_indices
+
+        The edges adjacent to each point, in compressed sparse row form.
+        The neighbors of point *i* are
+        ``neighbors[offsets[i]:offsets[i+1]]``, connected to it by
+        the edges ``edge_indices[offsets[i]:offsets[i+1]]``.
+    """
+
+    def __init__(self, volumes, edges, normals, offsets, neighbors,
+            edge_indices):
+        self.volumes = volumes
+        self.edges = edges
+        self.normals = normals
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.edge_indices = edge_indices
+
+    def outward_normals(self):
+        """Return an array of shape *(len(neighbors), dim)* with the dual
+        face normals in the order of :attr:`neighbors`, each pointing
+        out of the control volume of its row's point.
+        """
+        import numpy as np
+
+        rows = np.repeat(np.arange(len(self.offsets)-1), np.diff(self.offsets))
+        signs = np.where(self.edges[self.edge_indices, 0] == rows, 1, -1)
+        return signs[:, np.newaxis] * self.normals[self.edge_indices]
+
+
+def dual_control_volumes(points, elements, kind="median"):
+    """Compute the dual control volumes of a triangle or tetrahedral mesh,
+    for use in vertex-centered finite volume methods.
+
+    :arg points: an array of shape *(npoints, dim)*, with *dim* 2 or 3.
+    :arg elements: an array of shape *(nelements, dim+1)*. Any further
+        columns (e.g. of second-order elements) are ignored.
+    :arg kind: ``"median"`` for the median dual, which joins edge
+        midpoints, face centroids and element centroids, or
+        ``"voronoi"`` for the Voronoi dual, which uses circumcenters
+        (2D only; the mesh should be Delaunay). Circumcenters of obtuse
+        triangles lie outside the triangle, so Voronoi dual faces of
+        boundary edges may point against their edge.
+    :returns: a :class:`DualControlVolumes` object.
+
+    Only faces between control volumes are computed. Parts of the
+    control volume boundaries lying on the boundary of the mesh are not
+    included in :attr:`DualControlVolumes.normals`.
+    """
+    import numpy as np
+
+    points = np.asarray(points, dtype=np.float64)
+    npoints, dim = points.shape
+    elements = np.asarray(elements)[:, :dim+1].astype(np.intp)
+
+    if dim not in (2, 3):
+        raise ValueError("points must be two- or three-dimensional")
+    if kind not in ("median", "voronoi"):
+        raise ValueError(f"unknown kind of dual: '{kind}'")
+    if kind == "voronoi" and dim != 2:
+        raise ValueError("Voronoi duals are only supported in 2D")
+
+    vertices = points[elements]
+    if dim == 2:
+        local_edges = [(0, 1, 2), (1, 2, 0), (2, 0, 1)]
+
+        spans = vertices[:, 1:] - vertices[:, :1]
+        orientation = np.sign(
+                spans[:, 0, 0]*spans[:, 1, 1] - spans[:, 0, 1]*spans[:, 1, 0])
+
+        if kind == "median":
+            centers = vertices.mean(axis=1)
+        else:
+            # circumcenters, relative to vertex 0
+            sq_lengths = np.sum(spans**2, axis=-1)
+            det = 2*(spans[:, 0, 0]*spans[:, 1, 1] - spans[:, 0, 1]*spans[:, 1, 0])
+            centers = vertices[:, 0] + np.stack([
+                spans[:, 1, 1]*sq_lengths[:, 0] - spans[:, 0, 1]*sq_lengths[:, 1],
+                spans[:, 0, 0]*sq_lengths[:, 1] - spans[:, 1, 0]*sq_lengths[:, 0],
+                ], axis=-1) / det[:, np.newaxis]
+
+        def cross2(u, v):
+            return u[:, 0]*v[:, 1] - u[:, 1]*v[:, 0]
+
+        volumes = np.zeros(npoints)
+        edge_pairs = []
+        edge_normals = []
+        for i, j, k in local_edges:
+            a = vertices[:, i]
+            midpoint_ij = 0.5*(a + vertices[:, j])
+            midpoint_ik = 0.5*(a + vertices[:, k])
+            to_center = centers - midpoint_ij
+
+            # (c, -d) is (d, c) rotated clockwise: it points from i to j if
+            # the element is positively oriented
+            edge_pairs.append(elements[:, [i, j]])
+            edge_normals.append(orientation[:, np.newaxis]
+                    * np.stack([to_center[:, 1], -to_center[:, 0]], axis=-1))
+
+            # signed areas of (a, midpoint_ij, center) and (a, center, midpoint_ik)
+            volumes += np.bincount(elements[:, i],
+                    orientation*0.5*(
+                        cross2(midpoint_ij - a, centers - a)
+                        + cross2(centers - a, midpoint_ik - a)),
+                    minlength=npoints)
+
+    else:
+        local_edges = [(0, 1, 2, 3), (0, 2, 3, 1), (0, 3, 1, 2),
+                (1, 2, 0, 3), (1, 3, 2, 0), (2, 3, 0, 1)]
+
+        spans = vertices[:, 1:] - vertices[:, :1]
+        element_volumes = np.abs(np.linalg.det(spans))/6
+        volumes = np.bincount(elements.reshape(-1),
+                np.repeat(element_volumes/4, 4), minlength=npoints)
+
+        centers = vertices.mean(axis=1)
+        edge_pairs = []
+        edge_normals = []
+        for i, j, k, k2 in local_edges:
+            a = vertices[:, i]
+            b = vertices[:, j]
+            midpoint = 0.5*(a + b)
+            face_center_k = (a + b + vertices[:, k])/3
+            face_center_k2 = (a + b + vertices[:, k2])/3
+
+            # the dual face is the quadrilateral
+            # (midpoint, face_center_k, center, face_center_k2)
+            normal = 0.5*np.cross(centers - midpoint, face_center_k2 - face_center_k)
+            sign = np.sign(np.sum(normal*(b - a), axis=-1))
+
+            edge_pairs.append(elements[:, [i, j]])
+            edge_normals.append(sign[:, np.newaxis]*normal)
+
+    edge_pairs = np.concatenate(edge_pairs)
+    edge_normals = np.concatenate(edge_normals)
+
+    # orient contributions along the sorted edge
+    flipped = edge_pairs[:, 0] > edge_pairs[:, 1]
+    edge_normals[flipped] *= -1
+    edge_pairs.sort(axis=1)
+
+    edge_keys, edge_index = np.unique(
+            edge_pairs[:, 0].astype(np.int64)*npoints + edge_pairs[:, 1],
+            return_inverse=True)
+    edges = np.stack([edge_keys // npoints, edge_keys % npoints],
+            axis=-1).astype(np.intp)
+    nedges = len(edges)
+    normals = np.stack([
+        np.bincount(edge_index, edge_normals[:, axis], minlength=nedges)
+        for axis in range(dim)], axis=-1)
+
+    # point-to-edge adjacency
+    rows = np.concatenate([edges[:, 0], edges[:, 1]])
+    order = np.argsort(rows, kind="stable")
+    neighbors = np.concatenate([edges[:, 1], edges[:, 0]])[order]
+    edge_indices = np.concatenate([np.arange(nedges), np.arange(nedges)])[order]
+    offsets = np.zeros(npoints+1, dtype=np.intp)
+    np.cumsum(np.bincount(rows, minlength=npoints), out=offsets[1:])
+
+    return DualControlVolumes(volumes, edges, normals, offsets, neighbors,
+            edge_indices)
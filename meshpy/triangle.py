@@ -1,7 +1,14 @@
 from typing import ClassVar
 
 import meshpy._internals as internals
-from meshpy.common import MeshInfoBase, dump_array
+from meshpy.common import (
+    BuildStats,
+    MeshInfoBase,
+    MeshingAbortedError,  # ruff: ignore[unused-import]
+    c_numeric_locale,
+    dump_array,
+)
+from meshpy.sizing import _as_native_refinement_func
 
 
 class MeshInfo(internals.TriMeshInfo, MeshInfoBase):
@@ -44,15 +51,10 @@ class MeshInfo(internals.TriMeshInfo, MeshInfoBase):
                         dest_array[i, j] = v
 
     def set_facets(self, facets, facet_markers=None):
-        self.facets.resize(len(facets))
-
-        for i, facet in enumerate(facets):
-            self.facets[i] = facet
+        self.facets.assign(facets)
 
         if facet_markers is not None:
-            self.facet_markers.setup()
-            for i, mark in enumerate(facet_markers):
-                self.facet_markers[i] = mark
+            self.facet_markers.assign(facet_markers)
 
     def dump(self):
         for name in self._constituents:
@@ -125,8 +127,20 @@ def build(mesh_info, verbose=False, refinement_func=None, attributes=False,
         volume_constraints=False, max_volume=None, allow_boundary_steiner=True,
         allow_volume_steiner=True, quality_meshing=True,
         generate_edges=None, generate_faces=False, min_angle=None,
-        mesh_order=None, generate_neighbor_lists=False):
-    """Triangulate the domain given in `mesh_info'."""
+        mesh_order=None, generate_neighbor_lists=False,
+        batched_refinement=False, voronoi=False, deadline=None,
+        max_elements=None, progress=None):
+    """Triangulate the domain given in `mesh_info'.
+
+    If *batched_refinement* is *True*, *refinement_func* is called with
+    batches of triangles instead of one triangle at a time.
+    If refinement takes longer than *deadline* seconds or produces more
+    than *max_elements* triangles, :exc:`MeshingAbortedError` is raised.
+    *progress* is called periodically during refinement as
+    ``progress(phase, points, triangles, bad_triangles)``.
+    If *voronoi* is *True*, return a tuple *(mesh, voronoi_diagram)*.
+    See :func:`meshpy.triangle.build` in the documentation for details.
+    """
     opts = "pzj"
     if quality_meshing:
         if min_angle is not None:
@@ -151,7 +165,8 @@ def build(mesh_info, verbose=False, refinement_func=None, attributes=False,
         opts += f"a{max_volume:.20f}"
 
     if refinement_func is not None:
-        opts += "u"
+        refinement_func = _as_native_refinement_func(refinement_func)
+        opts += "uu" if batched_refinement else "u"
 
     if generate_edges is not None:
         from warnings import warn
@@ -175,29 +190,25 @@ def build(mesh_info, verbose=False, refinement_func=None, attributes=False,
         if not allow_boundary_steiner:
             opts += "Y"
 
-    # restore "C" locale--otherwise triangle might mis-parse stuff like "a0.01"
-    try:
-        import locale
-    except ImportError:
-        have_locale = False
-    else:
-        have_locale = True
-        prev_num_locale = locale.getlocale(locale.LC_NUMERIC)
-        locale.setlocale(locale.LC_NUMERIC, "C")
-
-    try:
-        mesh = MeshInfo()
-        internals.triangulate(opts, mesh_info, mesh, MeshInfo(), refinement_func)
-    finally:
-        # restore previous locale if we've changed it
-        if have_locale:
-            locale.setlocale(locale.LC_NUMERIC, prev_num_locale)
+    if voronoi:
+        opts += "v"
+
+    mesh = MeshInfo()
+    voronoi_diagram = MeshInfo()
+    with c_numeric_locale():
+        stats = internals.triangulate(opts, mesh_info, mesh, voronoi_diagram,
+                refinement_func, deadline=deadline, max_elements=max_elements,
+                progress=progress)
+    mesh.stats = BuildStats(**stats)
 
+    if voronoi:
+        return mesh, voronoi_diagram
     return mesh
 
 
 def refine(input_p, verbose=False, refinement_func=None,  quality_meshing=True,
-        min_angle=None, generate_neighbor_lists=False):
+        min_angle=None, generate_neighbor_lists=False, batched_refinement=False,
+        voronoi=False):
     opts = "razj"
 
     if quality_meshing:
@@ -213,15 +224,207 @@ def refine(input_p, verbose=False, refinement_func=None,  quality_meshing=True,
     else:
         opts += "Q"
     if refinement_func is not None:
-        opts += "u"
+        refinement_func = _as_native_refinement_func(refinement_func)
+        opts += "uu" if batched_refinement else "u"
     if generate_neighbor_lists is not None:
         opts += "n"
 
+    if voronoi:
+        opts += "v"
+
     output_p = MeshInfo()
-    internals.triangulate(opts, input_p, output_p, MeshInfo(), refinement_func)
+    voronoi_diagram = MeshInfo()
+    with c_numeric_locale():
+        stats = internals.triangulate(opts, input_p, output_p, voronoi_diagram,
+                refinement_func)
+    output_p.stats = BuildStats(**stats)
+
+    if voronoi:
+        return output_p, voronoi_diagram
     return output_p
 
 
+def delaunay(points):
+    """Compute the Delaunay triangulation of *points*, an array of shape
+    *(N, 2)*.
+
+    :returns: a tuple *(triangles, neighbors)* of :mod:`numpy` arrays of
+        shape *(M, 3)*. *triangles* holds indices into *points*.
+        ``neighbors[i, j]`` is the triangle opposite vertex *j* of
+        triangle *i*, or -1 on the boundary of the convex hull.
+    """
+    import numpy as np
+
+    mesh_info = MeshInfo()
+    mesh_info.set_points(points)
+
+    mesh = MeshInfo()
+    with c_numeric_locale():
+        internals.triangulate("zQn", mesh_info, mesh, MeshInfo(), None)
+
+    # views of the arrays filled in by Triangle, which keep mesh alive
+    return np.asarray(mesh.elements), np.asarray(mesh.neighbors)
+
+
+class Triangulation:
+    """A triangulation that can be updated incrementally.
+
+    Unlike :func:`build`, which rebuilds the mesh on every call, this keeps
+    Triangle's mesh alive, so that points and segments can be inserted and
+    points removed at a cost that depends on the size of the change, not on
+    the size of the mesh. The mesh can also be refined in place, see
+    :meth:`refine`. It is exported (as :attr:`mesh`) only when it is
+    accessed after a change.
+
+    Points are numbered consecutively. Inserted points are appended.
+    Removing points renumbers the points after them, as in
+    :func:`numpy.delete`. Points that Triangle adds on its own (where a new
+    segment crosses an existing one) are appended as well.
+
+    :arg mesh_info: a :class:`MeshInfo` with the initial points and,
+        optionally, facets, holes and regions. If there are no facets, the
+        convex hull of the points is triangulated.
+
+    The remaining arguments are as for :func:`build`. Unlike :func:`build`,
+    no quality meshing is done by default.
+
+    A triangulation may be used from several threads. Its methods are
+    carried out one at a time.
+    """
+
+    def __init__(self, mesh_info, verbose=False, attributes=False,
+            volume_constraints=False, max_volume=None, quality_meshing=False,
+            min_angle=None, generate_faces=False):
+        opts = "pzjn"
+        if len(mesh_info.facets) == 0:
+            opts += "c"
+
+        if quality_meshing:
+            if min_angle is not None:
+                opts += f"q{min_angle:f}"
+            else:
+                opts += "q"
+
+        if verbose:
+            opts += "VV"
+        else:
+            opts += "Q"
+
+        if attributes:
+            opts += "A"
+
+        if volume_constraints:
+            opts += "a"
+        if max_volume:
+            opts += f"a{max_volume:.20f}"
+
+        if generate_faces:
+            opts += "e"
+
+        with c_numeric_locale():
+            self._triangulation = internals.Triangulation(opts, mesh_info)
+        self._mesh = None
+
+    @property
+    def number_of_points(self):
+        return self._triangulation.number_of_points
+
+    @property
+    def number_of_elements(self):
+        return self._triangulation.number_of_elements
+
+    @property
+    def mesh(self):
+        """A :class:`MeshInfo` holding the current mesh. It is exported
+        anew on the first access after each change.
+        """
+        if self._mesh is None:
+            mesh = MeshInfo()
+            self._triangulation.output(mesh)
+            self._mesh = mesh
+
+        return self._mesh
+
+    @property
+    def points(self):
+        """The points, as a :mod:`numpy` array of shape *(N, 2)*."""
+        import numpy as np
+        return np.array(self.mesh.points)
+
+    @property
+    def elements(self):
+        """The triangles, as a :mod:`numpy` array of shape *(M, 3)*."""
+        import numpy as np
+        return np.array(self.mesh.elements)
+
+    @property
+    def neighbors(self):
+        """The neighbors of the triangles, as a :mod:`numpy` array of shape
+        *(M, 3)*. ``neighbors[i, j]`` is the triangle opposite vertex *j* of
+        triangle *i*, or -1 on the boundary.
+        """
+        import numpy as np
+        return np.array(self.mesh.neighbors)
+
+    def insert_points(self, points, attributes=None, markers=None):
+        """Insert *points*, an array of shape *(N, 2)*, with optional
+        point *attributes* of shape *(N, number_of_point_attributes)* and
+        boundary *markers* of shape *(N,)*.
+
+        Points outside the mesh, on a segment, or on an existing point are
+        not inserted.
+
+        :returns: an integer array of shape *(N,)* with the index of each
+            inserted point, or -1 if it was not inserted.
+        """
+        try:
+            return self._triangulation.insert_points(
+                    points, attributes, markers)
+        finally:
+            self._mesh = None
+
+    def remove_points(self, indices):
+        """Remove the points with the given *indices*. Only points in the
+        interior of the mesh that do not lie on a segment can be removed.
+        If any point cannot be removed, :exc:`ValueError` is raised and the
+        mesh is left unchanged.
+        """
+        try:
+            self._triangulation.remove_points(indices)
+        finally:
+            self._mesh = None
+
+    def refine(self, max_areas=None, min_angle=None):
+        """Refine the mesh in place, reusing Triangle's mesh instead of
+        rebuilding it as :func:`refine` does.
+
+        :arg max_areas: an array with an upper bound on the area of each
+            triangle, in the order of :attr:`elements`. Bounds that are not
+            positive mean no bound. If *None*, the current bounds are kept.
+            Triangles created by splitting inherit the bound of their
+            parent.
+        :arg min_angle: if not *None*, the new minimum angle (in degrees) for
+            quality meshing.
+
+        The global interpreter lock is released while Triangle runs. Other
+        calls on this triangulation wait until it is done.
+        """
+        try:
+            self._triangulation.refine(max_areas, min_angle)
+        finally:
+            self._mesh = None
+
+    def insert_segments(self, segments, markers=None):
+        """Insert *segments*, an array of shape *(N, 2)* of point indices,
+        with optional boundary *markers* of shape *(N,)* (default 1).
+        The segments must lie within the mesh.
+        """
+        try:
+            self._triangulation.insert_segments(segments, markers)
+        finally:
+            self._mesh = None
+
+
 def write_gnuplot_mesh(filename, out_p, facets=False):
     with open(filename, "w") as gp_file:
         segments = out_p.facets if facets else out_p.elements
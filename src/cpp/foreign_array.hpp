@@ -4,6 +4,7 @@
 
 
 
+#include <cstdlib>
 #include <vector>
 #include <stdexcept>
 
@@ -25,12 +26,31 @@ class tSizeChangeNotifier;
 
 
 
+/** Thrown when an array would be reallocated or freed while buffers
+ * exported from it are alive, which would leave them dangling.
+ */
+class tExportedArrayError : public std::runtime_error
+{
+  public:
+    tExportedArrayError()
+      : std::runtime_error("existing exports of data: "
+          "array cannot be resized or deallocated")
+    { }
+};
+
+
+
+
 class tSizeChangeNotificationReceiver
 {
   public:
     virtual ~tSizeChangeNotificationReceiver()
     { }
     virtual void notifySizeChange(tSizeChangeNotifier *master, unsigned size) = 0;
+
+    /** Throw if a size change notification would not be allowed. */
+    virtual void checkSizeChange() const
+    { }
 };
 
 
@@ -53,6 +73,15 @@ class tSizeChangeNotifier
         (*first++)->notifySizeChange(this, size);
     }
 
+    /** Throw if any of the receivers would not allow a size change. */
+    void checkNotifySizeChange() const
+    {
+      tNotificationReceiverList::const_iterator first = NotificationReceivers.begin(),
+      last = NotificationReceivers.end();
+      while (first != last)
+        (*first++)->checkSizeChange();
+    }
+
     void registerForNotification(tSizeChangeNotificationReceiver *rec)
     {
       NotificationReceivers.push_back(rec);
@@ -87,6 +116,8 @@ class tReadOnlyForeignArray : public tSizeChangeNotifier, public tSizeChangeNoti
     unsigned                    Unit;
     tSizeChangeNotifier         *SlaveTo;
     bool                        AssumeOwnership;
+    bool                        Malloced; // Contents from malloc(), not new[]
+    unsigned                    Exports; // live buffers exported to Python
 
   public:
     typedef ElementT value_type;
@@ -95,7 +126,7 @@ class tReadOnlyForeignArray : public tSizeChangeNotifier, public tSizeChangeNoti
         ElementT *&cts, int &number_of, unsigned unit=1, tSizeChangeNotifier *slave_to=NULL,
         bool assume_ownership=false)
       : Contents(cts), NumberOf(number_of), Unit(unit), SlaveTo(slave_to),
-      AssumeOwnership(assume_ownership)
+      AssumeOwnership(assume_ownership), Malloced(false), Exports(0)
     {
       if (AssumeOwnership)
         Contents = NULL;
@@ -119,7 +150,7 @@ class tReadOnlyForeignArray : public tSizeChangeNotifier, public tSizeChangeNoti
 
       if (AssumeOwnership)
       {
-        deallocate();
+        releaseContents();
 
         if (!SlaveTo)
           NumberOf = 0;
@@ -141,11 +172,70 @@ class tReadOnlyForeignArray : public tSizeChangeNotifier, public tSizeChangeNoti
       return Contents != NULL;
     }
 
+    /** Return the number of bytes of memory held by the array.
+     */
+    size_t nbytes() const
+    {
+      return Contents ? sizeof(ElementT) * Unit * NumberOf : 0;
+    }
+
+    ElementT *data()
+    {
+      return Contents;
+    }
+
+    bool is_slave() const
+    {
+      return SlaveTo != NULL;
+    }
+
+    /** Count the buffers exported from the array. While there are any,
+     * it refuses to be reallocated or freed.
+     */
+    void addExport()
+    {
+      ++Exports;
+    }
+
+    void removeExport()
+    {
+      --Exports;
+    }
+
+    void checkSizeChange() const
+    {
+      if (Exports && Contents)
+        throw tExportedArrayError();
+      checkNotifySizeChange();
+    }
+
     void deallocate()
+    {
+      if (Exports && Contents)
+        throw tExportedArrayError();
+      releaseContents();
+    }
+
+    void releaseContents()
     {
       if (Contents != NULL)
-        delete[] Contents;
+      {
+        if (Malloced)
+          free(Contents);
+        else
+          delete[] Contents;
+      }
       Contents = NULL;
+      Malloced = false;
+    }
+
+    /** Record that the contents were allocated with malloc() rather than
+     * new[], as done by Triangle for the output arrays it fills in, so
+     * that they are released with free().
+     */
+    void setMalloced()
+    {
+      Malloced = Contents != NULL;
     }
 
     void setSize(unsigned size)
@@ -179,11 +269,12 @@ class tReadOnlyForeignArray : public tSizeChangeNotifier, public tSizeChangeNoti
 
     void setSizeInternal(unsigned size)
     {
+      checkSizeChange();
+
       if (!SlaveTo)
         NumberOf = size;
 
-      if (Contents != NULL)
-        free(Contents);
+      releaseContents();
 
       if (size == 0 || Unit == 0)
         Contents = NULL;
@@ -203,6 +294,7 @@ class tReadOnlyForeignArray : public tSizeChangeNotifier, public tSizeChangeNoti
     {
       if (unit != Unit)
       {
+        checkSizeChange();
         Unit = unit;
         setSizeInternal(NumberOf);
       }
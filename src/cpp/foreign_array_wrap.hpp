@@ -5,7 +5,10 @@
 
 
 #include "foreign_array.hpp"
+#include <cstring>
+#include <type_traits>
 #include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
 
 
 
@@ -95,11 +98,144 @@ namespace {
 
       self.setSub(i_main, i_sub, v);
     }
+
+    /* Replace the contents of the array by those of an (N, unit)-shaped
+     * (or, for unit 1, (N,)-shaped) numpy array in one go.
+     */
+    static void assign(FA &self, pybind11::object obj)
+    {
+      pybind11::array ary = pybind11::array::ensure(obj);
+      if (!ary)
+        throw pybind11::error_already_set();
+
+      typedef pybind11::array_t<value_type,
+              pybind11::array::c_style | pybind11::array::forcecast> ary_t;
+
+      char kind = ary.dtype().kind();
+      if (ary.size() != 0)
+      {
+        if (std::is_integral<value_type>::value)
+        {
+          if (kind != 'i' && kind != 'u' && kind != 'b')
+            PYTHON_ERROR(TypeError, "expected an array of integers");
+        }
+        else if (kind != 'f' && kind != 'i' && kind != 'u')
+          PYTHON_ERROR(TypeError, "expected an array of real numbers");
+      }
+
+      long count;
+      if (ary.ndim() == 1 && (self.unit() == 1 || ary.shape(0) == 0))
+        count = ary.shape(0);
+      else if (ary.ndim() == 2 && (long) self.unit() == ary.shape(1))
+        count = ary.shape(0);
+      else
+        PYTHON_ERROR(ValueError, "array shape does not match (N, self.unit)");
+
+      ary_t contig = ary_t::ensure(ary);
+      if (!contig)
+        throw pybind11::error_already_set();
+
+      if (self.is_slave())
+      {
+        if (count != (long) self.size())
+          PYTHON_ERROR(ValueError, "array length does not match "
+              "that of the array it is tied to");
+        self.setup();
+      }
+      else
+        self.setSize(count);
+
+      if (count != 0 && self.unit() != 0)
+        memcpy(self.data(), contig.data(),
+            sizeof(value_type) * count * self.unit());
+    }
+
+    static pybind11::buffer_info get_buffer(FA &self)
+    {
+      // numpy wants a valid pointer even for empty arrays
+      static value_type empty_dummy;
+
+      value_type *data = self.data();
+      if (!data)
+      {
+        if (self.size() != 0 && self.unit() != 0)
+          throw std::runtime_error("Array unallocated");
+        data = &empty_dummy;
+      }
+
+      const pybind11::ssize_t itemsize = sizeof(value_type);
+      if (self.unit() == 1)
+        return pybind11::buffer_info(
+            data, itemsize,
+            pybind11::format_descriptor<value_type>::format(),
+            1, { (pybind11::ssize_t) self.size() }, { itemsize });
+      else
+        return pybind11::buffer_info(
+            data, itemsize,
+            pybind11::format_descriptor<value_type>::format(),
+            2,
+            { (pybind11::ssize_t) self.size(), (pybind11::ssize_t) self.unit() },
+            { itemsize * (pybind11::ssize_t) self.unit(), itemsize });
+    }
   };
 
 
 
 
+  /* Wraps the buffer protocol slots of a foreign array type to count the
+   * buffers exported from each array, see tReadOnlyForeignArray::addExport.
+   */
+  template <typename FA>
+  struct tBufferExportCounter
+  {
+    static getbufferproc GetBuffer;
+    static releasebufferproc ReleaseBuffer;
+
+    static int getbuffer(PyObject *obj, Py_buffer *view, int flags)
+    {
+      int result = GetBuffer(obj, view, flags);
+      if (result == 0)
+        pybind11::cast<FA &>(pybind11::handle(obj)).addExport();
+      return result;
+    }
+
+    static void releasebuffer(PyObject *obj, Py_buffer *view)
+    {
+      pybind11::cast<FA &>(pybind11::handle(obj)).removeExport();
+      ReleaseBuffer(obj, view);
+    }
+
+    static void install(pybind11::handle type_obj)
+    {
+      PyTypeObject *type = (PyTypeObject *) type_obj.ptr();
+      GetBuffer = type->tp_as_buffer->bf_getbuffer;
+      ReleaseBuffer = type->tp_as_buffer->bf_releasebuffer;
+      type->tp_as_buffer->bf_getbuffer = getbuffer;
+      type->tp_as_buffer->bf_releasebuffer = releasebuffer;
+      PyType_Modified(type);
+    }
+  };
+
+  template <typename FA>
+  getbufferproc tBufferExportCounter<FA>::GetBuffer = NULL;
+  template <typename FA>
+  releasebufferproc tBufferExportCounter<FA>::ReleaseBuffer = NULL;
+
+
+
+
+  /* The number of bytes of memory owned by a structure beyond its own size.
+   * Specialized for structures that hold pointers to arrays.
+   */
+  template <typename T>
+  size_t ownedNBytes(const T &)
+  {
+    return 0;
+  }
+
+
+
+
   /* This wrap helper works for more complicated data structures, for which we
    * just ship out internal references--boost::python takes care of life support
    * for us.
@@ -118,6 +254,15 @@ namespace {
 
       return self.get(idx);
     }
+
+    static size_t nbytes(FA &self)
+    {
+      size_t result = self.nbytes();
+      if (self.is_allocated())
+        for (unsigned i = 0; i < self.size(); ++i)
+          result += ownedNBytes(self.get(i));
+      return result;
+    }
   };
 }
 
@@ -130,18 +275,23 @@ void exposePODForeignArray(pybind11::module &m,const std::string &name)
   typedef tForeignArray<T> cl;
   typedef tPODForeignArrayWrapHelper<cl> w_cl;
 
-  pybind11::class_<cl>(m, name.c_str())
+  pybind11::class_<cl> cls(m, name.c_str(), pybind11::buffer_protocol());
+  cls
+    .def_buffer(&w_cl::get_buffer)
     .def("__len__", &cl::size)
     .def("resize", &cl::setSize)
     .def("setup", &cl::setup)
     .def_property_readonly("unit", &cl::unit)
     .def_property_readonly("allocated", &cl::is_allocated)
+    .def_property_readonly("nbytes", &cl::nbytes)
     .def("__getitem__", &w_cl::getitem)
     .def("__getitem__", &w_cl::getitem_tup)
     .def("__setitem__", &w_cl::setitem)
     .def("__setitem__", &w_cl::setitem_tup)
+    .def("assign", &w_cl::assign)
     .def("deallocate", &cl::deallocate)
     ;
+  tBufferExportCounter<cl>::install(cls);
 }
 
 
@@ -160,6 +310,7 @@ void exposeStructureForeignArray(pybind11::module &m, const std::string &name)
     .def("setup", &cl::setup)
     .def_property_readonly("unit", &cl::unit)
     .def_property_readonly("allocated", &cl::is_allocated)
+    .def_property_readonly("nbytes", &w_cl::nbytes)
     .def("__getitem__", &w_cl::getitem, pybind11::return_value_policy::reference_internal)
     .def("deallocate", &cl::deallocate)
     ;
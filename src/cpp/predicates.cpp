@@ -386,14 +386,17 @@ static REAL isperrboundA, isperrboundB, isperrboundC;
 
 // Options to choose types of geometric computtaions. 
 // Added by H. Si, 2012-08-23.
-static int  _use_inexact_arith; // -X option.
-static int  _use_static_filter; // Default option, disable it by -X1
+// (MeshPy: These depend on the options and the bounding box of the mesh
+// being generated, and so they are kept per thread to allow concurrent
+// tetrahedralize() calls.)
+static thread_local int  _use_inexact_arith; // -X option.
+static thread_local int  _use_static_filter; // Default option, disable it by -X1
 
 // Static filters for orient3d() and insphere(). 
 // They are pre-calcualted and set in exactinit().
 // Added by H. Si, 2012-08-23.
-static REAL o3dstaticfilter;
-static REAL ispstaticfilter;
+static thread_local REAL o3dstaticfilter;
+static thread_local REAL ispstaticfilter;
 
 
 
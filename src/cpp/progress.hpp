@@ -0,0 +1,194 @@
+#ifndef _HEADER_SEEN_PROGRESS
+#define _HEADER_SEEN_PROGRESS
+
+
+
+
+#include <chrono>
+#include <memory>
+#include <string>
+#include <sstream>
+#include <pybind11/pybind11.h>
+
+
+
+
+/* Progress reporting and limits on the time and the size of the mesh for
+ * one meshing call.
+ *
+ * The mesh generators report their progress periodically through
+ * check(), which may be called with the GIL released. It passes the
+ * report on to the Python progress callback, if any, at most every
+ * ProgressInterval seconds and whenever the phase changes.
+ *
+ * Once a limit is exceeded or the progress callback raises an exception,
+ * the reason and the state of the mesh at that point are recorded and
+ * check() returns true, upon which the mesh generator stops. A hook that
+ * calls back into Python without check() and cannot propagate the
+ * exception through the mesh generator records it with fail() and stops
+ * the mesh generator itself. raiseIfAborted() then raises
+ * meshpy.common.MeshingAbortedError or the callback's exception.
+ */
+class tMeshingMonitor
+{
+  private:
+    typedef std::chrono::steady_clock clock;
+
+    static constexpr double ProgressInterval = 0.1; // seconds
+
+    clock::time_point Start;
+    double Deadline; // seconds after Start, negative if unlimited
+    long MaxElements; // negative if unlimited
+
+    pybind11::object Progress;
+    std::string ProgressPhase;
+    double ProgressTime;
+
+    const char *Reason;
+    std::unique_ptr<pybind11::error_already_set> CallbackError;
+    std::string Phase;
+    long Points, Elements, BadElements;
+    double Elapsed;
+
+  public:
+    tMeshingMonitor(pybind11::object deadline, pybind11::object max_elements,
+        pybind11::object progress)
+      : Start(clock::now()), Deadline(-1), MaxElements(-1),
+      ProgressTime(0), Reason(NULL),
+      Points(0), Elements(0), BadElements(0), Elapsed(0)
+    {
+      if (!deadline.is_none())
+      {
+        Deadline = pybind11::cast<double>(deadline);
+        if (!(Deadline >= 0))
+          throw pybind11::value_error("deadline must not be negative");
+      }
+      if (!max_elements.is_none())
+      {
+        MaxElements = pybind11::cast<long>(max_elements);
+        if (MaxElements < 0)
+          throw pybind11::value_error("max_elements must not be negative");
+      }
+      if (!progress.is_none())
+        Progress = progress;
+    }
+
+    ~tMeshingMonitor()
+    {
+      if (CallbackError)
+      {
+        // only reached if raiseIfAborted() was skipped
+        pybind11::gil_scoped_acquire acquire;
+        CallbackError.reset();
+      }
+    }
+
+    bool active() const
+    {
+      return Deadline >= 0 || MaxElements >= 0 || Progress;
+    }
+
+    bool aborted() const
+    {
+      return Reason != NULL;
+    }
+
+    double elapsed() const
+    {
+      return std::chrono::duration<double>(clock::now() - Start).count();
+    }
+
+    bool check(const char *phase, long points, long elements,
+        long bad_elements)
+    {
+      if (aborted())
+        return true;
+
+      double now = elapsed();
+
+      if (MaxElements >= 0 && elements > MaxElements)
+        Reason = "max_elements";
+      else if (Deadline >= 0 && now > Deadline)
+        Reason = "deadline";
+      else if (Progress
+          && (ProgressPhase != phase || now - ProgressTime >= ProgressInterval))
+      {
+        ProgressPhase = phase;
+        ProgressTime = now;
+
+        pybind11::gil_scoped_acquire acquire;
+        try
+        {
+          Progress(phase, points, elements, bad_elements);
+          return false;
+        }
+        catch (pybind11::error_already_set &e)
+        {
+          CallbackError.reset(new pybind11::error_already_set(e));
+          Reason = "progress";
+        }
+      }
+      else
+        return false;
+
+      Phase = phase;
+      Points = points;
+      Elements = elements;
+      BadElements = bad_elements;
+      Elapsed = now;
+      return true;
+    }
+
+    // Record that a Python callback other than the progress callback
+    // raised *error*. Called with the GIL held.
+    void fail(pybind11::error_already_set &error)
+    {
+      if (aborted())
+        return;
+
+      CallbackError.reset(new pybind11::error_already_set(error));
+      Reason = "refinement_func";
+    }
+
+    void raiseIfAborted()
+    {
+      if (!aborted())
+        return;
+
+      namespace py = pybind11;
+
+      if (CallbackError)
+      {
+        py::error_already_set error(*CallbackError);
+        CallbackError.reset();
+        throw error;
+      }
+
+      std::ostringstream msg;
+      msg << "meshing stopped during " << Phase << " after "
+        << Elapsed << " s with " << Points << " points and "
+        << Elements << " elements: ";
+      if (std::string(Reason) == "deadline")
+        msg << "deadline of " << Deadline << " s exceeded";
+      else
+        msg << "more than " << MaxElements << " elements";
+
+      py::dict progress;
+      progress["phase"] = Phase;
+      progress["points"] = Points;
+      progress["elements"] = Elements;
+      progress["bad_elements"] = BadElements;
+      progress["elapsed"] = Elapsed;
+
+      py::object exc = py::module_::import("meshpy.common").attr(
+          "MeshingAbortedError")(msg.str(), Reason, progress);
+      PyErr_SetObject(reinterpret_cast<PyObject *>(Py_TYPE(exc.ptr())),
+          exc.ptr());
+      throw py::error_already_set();
+    }
+};
+
+
+
+
+#endif
@@ -0,0 +1,175 @@
+#ifndef _HEADER_SEEN_SIZING
+#define _HEADER_SEEN_SIZING
+
+
+
+
+#include <vector>
+#include <cmath>
+#include <cstdint>
+#include "foreign_array.hpp"
+
+
+
+
+/* A sizing field sampled on a regular, axis-aligned grid.
+ *
+ * Values are element size bounds (maximum area in 2D, maximum volume in
+ * 3D) at the grid nodes and are interpolated multilinearly in between.
+ * Points outside the grid take the value at the nearest point of the grid.
+ *
+ * Evaluation does not touch any Python object and may therefore happen
+ * with the GIL released.
+ */
+class tGridSizeField : public noncopyable
+{
+  private:
+    unsigned Dimensions;
+    long Shape[3];
+    double Origin[3];
+    double Spacing[3];
+    std::vector<double> Values;
+
+  public:
+    tGridSizeField(unsigned dimensions, const long *shape,
+        const double *origin, const double *spacing,
+        const double *values)
+      : Dimensions(dimensions)
+    {
+      long count = 1;
+      for (unsigned d = 0; d < 3; ++d)
+      {
+        if (d < dimensions)
+        {
+          Shape[d] = shape[d];
+          Origin[d] = origin[d];
+          Spacing[d] = spacing[d];
+        }
+        else
+        {
+          Shape[d] = 1;
+          Origin[d] = 0;
+          Spacing[d] = 1;
+        }
+        count *= Shape[d];
+      }
+
+      Values.assign(values, values+count);
+    }
+
+    unsigned dimensions() const
+    { return Dimensions; }
+
+    long shape(unsigned d) const
+    { return Shape[d]; }
+
+    double origin(unsigned d) const
+    { return Origin[d]; }
+
+    double spacing(unsigned d) const
+    { return Spacing[d]; }
+
+    const std::vector<double> &values() const
+    { return Values; }
+
+    double operator()(const double *x) const
+    {
+      long index[3];
+      double frac[3];
+
+      for (unsigned d = 0; d < 3; ++d)
+      {
+        index[d] = 0;
+        frac[d] = 0;
+
+        if (d >= Dimensions || Shape[d] == 1)
+          continue;
+
+        double t = (x[d]-Origin[d])/Spacing[d];
+        if (!(t > 0))
+          continue;
+        if (t >= Shape[d]-1)
+        {
+          index[d] = Shape[d]-1;
+          continue;
+        }
+
+        index[d] = long(std::floor(t));
+        frac[d] = t - index[d];
+      }
+
+      // C (row-major) order: the last axis varies fastest
+      double result = 0;
+      for (unsigned corner = 0; corner < (1u << Dimensions); ++corner)
+      {
+        double weight = 1;
+        long flat_index = 0;
+        for (unsigned d = 0; d < Dimensions; ++d)
+        {
+          long i = index[d];
+          if (corner & (1u << d))
+          {
+            if (frac[d] == 0)
+            {
+              weight = 0;
+              break;
+            }
+            ++i;
+            weight *= frac[d];
+          }
+          else
+            weight *= 1-frac[d];
+
+          flat_index = flat_index*Shape[d] + i;
+        }
+
+        if (weight != 0)
+          result += weight*Values[flat_index];
+      }
+
+      return result;
+    }
+};
+
+
+
+
+/* A compiled refinement function, called as
+ *
+ *   int func(double *org, double *dest, double *apex, double area,
+ *       void *user_data)
+ *
+ * for each triangle considered during refinement. It returns nonzero if
+ * the triangle is too large.
+ */
+class tCRefinementFunction : public noncopyable
+{
+  public:
+    typedef int (*tFunction)(double *, double *, double *, double, void *);
+
+  private:
+    tFunction Function;
+    void *UserData;
+
+  public:
+    tCRefinementFunction(uintptr_t function, uintptr_t user_data)
+      : Function(reinterpret_cast<tFunction>(function)),
+      UserData(reinterpret_cast<void *>(user_data))
+    { }
+
+    uintptr_t address() const
+    { return reinterpret_cast<uintptr_t>(Function); }
+
+    uintptr_t user_data() const
+    { return reinterpret_cast<uintptr_t>(UserData); }
+
+    bool operator()(double *org, double *dest, double *apex, double area) const
+    {
+      return Function(org, dest, apex, area, UserData) != 0;
+    }
+};
+
+
+
+
+#endif
@@ -14,10 +14,20 @@
 ///////////////////////////////////////////////////////////////////////////////
 
 #include "tetgen.h"
+#include <chrono>
+#include <vector>
 
 // extern void exactdeinit();
 using namespace predicates;
 
+// MeshPy: Wall clock time in seconds, used for the phase times in
+//   tetgenio::stats.
+static REAL wallclock()
+{
+  return std::chrono::duration<REAL>(
+      std::chrono::steady_clock::now().time_since_epoch()).count();
+}
+
 //// io_cxx ///////////////////////////////////////////////////////////////////
 ////                                                                       ////
 ////                                                                       ////
@@ -11714,6 +11724,7 @@ void tetgenmesh::incrementaldelaunay(clock_t& tv)
 
 
   for (i = 4; i < in->numberofpoints; i++) {
+    checkprogress("delaunay"); // MeshPy
     if (pointtype(permutarray[i]) == UNUSEDVERTEX) {
       setpointtype(permutarray[i], VOLVERTEX);
     }
@@ -18210,6 +18221,7 @@ void tetgenmesh::constraineddelaunay(clock_t& tv)
   }
 
   tv = clock();
+  segrecoveryend = wallclock(); // MeshPy
 
   if (b->verbose) {
     printf("  Constraining facets.\n");
@@ -19469,6 +19481,7 @@ int tetgenmesh::recoversegments(arraypool *misseglist, int fullsearch,
 
   // Loop until 'subsegstack' is empty.
   while (subsegstack->objects > 0l) {
+    checkprogress("recovery"); // MeshPy
     // seglist is used as a stack.
     subsegstack->objects--;
     paryseg = (face *) fastlookup(subsegstack, subsegstack->objects);
@@ -19749,6 +19762,7 @@ int tetgenmesh::recoversubfaces(arraypool *misshlist, int steinerflag)
 
   // Loop until 'subfacstack' is empty.
   while (subfacstack->objects > 0l) {
+    checkprogress("recovery"); // MeshPy
 
     subfacstack->objects--;
     parysh = (face *) fastlookup(subfacstack, subfacstack->objects);
@@ -21790,6 +21804,7 @@ void tetgenmesh::recoverboundary(clock_t& tv)
 
 
   tv = clock();
+  segrecoveryend = wallclock(); // MeshPy
 
   if (b->verbose) {
     printf("  Recovering facets.\n");
@@ -24431,6 +24446,7 @@ void tetgenmesh::repairencsegs(int chkencflag)
     badsubsegs->traversalinit();
     bface = (face *) badsubsegs->traverse();
     while ((bface != NULL) && (steinerleft != 0)) {
+      checkprogress("refinement"); // MeshPy
       // Skip a deleleted element.
       if (bface->shver >= 0) {
         // A queued segment may have been deleted (split).
@@ -24897,6 +24913,7 @@ void tetgenmesh::repairencfacs(int chkencflag)
     badsubfacs->traversalinit();
     bface = (face *) badsubfacs->traverse();
     while ((bface != NULL) && (steinerleft != 0)) {
+      checkprogress("refinement"); // MeshPy
       // Skip a deleted element.
       if (bface->shver >= 0) {
         // A queued subface may have been deleted (split).
@@ -25054,9 +25071,16 @@ int tetgenmesh::checktet4split(triface *chktet, int &qflag, REAL *ccent)
     }
   }
 
-  if (in->tetunsuitable != NULL) {
+  if (userunsuitable || (in->tetunsuitable != NULL) ||
+      (in->tetunsuitablebatch != NULL)) {
     // Execute the user-defined meshing sizing evaluation.
-    if ((*(in->tetunsuitable))(pa, pb, pc, pd, NULL, 0)) {
+    // MeshPy: pass the volume of the tet instead of 0. With a batched test,
+    //   remember the tet for the next batch (see flushusertests()).
+    vol = fabs(A[indx[0]][0] * A[indx[1]][1] * A[indx[2]][2]) / 6.0;
+    if (!userunsuitable && (in->tetunsuitablebatch != NULL)) {
+      deferusertest(chktet, vol);
+    } else if (userunsuitable ||
+               (*(in->tetunsuitable))(pa, pb, pc, pd, NULL, vol)) {
       // Calculate the circumcenter of this tet.
       rhs[0] = 0.5 * dot(vda, vda);
       rhs[1] = 0.5 * dot(vdb, vdb);
@@ -25322,6 +25346,140 @@ int tetgenmesh::splittetrahedron(triface* splittet, int qflag, REAL *ccent,
   }
 }
 
+///////////////////////////////////////////////////////////////////////////////
+//                                                                           //
+// deferusertest()    Queue a tet for the batched user-defined size test.    //
+//                                                                           //
+// MeshPy: The vertices are recorded so that tets which have been deleted or //
+// replaced by the time the batch is evaluated can be recognized.            //
+//                                                                           //
+///////////////////////////////////////////////////////////////////////////////
+
+void tetgenmesh::deferusertest(triface *chktet, REAL vol)
+{
+  badface *pendtet;
+
+  pendingtets->newindex((void **) &pendtet);
+  pendtet->tt = *chktet;
+  pendtet->forg = (point) chktet->tet[4];
+  pendtet->fdest = (point) chktet->tet[5];
+  pendtet->fapex = (point) chktet->tet[6];
+  pendtet->foppo = (point) chktet->tet[7];
+  pendtet->key = vol;
+}
+
+///////////////////////////////////////////////////////////////////////////////
+//                                                                           //
+// flushusertests()    Run the batched user-defined size test.               //
+//                                                                           //
+// MeshPy: All tets queued by deferusertest() that still exist are passed to //
+// 'in->tetunsuitablebatch' at once. Those found unsuitable are split. The   //
+// number of split tets is returned.                                         //
+//                                                                           //
+///////////////////////////////////////////////////////////////////////////////
+
+long tetgenmesh::flushusertests(int chkencflag)
+{
+  badface *pendtet;
+  REAL ccent[3];
+  long livecount, splitcount;
+  int qflag = 0;
+  long i;
+  int j, k;
+
+  if ((pendingtets == NULL) || (pendingtets->objects == 0)) {
+    return 0;
+  }
+
+  // The buffers are freed even if the user test throws.
+  std::vector<REAL> vertices(pendingtets->objects * 12);
+  std::vector<REAL> volumes(pendingtets->objects);
+  std::vector<int> unsuitable(pendingtets->objects);
+  std::vector<long> indices(pendingtets->objects);
+
+  // Collect the tets which are still in the mesh.
+  livecount = 0;
+  for (i = 0; i < pendingtets->objects; i++) {
+    pendtet = (badface *) fastlookup(pendingtets, i);
+    if (isdeadtet(pendtet->tt) ||
+        (pendtet->tt.tet[4] != (tetrahedron) pendtet->forg) ||
+        (pendtet->tt.tet[5] != (tetrahedron) pendtet->fdest) ||
+        (pendtet->tt.tet[6] != (tetrahedron) pendtet->fapex) ||
+        (pendtet->tt.tet[7] != (tetrahedron) pendtet->foppo)) {
+      continue;
+    }
+    for (j = 0; j < 3; j++) {
+      vertices[livecount * 12 + j] = pendtet->forg[j];
+      vertices[livecount * 12 + 3 + j] = pendtet->fdest[j];
+      vertices[livecount * 12 + 6 + j] = pendtet->fapex[j];
+      vertices[livecount * 12 + 9 + j] = pendtet->foppo[j];
+    }
+    volumes[livecount] = pendtet->key;
+    indices[livecount] = i;
+    livecount++;
+  }
+
+  if (livecount > 0) {
+    (*(in->tetunsuitablebatch))((int) livecount, vertices.data(),
+                                volumes.data(), unsuitable.data());
+  }
+
+  // Split the unsuitable tets. Splitting a tet may delete others.
+  splitcount = 0;
+  for (k = 0; (k < livecount) && (steinerleft != 0); k++) {
+    if (!unsuitable[k]) continue;
+    pendtet = (badface *) fastlookup(pendingtets, indices[k]);
+    if (isdeadtet(pendtet->tt) ||
+        (pendtet->tt.tet[4] != (tetrahedron) pendtet->forg) ||
+        (pendtet->tt.tet[5] != (tetrahedron) pendtet->fdest) ||
+        (pendtet->tt.tet[6] != (tetrahedron) pendtet->fapex) ||
+        (pendtet->tt.tet[7] != (tetrahedron) pendtet->foppo)) {
+      continue;
+    }
+    userunsuitable = 1;
+    if (checktet4split(&(pendtet->tt), qflag, ccent)) {
+      userunsuitable = 0;
+      if (splittetrahedron(&(pendtet->tt), qflag, ccent, chkencflag)) {
+        splitcount++;
+      }
+    }
+    userunsuitable = 0;
+  }
+
+  pendingtets->restart();
+
+  return splitcount;
+}
+
+///////////////////////////////////////////////////////////////////////////////
+//                                                                           //
+// checkprogress()    Report progress to the user-defined progress hook.     //
+//                                                                           //
+// MeshPy: Called once per step of the main loops of the meshing phases.     //
+// Every 64th call is passed on to 'in->tetprogress'. If it returns nonzero, //
+// meshing is stopped. The number of bad tetrahedra is only reported during  //
+// refinement, since 'badtetrahedrons' is reused by removeslivers().         //
+//                                                                           //
+///////////////////////////////////////////////////////////////////////////////
+
+void tetgenmesh::checkprogress(const char *phase)
+{
+  long badcount;
+
+  if ((in == NULL) || (in->tetprogress == NULL)) return;
+  if ((++progresssteps & 63l) != 0l) return;
+
+  badcount = 0l;
+  if ((badtetrahedrons != NULL) && (strcmp(phase, "refinement") == 0)) {
+    badcount = badtetrahedrons->items;
+  }
+
+  if ((*(in->tetprogress))(phase, points->items,
+        tetrahedrons->items - hullsize, badcount)) {
+    terminatetetgen(this, 11);
+  }
+}
+
 ///////////////////////////////////////////////////////////////////////////////
 //                                                                           //
 // repairbadtets()    Repair bad quality tetrahedra.                         //
@@ -25337,10 +25495,14 @@ void tetgenmesh::repairbadtets(int chkencflag)
 
   // Loop until the pool 'badsubfacs' is empty. Note that steinerleft == -1
   //   if an unlimited number of Steiner points is allowed.
-  while ((badtetrahedrons->items > 0) && (steinerleft != 0)) {
+  // MeshPy: Once it is empty, run the deferred batched user tests, which
+  //   may queue more tets.
+  while (((badtetrahedrons->items > 0) || (flushusertests(chkencflag) > 0))
+         && (steinerleft != 0)) {
     badtetrahedrons->traversalinit();
     bface = (triface *) badtetrahedrons->traverse();
     while ((bface != NULL) && (steinerleft != 0)) {
+      checkprogress("refinement"); // MeshPy
       // Skip a deleted element.
       if (bface->ver >= 0) {
         // A queued tet may have been deleted.
@@ -25385,6 +25547,10 @@ void tetgenmesh::repairbadtets(int chkencflag)
     // Clear the pool.
     badtetrahedrons->restart();
   }
+
+  if (pendingtets != NULL) {
+    pendingtets->restart();
+  }
 }
 
 ///////////////////////////////////////////////////////////////////////////////
@@ -25520,6 +25686,9 @@ void tetgenmesh::delaunayrefinement()
     // Initialize the pool of bad quality tetrahedra.
     badtetrahedrons = new memorypool(sizeof(triface), b->tetrahedraperblock,
                                      sizeof(void *), 0);
+    if (in->tetunsuitablebatch != NULL) {
+      pendingtets = new arraypool(sizeof(badface), 10);
+    }
     // Add all tetrahedra (no hull tets) into the pool.
     tetrahedrons->traversalinit();
     checktet.tet = tetrahedrontraverse();
@@ -25563,14 +25732,21 @@ void tetgenmesh::delaunayrefinement()
   if (!b->nobisect || checkconstraints) {
     totalworkmemory += (badsubsegs->maxitems * badsubsegs->itembytes);
     delete badsubsegs;
+    badsubsegs = NULL; // MeshPy
     if (b->reflevel > 1) {
       totalworkmemory += (badsubfacs->maxitems * badsubfacs->itembytes);
       delete badsubfacs;
+      badsubfacs = NULL; // MeshPy
     }
   }
   if (b->reflevel > 2) {
     totalworkmemory += (badtetrahedrons->maxitems*badtetrahedrons->itembytes);
     delete badtetrahedrons;
+    badtetrahedrons = NULL; // MeshPy
+    if (pendingtets != NULL) {
+      delete pendingtets;
+      pendingtets = NULL;
+    }
   }
 }
 
@@ -26104,6 +26280,7 @@ long tetgenmesh::improvequalitybyflips()
       }
 
       for (k = 0; k < flipqueue->objects; k++) {
+        checkprogress("optimization"); // MeshPy
         bface  = (badface *) fastlookup(flipqueue, k);
         if (gettetrahedron(bface->forg, bface->fdest, bface->fapex,
                            bface->foppo, &bface->tt)) {
@@ -26438,6 +26615,7 @@ long tetgenmesh::improvequalitybysmoothing(optparameters *opm)
     }
 
     for (k = 0; k < flipqueue->objects; k++) {      
+      checkprogress("optimization"); // MeshPy
       bface  = (badface *) fastlookup(flipqueue, k);
       if (gettetrahedron(bface->forg, bface->fdest, bface->fapex,
                          bface->foppo, &bface->tt)) {
@@ -26718,6 +26896,7 @@ long tetgenmesh::removeslivers(int chkencflag)
     }
 
     for (k = 0; (k < flipqueue->objects) && (steinerleft != 0); k++) {      
+      checkprogress("optimization"); // MeshPy
       bface  = (badface *) fastlookup(flipqueue, k);
       if (gettetrahedron(bface->forg, bface->fdest, bface->fapex,
                          bface->foppo, &bface->tt)) {
@@ -26926,6 +27105,7 @@ void tetgenmesh::optimizemesh()
     } // while (iter)
 
     delete badtetrahedrons;
+    badtetrahedrons = NULL; // MeshPy
 
   }
 
@@ -28457,6 +28637,41 @@ void tetgenmesh::statistics()
   }
 }
 
+///////////////////////////////////////////////////////////////////////////////
+//                                                                           //
+// collectstats()    Store the counters of the mesh in 'out->stats'.         //
+//                                                                           //
+// MeshPy: The phase times are recorded by tetrahedralize().                 //
+//                                                                           //
+///////////////////////////////////////////////////////////////////////////////
+
+void tetgenmesh::collectstats(tetgenio *out)
+{
+  tetgenio::buildstats *st;
+
+  if (out == (tetgenio *) NULL) return;
+  st = &(out->stats);
+
+  st->steinerpointsonsegments = st_segref_count;
+  st->steinerpointsonfacets = st_facref_count;
+  st->steinerpointsinvolume = st_volref_count;
+  st->flip23count = flip23count;
+  st->flip32count = flip32count;
+  st->flip44count = flip44count;
+
+  st->maxpoints = (points != NULL) ? points->maxitems : 0l;
+  st->maxtetrahedra = (tetrahedrons != NULL) ? tetrahedrons->maxitems : 0l;
+  st->maxsubfaces = (subfaces != NULL) ? subfaces->maxitems : 0l;
+  st->maxsubsegs = (subsegs != NULL) ? subsegs->maxitems : 0l;
+  st->maxflips = (flippool != NULL) ? flippool->maxitems : 0l;
+
+  st->pointbytes = (points != NULL) ? points->itembytes : 0;
+  st->tetrahedronbytes = (tetrahedrons != NULL) ? tetrahedrons->itembytes : 0;
+  st->subfacebytes = (subfaces != NULL) ? subfaces->itembytes : 0;
+  st->subsegbytes = (subsegs != NULL) ? subsegs->itembytes : 0;
+  st->flipbytes = (flippool != NULL) ? flippool->itembytes : 0;
+}
+
 ////                                                                       ////
 ////                                                                       ////
 //// meshstat_cxx /////////////////////////////////////////////////////////////
@@ -30842,6 +31057,31 @@ void tetgenmesh::outmesh2vtk(char* ofilename)
 ////                                                                       ////
 ////                                                                       ////
 
+///////////////////////////////////////////////////////////////////////////////
+//                                                                           //
+// recordphase()    Record the wall clock time of a phase in 'out->stats'.   //
+//                                                                           //
+// MeshPy: The phase lasted from '*phasestart' until 'phaseend', which is    //
+// also the start of the next phase.                                         //
+//                                                                           //
+///////////////////////////////////////////////////////////////////////////////
+
+static void recordphase(tetgenio *out, const char *name, REAL *phasestart,
+                        REAL phaseend)
+{
+  tetgenio::buildstats *st;
+
+  if (out != (tetgenio *) NULL) {
+    st = &(out->stats);
+    if (st->numberofphases < tetgenio::buildstats::maxphases) {
+      st->phasenames[st->numberofphases] = name;
+      st->phaseseconds[st->numberofphases] = phaseend - *phasestart;
+      st->numberofphases++;
+    }
+  }
+  *phasestart = phaseend;
+}
+
 ///////////////////////////////////////////////////////////////////////////////
 //                                                                           //
 // tetrahedralize()    The interface for users using TetGen library to       //
@@ -30872,8 +31112,13 @@ void tetrahedralize(tetgenbehavior *b, tetgenio *in, tetgenio *out,
   tetgenmesh m;
   clock_t tv[12], ts[5]; // Timing informations (defined in time.h)
   REAL cps = (REAL) CLOCKS_PER_SEC;
+  REAL wt = wallclock(); // MeshPy: Start of the current phase.
 
   tv[0] = clock();
+
+  if (out != (tetgenio *) NULL) {
+    memset(&(out->stats), 0, sizeof(out->stats));
+  }
  
   m.b = b;
   m.in = in;
@@ -30892,6 +31137,7 @@ void tetrahedralize(tetgenbehavior *b, tetgenio *in, tetgenio *out,
             m.xmax - m.xmin, m.ymax - m.ymin, m.zmax - m.zmin);
 
   tv[1] = clock();
+  recordphase(out, "input", &wt, wallclock());
 
   if (b->refine) { // -r
     m.reconstructmesh();
@@ -30900,6 +31146,8 @@ void tetrahedralize(tetgenbehavior *b, tetgenio *in, tetgenio *out,
   }
 
   tv[2] = clock();
+  recordphase(out, b->refine ? "reconstruction" : "delaunay", &wt,
+              wallclock());
 
   if (!b->quiet) {
     if (b->refine) {
@@ -30916,6 +31164,7 @@ void tetrahedralize(tetgenbehavior *b, tetgenio *in, tetgenio *out,
     m.meshsurface();
 
     ts[0] = clock();
+    recordphase(out, "surface_mesh", &wt, wallclock());
 
     if (!b->quiet) {
       printf("Surface mesh seconds:  %g\n", ((REAL)(ts[0]-tv[2])) / cps);
@@ -30925,6 +31174,7 @@ void tetrahedralize(tetgenbehavior *b, tetgenio *in, tetgenio *out,
       m.detectinterfaces();
 
       ts[1] = clock();
+      recordphase(out, "self_intersection", &wt, wallclock());
 
       if (!b->quiet) {
         printf("Self-intersection seconds:  %g\n", ((REAL)(ts[1]-ts[0])) / cps);
@@ -30936,6 +31186,7 @@ void tetrahedralize(tetgenbehavior *b, tetgenio *in, tetgenio *out,
         m.outsubfaces(out);
       }
 
+      m.collectstats(out);
       return;
     }
   }
@@ -30948,6 +31199,7 @@ void tetrahedralize(tetgenbehavior *b, tetgenio *in, tetgenio *out,
     m.bgm->reconstructmesh();
 
     ts[0] = clock();
+    recordphase(out, "background_mesh", &wt, wallclock());
 
     if (!b->quiet) {
       printf("Background mesh reconstruct seconds:  %g\n",
@@ -30958,6 +31210,7 @@ void tetrahedralize(tetgenbehavior *b, tetgenio *in, tetgenio *out,
       m.interpolatemeshsize();
 
       ts[1] = clock();
+      recordphase(out, "size_interpolation", &wt, wallclock());
 
       if (!b->quiet) {
         printf("Size interpolating seconds:  %g\n",((REAL)(ts[1]-ts[0])) / cps);
@@ -30975,6 +31228,9 @@ void tetrahedralize(tetgenbehavior *b, tetgenio *in, tetgenio *out,
     }
 
     ts[1] = clock();
+    recordphase(out, "segment_recovery", &wt,
+                (m.segrecoveryend > wt) ? m.segrecoveryend : wt);
+    recordphase(out, "facet_recovery", &wt, wallclock());
 
     if (!b->quiet) {
       if (b->nobisect) {
@@ -30992,6 +31248,7 @@ void tetrahedralize(tetgenbehavior *b, tetgenio *in, tetgenio *out,
     m.carveholes();
 
     ts[2] = clock();
+    recordphase(out, "hole_carving", &wt, wallclock());
 
     if (!b->quiet) {
       printf("Exterior tets removal seconds:  %g\n",((REAL)(ts[2]-ts[1]))/cps);
@@ -31002,6 +31259,7 @@ void tetrahedralize(tetgenbehavior *b, tetgenio *in, tetgenio *out,
         m.suppresssteinerpoints();
 
         ts[3] = clock();
+        recordphase(out, "steiner_suppression", &wt, wallclock());
 
         if (!b->quiet) {
           printf("Steiner suppression seconds:  %g\n",
@@ -31015,6 +31273,7 @@ void tetrahedralize(tetgenbehavior *b, tetgenio *in, tetgenio *out,
 
   if (b->coarsen) { // -R
     m.meshcoarsening();
+    recordphase(out, "coarsening", &wt, wallclock());
   }
 
   tv[6] = clock();
@@ -31027,6 +31286,7 @@ void tetrahedralize(tetgenbehavior *b, tetgenio *in, tetgenio *out,
 
   if ((b->plc && b->nobisect) || b->coarsen) {
     m.recoverdelaunay();
+    recordphase(out, "delaunay_recovery", &wt, wallclock());
   }
 
   tv[7] = clock();
@@ -31040,6 +31300,7 @@ void tetrahedralize(tetgenbehavior *b, tetgenio *in, tetgenio *out,
   if ((b->plc || b->refine) && b->insertaddpoints) { // -i
     if ((addin != NULL) && (addin->numberofpoints > 0)) {
       m.insertconstrainedpoints(addin); 
+      recordphase(out, "constrained_points", &wt, wallclock());
     }
   }
 
@@ -31055,6 +31316,7 @@ void tetrahedralize(tetgenbehavior *b, tetgenio *in, tetgenio *out,
 
   if (b->quality) {
     m.delaunayrefinement();    
+    recordphase(out, "refinement", &wt, wallclock());
   }
 
   tv[9] = clock();
@@ -31067,6 +31329,7 @@ void tetrahedralize(tetgenbehavior *b, tetgenio *in, tetgenio *out,
 
   if ((b->plc || b->refine) && (b->optlevel > 0)) {
     m.optimizemesh();
+    recordphase(out, "optimization", &wt, wallclock());
   }
 
   tv[10] = clock();
@@ -31180,6 +31443,8 @@ void tetrahedralize(tetgenbehavior *b, tetgenio *in, tetgenio *out,
 
 
   tv[11] = clock();
+  recordphase(out, "output", &wt, wallclock());
+  m.collectstats(out);
 
   if (!b->quiet) {
     printf("\nOutput seconds:  %g\n", ((REAL)(tv[11] - tv[10])) / cps);
@@ -184,6 +184,34 @@ public:
   // A callback function for mesh refinement.
   typedef bool (* TetSizeFunc)(REAL*, REAL*, REAL*, REAL*, REAL*, REAL);
 
+  // MeshPy: A batched variant of TetSizeFunc. It is called with the number
+  //   of tets, their vertices (12 numbers per tet), their volumes, and an
+  //   array receiving nonzero for each tet that needs to be split.
+  typedef void (* TetSizeBatchFunc)(int, REAL*, REAL*, int*);
+
+  // MeshPy: A progress hook, called periodically while meshing with the
+  //   name of the current phase and the numbers of points, tets (not
+  //   counting hull tets) and queued bad tets.  If it returns nonzero, meshing is
+  //   stopped by terminatetetgen() with code 11.
+  typedef int (* TetProgressFunc)(const char*, long, long, long);
+
+  // MeshPy: Statistics of a tetrahedralize() call: the wall clock time
+  //   spent in each phase in seconds, the numbers of Steiner points and
+  //   flips, and the largest numbers of items held by the memory pools
+  //   along with the sizes of their items in bytes.
+  struct buildstats {
+    enum {maxphases = 16};
+    int numberofphases;
+    const char *phasenames[maxphases];
+    REAL phaseseconds[maxphases];
+    long steinerpointsonsegments;
+    long steinerpointsonfacets;
+    long steinerpointsinvolume;
+    long flip23count, flip32count, flip44count;
+    long maxpoints, maxtetrahedra, maxsubfaces, maxsubsegs, maxflips;
+    int pointbytes, tetrahedronbytes, subfacebytes, subsegbytes, flipbytes;
+  };
+
   // Items are numbered starting from 'firstnumber' (0 or 1), default is 0.
   int firstnumber; 
 
@@ -330,6 +358,13 @@ public:
 
   // A callback function.
   TetSizeFunc tetunsuitable;
+  // MeshPy: Used instead of 'tetunsuitable' if it is not NULL.
+  TetSizeBatchFunc tetunsuitablebatch;
+  // MeshPy: Called periodically if it is not NULL.
+  TetProgressFunc tetprogress;
+
+  // MeshPy: Filled in by tetrahedralize() for its output.
+  buildstats stats;
 
   // Input & output routines.
   bool load_node_call(FILE* infile, int markers, int uvflag, char*);
@@ -437,6 +472,9 @@ public:
     numberofvcells = 0;
 
     tetunsuitable = NULL;
+    tetunsuitablebatch = NULL;
+    tetprogress = NULL;
+    memset(&stats, 0, sizeof(stats));
 
     geomhandle = NULL;
     getvertexparamonedge = NULL;
@@ -1265,6 +1303,16 @@ public:
   // Memorypools to store bad-quality (or encroached) elements.
   memorypool *badtetrahedrons, *badsubfacs, *badsubsegs;
 
+  // MeshPy: Tets waiting for the batched user-defined size test, and a flag
+  //   telling checktet4split() that the current tet failed that test.
+  arraypool *pendingtets;
+  int userunsuitable;
+
+  // MeshPy: Steps since 'in->tetprogress' was last called.
+  long progresssteps;
+  // MeshPy: Wall clock time at which segment recovery ended.
+  REAL segrecoveryend;
+
   // A memorypool to store faces to be flipped.
   memorypool *flippool;
   arraypool *unflipqueue;
@@ -1994,6 +2042,9 @@ public:
   void enqueuetetrahedron(triface*);
   int checktet4split(triface *chktet, int& qflag, REAL *ccent);
   int splittetrahedron(triface* splittet,int qflag,REAL *ccent, int);
+  void deferusertest(triface *chktet, REAL vol);
+  long flushusertests(int chkencflag);
+  void checkprogress(const char *phase);
   void repairbadtets(int chkencflag);
 
   void delaunayrefinement();
@@ -2037,6 +2088,7 @@ public:
   void qualitystatistics();
   void memorystatistics();
   void statistics();
+  void collectstats(tetgenio *out);
 
 ///////////////////////////////////////////////////////////////////////////////
 //                                                                           //
@@ -2077,6 +2129,10 @@ public:
 
     tetrahedrons = subfaces = subsegs = points = NULL;
     badtetrahedrons = badsubfacs = badsubsegs = NULL;
+    pendingtets = NULL;
+    userunsuitable = 0;
+    progresssteps = 0l;
+    segrecoveryend = 0.0;
     tet2segpool = tet2subpool = NULL;
     flippool = NULL;
 
@@ -2202,6 +2258,42 @@ public:
     if (highordertable != NULL) {
       delete [] highordertable;
     }
+
+    if (pendingtets != NULL) {
+      delete pendingtets;
+    }
+
+    // MeshPy: The refinement pools are still allocated if meshing was
+    //   stopped during refinement or optimization.
+    if (badtetrahedrons != NULL) {
+      delete badtetrahedrons;
+    }
+    if (badsubfacs != NULL) {
+      delete badsubfacs;
+    }
+    if (badsubsegs != NULL) {
+      delete badsubsegs;
+    }
+
+    // MeshPy: freememory() is called by terminatetetgen() before the
+    //   destructor runs, so make sure nothing is deleted twice.
+    bgm = NULL;
+    tetrahedrons = subfaces = subsegs = points = NULL;
+    pendingtets = NULL;
+    badtetrahedrons = badsubfacs = badsubsegs = NULL;
+    tet2segpool = tet2subpool = NULL;
+    flippool = NULL;
+    dummypoint = NULL;
+    unflipqueue = NULL;
+    cavetetlist = cavebdrylist = caveoldtetlist = NULL;
+    cavetetshlist = cavetetseglist = cavetetvertlist = NULL;
+    caveencshlist = caveencseglist = NULL;
+    caveshlist = caveshbdlist = cavesegshlist = NULL;
+    subsegstack = subfacstack = subvertstack = NULL;
+    idx2facetlist = NULL;
+    facetverticeslist = NULL;
+    segmentendpointslist = NULL;
+    highordertable = NULL;
   }
 
   ~tetgenmesh()
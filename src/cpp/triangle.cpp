@@ -361,6 +361,7 @@ void exactdeinit(void);
 #endif /* LINUX */
 #ifdef TRILIBRARY
 #include "triangle.h"
+#include <chrono>
 #endif /* TRILIBRARY */
 
 /* A few forward declarations.                                               */
@@ -557,6 +558,16 @@ struct badtriang {
   struct badtriang *nexttriang;             /* Pointer to next bad triangle. */
 };
 
+/* MeshPy: A triangle awaiting a batched user test (-uu switch).  Like a bad  */
+/*   triangle, its vertices are stored so that a triangle that has been      */
+/*   destroyed or changed in the meantime can be recognized.                 */
+
+struct pendingtest {
+  triangle testtri;                                /* The triangle to test. */
+  REAL key;                             /* cos^2 of smallest (apical) angle. */
+  vertex triangorg, triangdest, triangapex;           /* Its three vertices. */
+};
+
 /* A stack of triangles flipped during the most recent vertex insertion.     */
 /*   The stack is used to undo the vertex insertion if the vertex encroaches */
 /*   upon a subsegment.                                                      */
@@ -649,7 +660,8 @@ REAL o3derrboundA, o3derrboundB, o3derrboundC;
 
 /* Random number seed is not constant, but I've made it global anyway.       */
 
-unsigned long randomseed;                     /* Current random number seed. */
+/* (MeshPy: per thread, to allow concurrent triangulate() calls.)            */
+thread_local unsigned long randomseed;        /* Current random number seed. */
 
 
 /* Mesh data structure.  Triangle operates on only one mesh, but the mesh    */
@@ -678,6 +690,18 @@ struct mesh {
   int nextnonemptyq[4096];
   int firstnonemptyq;
 
+/* Triangles awaiting a batched user test (MeshPy, -uu switch).              */
+
+  struct pendingtest *pendingtests;
+  long pendingtestcount, pendingtestsize;
+
+/* Vertices that Triangle has created since a persistent triangulation last  */
+/*   numbered its vertices (MeshPy, see lognewvertex()).                     */
+
+  vertex *newvertices;
+  long newvertexcount, newvertexspace;
+  int lognewvertices;                       /* Are new vertices logged? */
+
 /* Variable that maintains the stack of recently flipped triangles.          */
 
   struct flipstacker *lastflip;
@@ -707,6 +731,8 @@ struct mesh {
   int checkquality;                  /* Has quality triangulation begun yet? */
   int readnodefile;                           /* Has a .node file been read? */
   long samples;              /* Number of random samples for point location. */
+  int carved;        /* MeshPy: Have holes and concavities been carved yet? */
+  int connected;      /* MeshPy: Is the mesh known to be connected by edges? */
 
   long incirclecount;                 /* Number of incircle tests performed. */
   long counterclockcount;     /* Number of counterclockwise tests performed. */
@@ -753,7 +779,7 @@ struct behavior {
 /*   vararea: -a switch without number.                                      */
 /*   fixedarea: -a switch with number.                                       */
 /*     maxarea: maximum area bound, specified after -a switch.               */
-/*   usertest: -u switch.                                                    */
+/*   usertest: 1 for -u switch, 2 for -uu switch (batched, MeshPy).          */
 /*   regionattrib: -A switch.  convex: -c switch.                            */
 /*   weighted: 1 for -w switch, 2 for -W switch.  jettison: -j switch        */
 /*   firstnumber: inverse of -z switch.  All items are numbered starting     */
@@ -1700,6 +1726,9 @@ void info()
 "        triunsuitable().  In either case, the -u switch causes the user-\n");
   printf("        defined test to be applied to every triangle.\n");
   printf(
+"        With -uu, triangles are instead collected and passed in batches\n");
+  printf("        to triunsuitablebatch().\n");
+  printf(
 "    -A  Assigns an additional floating-point attribute to each triangle\n");
   printf(
 "        that identifies what segment-bounded region each triangle belongs\n");
@@ -3374,7 +3403,7 @@ struct behavior *b;
 	}
         if (argv[i][j] == 'u') {
           b->quality = 1;
-          b->usertest = 1;
+          b->usertest++;
         }
 #endif /* not CDT_ONLY */
         if (argv[i][j] == 'A') {
@@ -4481,6 +4510,44 @@ vertex dyingvertex;
   pooldealloc(&m->vertices, (VOID *) dyingvertex);
 }
 
+/*****************************************************************************/
+/*                                                                           */
+/*  lognewvertex()   Record a vertex that Triangle has created, so that a    */
+/*                   persistent triangulation can number it without         */
+/*                   searching all vertices.  (MeshPy)                       */
+/*                                                                           */
+/*  Does nothing unless `m->lognewvertices' is set.  The vertex may be       */
+/*  deallocated again, and its memory reused for another new vertex, before  */
+/*  the log is read; see syncvertexorder().                                  */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+void lognewvertex(struct mesh *m, vertex newvertex)
+#else /* not ANSI_DECLARATORS */
+void lognewvertex(m, newvertex)
+struct mesh *m;
+vertex newvertex;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  vertex *newlog;
+
+  if (!m->lognewvertices) {
+    return;
+  }
+  if (m->newvertexcount == m->newvertexspace) {
+    m->newvertexspace = 2 * m->newvertexspace + 64;
+    newlog = (vertex *) trimalloc((int) (m->newvertexspace * sizeof(vertex)));
+    if (m->newvertices != (vertex *) NULL) {
+      memcpy(newlog, m->newvertices, m->newvertexcount * sizeof(vertex));
+      trifree((VOID *) m->newvertices);
+    }
+    m->newvertices = newlog;
+  }
+  m->newvertices[m->newvertexcount++] = newvertex;
+}
+
 /*****************************************************************************/
 /*                                                                           */
 /*  vertextraverse()   Traverse the vertices, skipping dead ones.            */
@@ -4638,6 +4705,9 @@ struct behavior *b;
       pooldeinit(&m->flipstackers);
     }
   }
+  if (m->pendingtests != (struct pendingtest *) NULL) {
+    trifree((VOID *) m->pendingtests);
+  }
 #endif /* not CDT_ONLY */
   exactdeinit();
 }
@@ -6658,10 +6728,17 @@ struct mesh *m;
   m->recenttri.tri = (triangle *) NULL; /* No triangle has been visited yet. */
   m->undeads = 0;                       /* No eliminated input vertices yet. */
   m->samples = 1;         /* Point location should take at least one sample. */
+  m->carved = 0;                              /* MeshPy: No holes carved yet. */
+  m->connected = 0;                        /* MeshPy: Not known to be so yet. */
   m->checksegments = 0;   /* There are no segments in the triangulation yet. */
   m->checkquality = 0;     /* The quality triangulation stage has not begun. */
   m->incirclecount = m->counterclockcount = m->orient3dcount = 0;
   m->hyperbolacount = m->circletopcount = m->circumcentercount = 0;
+  m->pendingtests = (struct pendingtest *) NULL;
+  m->pendingtestcount = m->pendingtestsize = 0;
+  m->newvertices = (vertex *) NULL;
+  m->newvertexcount = m->newvertexspace = 0;
+  m->lognewvertices = 0;
   randomseed = 1;
 
   exactinit();                     /* Initialize exact arithmetic constants. */
@@ -7207,6 +7284,151 @@ struct osub *testsubseg;
 
 #endif /* not CDT_ONLY */
 
+/*****************************************************************************/
+/*                                                                           */
+/*  deferusertest()   Queue a triangle for a batched user test (MeshPy).     */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifndef CDT_ONLY
+
+#ifdef ANSI_DECLARATORS
+void deferusertest(struct mesh *m, struct otri *testtri, REAL minedge,
+                   vertex testapex, vertex testorg, vertex testdest)
+#else /* not ANSI_DECLARATORS */
+void deferusertest(m, testtri, minedge, testapex, testorg, testdest)
+struct mesh *m;
+struct otri *testtri;
+REAL minedge;
+vertex testapex;
+vertex testorg;
+vertex testdest;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  struct pendingtest *newpending;
+  long newsize;
+
+  if (m->pendingtestcount == m->pendingtestsize) {
+    /* Grow the queue. */
+    newsize = (m->pendingtestsize < 1024) ? 1024 : 2 * m->pendingtestsize;
+    newpending = (struct pendingtest *)
+      trimalloc((int) (newsize * sizeof(struct pendingtest)));
+    if (m->pendingtests != (struct pendingtest *) NULL) {
+      memcpy(newpending, m->pendingtests,
+             m->pendingtestcount * sizeof(struct pendingtest));
+      trifree((VOID *) m->pendingtests);
+    }
+    m->pendingtests = newpending;
+    m->pendingtestsize = newsize;
+  }
+
+  newpending = &m->pendingtests[m->pendingtestcount++];
+  newpending->testtri = encode(*testtri);
+  newpending->key = minedge;
+  newpending->triangapex = testapex;
+  newpending->triangorg = testorg;
+  newpending->triangdest = testdest;
+}
+
+#endif /* not CDT_ONLY */
+
+/*****************************************************************************/
+/*                                                                           */
+/*  flushusertests()   Run the batched user test on all queued triangles     */
+/*                     that still exist, and add the ones found unsuitable   */
+/*                     to the bad triangle queue.  Returns the number of     */
+/*                     triangles added.  If the test asks to stop, no more   */
+/*                     Steiner points are inserted.  (MeshPy)                */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifndef CDT_ONLY
+
+#ifdef ANSI_DECLARATORS
+long flushusertests(struct mesh *m, struct behavior *b)
+#else /* not ANSI_DECLARATORS */
+long flushusertests(m, b)
+struct mesh *m;
+struct behavior *b;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  struct pendingtest *pending;
+  struct otri testtri;
+  vertex torg, tdest, tapex;
+  REAL *vertices, *areas;
+  int *unsuitable;
+  long i, count, enqueued;
+
+  if (m->pendingtestcount == 0) {
+    return 0;
+  }
+
+  /* Weed out triangles that have been destroyed or changed since they */
+  /*   were queued.  Their replacements have been queued as well.      */
+  count = 0;
+  for (i = 0; i < m->pendingtestcount; i++) {
+    pending = &m->pendingtests[i];
+    decode(pending->testtri, testtri);
+    if (deadtri(testtri.tri)) {
+      continue;
+    }
+    org(testtri, torg);
+    dest(testtri, tdest);
+    apex(testtri, tapex);
+    if ((torg == pending->triangorg) && (tdest == pending->triangdest) &&
+        (tapex == pending->triangapex)) {
+      m->pendingtests[count++] = *pending;
+    }
+  }
+  m->pendingtestcount = 0;
+  if (count == 0) {
+    return 0;
+  }
+
+  vertices = (REAL *) trimalloc((int) (count * 6 * sizeof(REAL)));
+  areas = (REAL *) trimalloc((int) (count * sizeof(REAL)));
+  unsuitable = (int *) trimalloc((int) (count * sizeof(int)));
+  for (i = 0; i < count; i++) {
+    pending = &m->pendingtests[i];
+    torg = pending->triangorg;
+    tdest = pending->triangdest;
+    tapex = pending->triangapex;
+    vertices[6 * i] = torg[0];
+    vertices[6 * i + 1] = torg[1];
+    vertices[6 * i + 2] = tdest[0];
+    vertices[6 * i + 3] = tdest[1];
+    vertices[6 * i + 4] = tapex[0];
+    vertices[6 * i + 5] = tapex[1];
+    areas[i] = 0.5 * ((torg[0] - tdest[0]) * (tdest[1] - tapex[1]) -
+                      (torg[1] - tdest[1]) * (tdest[0] - tapex[0]));
+  }
+
+  if (triunsuitablebatch((int) count, vertices, areas, unsuitable)) {
+    /* The test failed.  Stop refining. */
+    m->steinerleft = 0;
+  }
+
+  enqueued = 0;
+  for (i = 0; (i < count) && (m->steinerleft != 0); i++) {
+    if (unsuitable[i]) {
+      pending = &m->pendingtests[i];
+      decode(pending->testtri, testtri);
+      enqueuebadtri(m, b, &testtri, pending->key, pending->triangapex,
+                    pending->triangorg, pending->triangdest);
+      enqueued++;
+    }
+  }
+
+  trifree((VOID *) vertices);
+  trifree((VOID *) areas);
+  trifree((VOID *) unsuitable);
+  return enqueued;
+}
+
+#endif /* not CDT_ONLY */
+
 /*****************************************************************************/
 /*                                                                           */
 /*  testtriangle()   Test a triangle for quality and size.                   */
@@ -7310,13 +7532,14 @@ struct otri *testtri;
       return;
     }
 
-    if (b->usertest) {
+    if (b->usertest == 1) {
       /* Check whether the user thinks this triangle is too large. */
       if (triunsuitable(torg, tdest, tapex, area)) {
         enqueuebadtri(m, b, testtri, minedge, tapex, torg, tdest);
         return;
       }
     }
+    /* With -uu, the user test is deferred until after the angle test. */
   }
 
   /* Check whether the angle is smaller than permitted. */
@@ -7370,6 +7593,9 @@ struct otri *testtri;
           /* If the two distances are equal, don't split the triangle. */
           if ((dist1 < 1.001 * dist2) && (dist1 > 0.999 * dist2)) {
             /* Return now to avoid enqueueing the bad triangle. */
+            if (b->usertest > 1) {
+              deferusertest(m, testtri, minedge, tapex, torg, tdest);
+            }
             return;
           }
         }
@@ -7378,6 +7604,13 @@ struct otri *testtri;
 
     /* Add this triangle to the list of bad triangles. */
     enqueuebadtri(m, b, testtri, minedge, tapex, torg, tdest);
+    return;
+  }
+
+  if (b->usertest > 1) {
+    /* Let the user decide (later, in a batch) whether this triangle is */
+    /*   too large.                                                     */
+    deferusertest(m, testtri, minedge, tapex, torg, tdest);
   }
 }
 
@@ -7796,237 +8029,423 @@ struct otri *searchtri;
   return preciselocate(m, b, searchpoint, searchtri, 0);
 }
 
-/**                                                                         **/
-/**                                                                         **/
-/********* Point location routines end here                          *********/
-
-/********* Mesh transformation routines begin here                   *********/
-/**                                                                         **/
-/**                                                                         **/
-
 /*****************************************************************************/
 /*                                                                           */
-/*  insertsubseg()   Create a new subsegment and insert it between two       */
-/*                   triangles.                                              */
+/*  findreentry()   Find where a line that leaves the mesh enters it again.  */
+/*                  (MeshPy)                                                 */
 /*                                                                           */
-/*  The new subsegment is inserted at the edge described by the handle       */
-/*  `tri'.  Its vertices are properly initialized.  The marker `subsegmark'  */
-/*  is applied to the subsegment and, if appropriate, its vertices.          */
+/*  `searchtri' is a boundary edge, with the mesh to its left and            */
+/*  `searchpoint' strictly to its right.  The line from the midpoint of the  */
+/*  edge to `searchpoint' runs through the region outside the mesh that      */
+/*  lies beyond the edge.  The boundary of that region (a hole, a concavity, */
+/*  or the outside of the mesh) is followed to find the edge through which   */
+/*  the line first enters the mesh again.  If there is one, `searchtri' is   */
+/*  set to it, with `searchpoint' to its left or on it, and 1 is returned.   */
+/*  Otherwise, 0 is returned.  If the mesh is connected, `searchpoint' then  */
+/*  lies outside of it.                                                      */
+/*                                                                           */
+/*  The cost is proportional to the length of the boundary followed.         */
 /*                                                                           */
 /*****************************************************************************/
 
 #ifdef ANSI_DECLARATORS
-void insertsubseg(struct mesh *m, struct behavior *b, struct otri *tri,
-                  int subsegmark)
+int findreentry(struct mesh *m, struct behavior *b, vertex searchpoint,
+                struct otri *searchtri)
 #else /* not ANSI_DECLARATORS */
-void insertsubseg(m, b, tri, subsegmark)
+int findreentry(m, b, searchpoint, searchtri)
 struct mesh *m;
 struct behavior *b;
-struct otri *tri;             /* Edge at which to insert the new subsegment. */
-int subsegmark;                            /* Marker for the new subsegment. */
+vertex searchpoint;
+struct otri *searchtri;
 #endif /* not ANSI_DECLARATORS */
 
 {
-  struct otri oppotri;
-  struct osub newsubseg;
-  vertex triorg, tridest;
+  struct otri edgetri, neighbor, besttri;
+  vertex torg, tdest;
+  REAL midpoint[2];
+  REAL dx, dy, ex, ey, denom, param, bestparam;
+  long steps;
+  int found;
   triangle ptr;                         /* Temporary variable used by sym(). */
-  subseg sptr;                      /* Temporary variable used by tspivot(). */
 
-  org(*tri, triorg);
-  dest(*tri, tridest);
-  /* Mark vertices if possible. */
-  if (vertexmark(triorg) == 0) {
-    setvertexmark(triorg, subsegmark);
-  }
-  if (vertexmark(tridest) == 0) {
-    setvertexmark(tridest, subsegmark);
-  }
-  /* Check if there's already a subsegment here. */
-  tspivot(*tri, newsubseg);
-  if (newsubseg.ss == m->dummysub) {
-    /* Make new subsegment and initialize its vertices. */
-    makesubseg(m, &newsubseg);
-    setsorg(newsubseg, tridest);
-    setsdest(newsubseg, triorg);
-    setsegorg(newsubseg, tridest);
-    setsegdest(newsubseg, triorg);
-    /* Bond new subsegment to the two triangles it is sandwiched between. */
-    /*   Note that the facing triangle `oppotri' might be equal to        */
-    /*   `dummytri' (outer space), but the new subsegment is bonded to it */
-    /*   all the same.                                                    */
-    tsbond(*tri, newsubseg);
-    sym(*tri, oppotri);
-    ssymself(newsubseg);
-    tsbond(oppotri, newsubseg);
-    setmark(newsubseg, subsegmark);
-    if (b->verbose > 2) {
-      printf("  Inserting new ");
-      printsubseg(m, b, &newsubseg);
-    }
-  } else {
-    if (mark(newsubseg) == 0) {
-      setmark(newsubseg, subsegmark);
+  org(*searchtri, torg);
+  dest(*searchtri, tdest);
+  midpoint[0] = 0.5 * (torg[0] + tdest[0]);
+  midpoint[1] = 0.5 * (torg[1] + tdest[1]);
+  dx = searchpoint[0] - midpoint[0];
+  dy = searchpoint[1] - midpoint[1];
+
+  found = 0;
+  bestparam = 0.0;
+  otricopy(*searchtri, edgetri);
+  /* Each step of the walk around a vertex visits a triangle, and each */
+  /*   triangle has three edges, so this bounds the length of the walk. */
+  for (steps = 3 * m->triangles.items; steps > 0; steps--) {
+    /* Rotate clockwise around the destination of `edgetri' to the next */
+    /*   boundary edge of the region beyond `searchtri'.                */
+    lnextself(edgetri);
+    sym(edgetri, neighbor);
+    while (neighbor.tri != m->dummytri) {
+      lnext(neighbor, edgetri);
+      sym(edgetri, neighbor);
+      steps--;
+    }
+    if (otriequal(edgetri, *searchtri)) {
+      break;
+    }
+
+    org(edgetri, torg);
+    dest(edgetri, tdest);
+    /* Does the line enter the mesh through this edge?  (A line through a */
+    /*   vertex is counted for one of the two edges that share it.)       */
+    if ((counterclockwise(m, b, torg, tdest, searchpoint) >= 0.0) &&
+        (counterclockwise(m, b, torg, tdest, midpoint) < 0.0) &&
+        ((counterclockwise(m, b, midpoint, searchpoint, torg) > 0.0) !=
+         (counterclockwise(m, b, midpoint, searchpoint, tdest) > 0.0))) {
+      ex = tdest[0] - torg[0];
+      ey = tdest[1] - torg[1];
+      denom = dx * ey - dy * ex;
+      if (denom != 0.0) {
+        param = ((torg[0] - midpoint[0]) * ey -
+                 (torg[1] - midpoint[1]) * ex) / denom;
+        if (!found || (param < bestparam)) {
+          otricopy(edgetri, besttri);
+          bestparam = param;
+          found = 1;
+        }
+      }
     }
   }
-}
 
-/*****************************************************************************/
-/*                                                                           */
-/*  Terminology                                                              */
-/*                                                                           */
-/*  A "local transformation" replaces a small set of triangles with another  */
-/*  set of triangles.  This may or may not involve inserting or deleting a   */
-/*  vertex.                                                                  */
-/*                                                                           */
-/*  The term "casing" is used to describe the set of triangles that are      */
-/*  attached to the triangles being transformed, but are not transformed     */
-/*  themselves.  Think of the casing as a fixed hollow structure inside      */
-/*  which all the action happens.  A "casing" is only defined relative to    */
-/*  a single transformation; each occurrence of a transformation will        */
-/*  involve a different casing.                                              */
-/*                                                                           */
-/*****************************************************************************/
+  if (found) {
+    otricopy(besttri, *searchtri);
+  }
+  return found;
+}
 
 /*****************************************************************************/
 /*                                                                           */
-/*  flip()   Transform two triangles to two different triangles by flipping  */
-/*           an edge counterclockwise within a quadrilateral.                */
-/*                                                                           */
-/*  Imagine the original triangles, abc and bad, oriented so that the        */
-/*  shared edge ab lies in a horizontal plane, with the vertex b on the left */
-/*  and the vertex a on the right.  The vertex c lies below the edge, and    */
-/*  the vertex d lies above the edge.  The `flipedge' handle holds the edge  */
-/*  ab of triangle abc, and is directed left, from vertex a to vertex b.     */
-/*                                                                           */
-/*  The triangles abc and bad are deleted and replaced by the triangles cdb  */
-/*  and dca.  The triangles that represent abc and bad are NOT deallocated;  */
-/*  they are reused for dca and cdb, respectively.  Hence, any handles that  */
-/*  may have held the original triangles are still valid, although not       */
-/*  directed as they were before.                                            */
-/*                                                                           */
-/*  Upon completion of this routine, the `flipedge' handle holds the edge    */
-/*  dc of triangle dca, and is directed down, from vertex d to vertex c.     */
-/*  (Hence, the two triangles have rotated counterclockwise.)                */
+/*  nonconvexlocate()   Find a triangle or edge containing a given point,    */
+/*                      without leaving a mesh that is not convex.  (MeshPy) */
 /*                                                                           */
-/*  WARNING:  This transformation is geometrically valid only if the         */
-/*  quadrilateral adbc is convex.  Furthermore, this transformation is       */
-/*  valid only if there is not a subsegment between the triangles abc and    */
-/*  bad.  This routine does not check either of these preconditions, and     */
-/*  it is the responsibility of the calling routine to ensure that they are  */
-/*  met.  If they are not, the streets shall be filled with wailing and      */
-/*  gnashing of teeth.                                                       */
+/*  A copy of locate() for robustlocate().  The search starts from the       */
+/*  input `searchtri' or a triangle chosen from a random sample, as in       */
+/*  locate().  Where locate() would turn around through a boundary edge of   */
+/*  a mesh that is not convex and walk from `dummytri', OUTSIDE is returned  */
+/*  instead, with `searchtri' left on that edge as preciselocate() does.     */
 /*                                                                           */
 /*****************************************************************************/
 
 #ifdef ANSI_DECLARATORS
-void flip(struct mesh *m, struct behavior *b, struct otri *flipedge)
+enum locateresult nonconvexlocate(struct mesh *m, struct behavior *b,
+                                  vertex searchpoint, struct otri *searchtri)
 #else /* not ANSI_DECLARATORS */
-void flip(m, b, flipedge)
+enum locateresult nonconvexlocate(m, b, searchpoint, searchtri)
 struct mesh *m;
 struct behavior *b;
-struct otri *flipedge;                    /* Handle for the triangle abc. */
+vertex searchpoint;
+struct otri *searchtri;
 #endif /* not ANSI_DECLARATORS */
 
 {
-  struct otri botleft, botright;
-  struct otri topleft, topright;
-  struct otri top;
-  struct otri botlcasing, botrcasing;
-  struct otri toplcasing, toprcasing;
-  struct osub botlsubseg, botrsubseg;
-  struct osub toplsubseg, toprsubseg;
-  vertex leftvertex, rightvertex, botvertex;
-  vertex farvertex;
+  VOID **sampleblock;
+  char *firsttri;
+  struct otri sampletri;
+  vertex torg, tdest;
+  size_t alignptr;
+  REAL searchdist, dist;
+  REAL ahead;
+  long samplesperblock, totalsamplesleft, samplesleft;
+  long population, totalpopulation;
   triangle ptr;                         /* Temporary variable used by sym(). */
-  subseg sptr;                      /* Temporary variable used by tspivot(). */
 
-  /* Identify the vertices of the quadrilateral. */
-  org(*flipedge, rightvertex);
-  dest(*flipedge, leftvertex);
-  apex(*flipedge, botvertex);
-  sym(*flipedge, top);
-#ifdef SELF_CHECK
-  if (top.tri == m->dummytri) {
-    printf("Internal error in flip():  Attempt to flip on boundary.\n");
-    lnextself(*flipedge);
-    return;
+  org(*searchtri, torg);
+  searchdist = (searchpoint[0] - torg[0]) * (searchpoint[0] - torg[0]) +
+               (searchpoint[1] - torg[1]) * (searchpoint[1] - torg[1]);
+
+  /* Draw random samples as locate() does. */
+  while (SAMPLEFACTOR * m->samples * m->samples * m->samples <
+         m->triangles.items) {
+    m->samples++;
   }
-  if (m->checksegments) {
-    tspivot(*flipedge, toplsubseg);
-    if (toplsubseg.ss != m->dummysub) {
-      printf("Internal error in flip():  Attempt to flip a segment.\n");
-      lnextself(*flipedge);
-      return;
+  samplesperblock = (m->samples * TRIPERBLOCK - 1) / m->triangles.maxitems + 1;
+  samplesleft = (m->samples * m->triangles.itemsfirstblock - 1) /
+                m->triangles.maxitems + 1;
+  totalsamplesleft = m->samples;
+  population = m->triangles.itemsfirstblock;
+  totalpopulation = m->triangles.maxitems;
+  sampleblock = m->triangles.firstblock;
+  sampletri.orient = 0;
+  while (totalsamplesleft > 0) {
+    if (population > totalpopulation) {
+      population = totalpopulation;
     }
-  }
-#endif /* SELF_CHECK */
-  apex(top, farvertex);
-
-  /* Identify the casing of the quadrilateral. */
-  lprev(top, topleft);
-  sym(topleft, toplcasing);
-  lnext(top, topright);
-  sym(topright, toprcasing);
-  lnext(*flipedge, botleft);
-  sym(botleft, botlcasing);
-  lprev(*flipedge, botright);
-  sym(botright, botrcasing);
-  /* Rotate the quadrilateral one-quarter turn counterclockwise. */
-  bond(topleft, botlcasing);
-  bond(botleft, botrcasing);
-  bond(botright, toprcasing);
-  bond(topright, toplcasing);
+    alignptr = (size_t) (sampleblock + 1);
+    firsttri = (char *) (alignptr +
+                         (size_t) m->triangles.alignbytes -
+                         (alignptr %
+                          (size_t) m->triangles.alignbytes));
+    do {
+      sampletri.tri = (triangle *) (firsttri +
+                                    (randomnation((unsigned int) population) *
+                                     m->triangles.itembytes));
+      if (!deadtri(sampletri.tri)) {
+        org(sampletri, torg);
+        dist = (searchpoint[0] - torg[0]) * (searchpoint[0] - torg[0]) +
+               (searchpoint[1] - torg[1]) * (searchpoint[1] - torg[1]);
+        if (dist < searchdist) {
+          otricopy(sampletri, *searchtri);
+          searchdist = dist;
+        }
+      }
+      samplesleft--;
+      totalsamplesleft--;
+    } while ((samplesleft > 0) && (totalsamplesleft > 0));
+    if (totalsamplesleft > 0) {
+      sampleblock = (VOID **) *sampleblock;
+      samplesleft = samplesperblock;
+      totalpopulation -= population;
+      population = TRIPERBLOCK;
+    }
+  }
 
-  if (m->checksegments) {
-    /* Check for subsegments and rebond them to the quadrilateral. */
-    tspivot(topleft, toplsubseg);
-    tspivot(botleft, botlsubseg);
-    tspivot(botright, botrsubseg);
-    tspivot(topright, toprsubseg);
-    if (toplsubseg.ss == m->dummysub) {
-      tsdissolve(topright);
-    } else {
-      tsbond(topright, toplsubseg);
+  org(*searchtri, torg);
+  dest(*searchtri, tdest);
+  if ((torg[0] == searchpoint[0]) && (torg[1] == searchpoint[1])) {
+    return ONVERTEX;
+  }
+  if ((tdest[0] == searchpoint[0]) && (tdest[1] == searchpoint[1])) {
+    lnextself(*searchtri);
+    return ONVERTEX;
+  }
+  ahead = counterclockwise(m, b, torg, tdest, searchpoint);
+  if (ahead < 0.0) {
+    sym(*searchtri, sampletri);
+    if (sampletri.tri == m->dummytri) {
+      /* The edge is on the boundary, and the point beyond it. */
+      return OUTSIDE;
     }
-    if (botlsubseg.ss == m->dummysub) {
-      tsdissolve(topleft);
-    } else {
-      tsbond(topleft, botlsubseg);
+    otricopy(sampletri, *searchtri);
+  } else if (ahead == 0.0) {
+    if (((torg[0] < searchpoint[0]) == (searchpoint[0] < tdest[0])) &&
+        ((torg[1] < searchpoint[1]) == (searchpoint[1] < tdest[1]))) {
+      return ONEDGE;
     }
-    if (botrsubseg.ss == m->dummysub) {
-      tsdissolve(botleft);
-    } else {
-      tsbond(botleft, botrsubseg);
+  }
+  return preciselocate(m, b, searchpoint, searchtri, 0);
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  robustlocate()   Find a triangle or edge containing a given point, even  */
+/*                   in a triangulation that is not convex.  (MeshPy)        */
+/*                                                                           */
+/*  Tries nonconvexlocate() first.  If that walks out of the mesh, which     */
+/*  may happen after holes and concavities have been carved, the walk is     */
+/*  resumed where the line toward the point enters the mesh again; see       */
+/*  findreentry().  If the line does not enter the mesh again and the mesh   */
+/*  is connected, the point is outside.  Only if that does not settle it     */
+/*  within a few tries is every triangle checked in turn.  Returns the same  */
+/*  values as locate(); OUTSIDE means that the point really is outside the   */
+/*  mesh, and `searchtri' is then meaningless.                               */
+/*                                                                           */
+/*****************************************************************************/
+
+#define ROBUSTLOCATETRIES 16
+
+#ifdef ANSI_DECLARATORS
+enum locateresult robustlocate(struct mesh *m, struct behavior *b,
+                               vertex searchpoint, struct otri *searchtri)
+#else /* not ANSI_DECLARATORS */
+enum locateresult robustlocate(m, b, searchpoint, searchtri)
+struct mesh *m;
+struct behavior *b;
+vertex searchpoint;
+struct otri *searchtri;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  enum locateresult intersect;
+  vertex torg, tdest;
+  REAL ahead;
+  int onedge;
+  int inside;
+  int tries;
+  triangle ptr;                         /* Temporary variable used by sym(). */
+
+  /* Start from any live triangle.  (The neighbors recorded in `dummytri' */
+  /*   may have been deleted with the holes.)                             */
+  if ((m->recenttri.tri != (triangle *) NULL) && !deadtri(m->recenttri.tri)) {
+    otricopy(m->recenttri, *searchtri);
+  } else {
+    traversalinit(&m->triangles);
+    searchtri->tri = triangletraverse(m);
+    searchtri->orient = 0;
+  }
+  intersect = nonconvexlocate(m, b, searchpoint, searchtri);
+
+  /* `searchtri' is now the boundary edge through which the walk left. */
+  for (tries = 0; (intersect == OUTSIDE) && (tries < ROBUSTLOCATETRIES);
+       tries++) {
+    if (!findreentry(m, b, searchpoint, searchtri)) {
+      if (m->connected) {
+        return OUTSIDE;
+      }
+      break;
     }
-    if (toprsubseg.ss == m->dummysub) {
-      tsdissolve(botright);
-    } else {
-      tsbond(botright, toprsubseg);
+    org(*searchtri, torg);
+    dest(*searchtri, tdest);
+    if ((torg[0] == searchpoint[0]) && (torg[1] == searchpoint[1])) {
+      return ONVERTEX;
+    }
+    if ((tdest[0] == searchpoint[0]) && (tdest[1] == searchpoint[1])) {
+      lnextself(*searchtri);
+      return ONVERTEX;
+    }
+    if (counterclockwise(m, b, torg, tdest, searchpoint) == 0.0) {
+      return ONEDGE;
     }
+    intersect = preciselocate(m, b, searchpoint, searchtri, 0);
+  }
+  if (intersect != OUTSIDE) {
+    return intersect;
   }
 
-  /* New vertex assignments for the rotated quadrilateral. */
-  setorg(*flipedge, farvertex);
-  setdest(*flipedge, botvertex);
-  setapex(*flipedge, rightvertex);
-  setorg(top, botvertex);
-  setdest(top, farvertex);
-  setapex(top, leftvertex);
-  if (b->verbose > 2) {
-    printf("  Edge flip results in left ");
-    printtriangle(m, b, &top);
-    printf("  and right ");
-    printtriangle(m, b, flipedge);
+  /* As a last resort, check every triangle. */
+  traversalinit(&m->triangles);
+  searchtri->tri = triangletraverse(m);
+  while (searchtri->tri != (triangle *) NULL) {
+    for (searchtri->orient = 0; searchtri->orient < 3; searchtri->orient++) {
+      org(*searchtri, torg);
+      if ((torg[0] == searchpoint[0]) && (torg[1] == searchpoint[1])) {
+        return ONVERTEX;
+      }
+    }
+    onedge = -1;
+    inside = 1;
+    for (searchtri->orient = 0; searchtri->orient < 3; searchtri->orient++) {
+      org(*searchtri, torg);
+      dest(*searchtri, tdest);
+      ahead = counterclockwise(m, b, torg, tdest, searchpoint);
+      if (ahead < 0.0) {
+        inside = 0;
+        break;
+      } else if (ahead == 0.0) {
+        onedge = searchtri->orient;
+      }
+    }
+    if (inside) {
+      if (onedge >= 0) {
+        searchtri->orient = onedge;
+        return ONEDGE;
+      }
+      searchtri->orient = 0;
+      return INTRIANGLE;
+    }
+    searchtri->tri = triangletraverse(m);
   }
+
+  searchtri->tri = m->dummytri;
+  searchtri->orient = 0;
+  return OUTSIDE;
 }
 
+/**                                                                         **/
+/**                                                                         **/
+/********* Point location routines end here                          *********/
+
+/********* Mesh transformation routines begin here                   *********/
+/**                                                                         **/
+/**                                                                         **/
+
 /*****************************************************************************/
 /*                                                                           */
-/*  unflip()   Transform two triangles to two different triangles by         */
-/*             flipping an edge clockwise within a quadrilateral.  Reverses  */
-/*             the flip() operation so that the data structures representing */
-/*             the triangles are back where they were before the flip().     */
+/*  insertsubseg()   Create a new subsegment and insert it between two       */
+/*                   triangles.                                              */
+/*                                                                           */
+/*  The new subsegment is inserted at the edge described by the handle       */
+/*  `tri'.  Its vertices are properly initialized.  The marker `subsegmark'  */
+/*  is applied to the subsegment and, if appropriate, its vertices.          */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+void insertsubseg(struct mesh *m, struct behavior *b, struct otri *tri,
+                  int subsegmark)
+#else /* not ANSI_DECLARATORS */
+void insertsubseg(m, b, tri, subsegmark)
+struct mesh *m;
+struct behavior *b;
+struct otri *tri;             /* Edge at which to insert the new subsegment. */
+int subsegmark;                            /* Marker for the new subsegment. */
+#endif /* not ANSI_DECLARATORS */
+
+{
+  struct otri oppotri;
+  struct osub newsubseg;
+  vertex triorg, tridest;
+  triangle ptr;                         /* Temporary variable used by sym(). */
+  subseg sptr;                      /* Temporary variable used by tspivot(). */
+
+  org(*tri, triorg);
+  dest(*tri, tridest);
+  /* Mark vertices if possible. */
+  if (vertexmark(triorg) == 0) {
+    setvertexmark(triorg, subsegmark);
+  }
+  if (vertexmark(tridest) == 0) {
+    setvertexmark(tridest, subsegmark);
+  }
+  /* Check if there's already a subsegment here. */
+  tspivot(*tri, newsubseg);
+  if (newsubseg.ss == m->dummysub) {
+    /* Make new subsegment and initialize its vertices. */
+    makesubseg(m, &newsubseg);
+    setsorg(newsubseg, tridest);
+    setsdest(newsubseg, triorg);
+    setsegorg(newsubseg, tridest);
+    setsegdest(newsubseg, triorg);
+    /* Bond new subsegment to the two triangles it is sandwiched between. */
+    /*   Note that the facing triangle `oppotri' might be equal to        */
+    /*   `dummytri' (outer space), but the new subsegment is bonded to it */
+    /*   all the same.                                                    */
+    tsbond(*tri, newsubseg);
+    sym(*tri, oppotri);
+    ssymself(newsubseg);
+    tsbond(oppotri, newsubseg);
+    setmark(newsubseg, subsegmark);
+    if (b->verbose > 2) {
+      printf("  Inserting new ");
+      printsubseg(m, b, &newsubseg);
+    }
+  } else {
+    if (mark(newsubseg) == 0) {
+      setmark(newsubseg, subsegmark);
+    }
+  }
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  Terminology                                                              */
+/*                                                                           */
+/*  A "local transformation" replaces a small set of triangles with another  */
+/*  set of triangles.  This may or may not involve inserting or deleting a   */
+/*  vertex.                                                                  */
+/*                                                                           */
+/*  The term "casing" is used to describe the set of triangles that are      */
+/*  attached to the triangles being transformed, but are not transformed     */
+/*  themselves.  Think of the casing as a fixed hollow structure inside      */
+/*  which all the action happens.  A "casing" is only defined relative to    */
+/*  a single transformation; each occurrence of a transformation will        */
+/*  involve a different casing.                                              */
+/*                                                                           */
+/*****************************************************************************/
+
+/*****************************************************************************/
+/*                                                                           */
+/*  flip()   Transform two triangles to two different triangles by flipping  */
+/*           an edge counterclockwise within a quadrilateral.                */
 /*                                                                           */
 /*  Imagine the original triangles, abc and bad, oriented so that the        */
 /*  shared edge ab lies in a horizontal plane, with the vertex b on the left */
@@ -8036,13 +8455,13 @@ struct otri *flipedge;                    /* Handle for the triangle abc. */
 /*                                                                           */
 /*  The triangles abc and bad are deleted and replaced by the triangles cdb  */
 /*  and dca.  The triangles that represent abc and bad are NOT deallocated;  */
-/*  they are reused for cdb and dca, respectively.  Hence, any handles that  */
+/*  they are reused for dca and cdb, respectively.  Hence, any handles that  */
 /*  may have held the original triangles are still valid, although not       */
 /*  directed as they were before.                                            */
 /*                                                                           */
 /*  Upon completion of this routine, the `flipedge' handle holds the edge    */
-/*  cd of triangle cdb, and is directed up, from vertex c to vertex d.       */
-/*  (Hence, the two triangles have rotated clockwise.)                       */
+/*  dc of triangle dca, and is directed down, from vertex d to vertex c.     */
+/*  (Hence, the two triangles have rotated counterclockwise.)                */
 /*                                                                           */
 /*  WARNING:  This transformation is geometrically valid only if the         */
 /*  quadrilateral adbc is convex.  Furthermore, this transformation is       */
@@ -8055,9 +8474,9 @@ struct otri *flipedge;                    /* Handle for the triangle abc. */
 /*****************************************************************************/
 
 #ifdef ANSI_DECLARATORS
-void unflip(struct mesh *m, struct behavior *b, struct otri *flipedge)
+void flip(struct mesh *m, struct behavior *b, struct otri *flipedge)
 #else /* not ANSI_DECLARATORS */
-void unflip(m, b, flipedge)
+void flip(m, b, flipedge)
 struct mesh *m;
 struct behavior *b;
 struct otri *flipedge;                    /* Handle for the triangle abc. */
@@ -8083,14 +8502,14 @@ struct otri *flipedge;                    /* Handle for the triangle abc. */
   sym(*flipedge, top);
 #ifdef SELF_CHECK
   if (top.tri == m->dummytri) {
-    printf("Internal error in unflip():  Attempt to flip on boundary.\n");
+    printf("Internal error in flip():  Attempt to flip on boundary.\n");
     lnextself(*flipedge);
     return;
   }
   if (m->checksegments) {
     tspivot(*flipedge, toplsubseg);
     if (toplsubseg.ss != m->dummysub) {
-      printf("Internal error in unflip():  Attempt to flip a subsegment.\n");
+      printf("Internal error in flip():  Attempt to flip a segment.\n");
       lnextself(*flipedge);
       return;
     }
@@ -8107,14 +8526,149 @@ struct otri *flipedge;                    /* Handle for the triangle abc. */
   sym(botleft, botlcasing);
   lprev(*flipedge, botright);
   sym(botright, botrcasing);
-  /* Rotate the quadrilateral one-quarter turn clockwise. */
-  bond(topleft, toprcasing);
-  bond(botleft, toplcasing);
-  bond(botright, botlcasing);
-  bond(topright, botrcasing);
-
-  if (m->checksegments) {
-    /* Check for subsegments and rebond them to the quadrilateral. */
+  /* Rotate the quadrilateral one-quarter turn counterclockwise. */
+  bond(topleft, botlcasing);
+  bond(botleft, botrcasing);
+  bond(botright, toprcasing);
+  bond(topright, toplcasing);
+
+  if (m->checksegments) {
+    /* Check for subsegments and rebond them to the quadrilateral. */
+    tspivot(topleft, toplsubseg);
+    tspivot(botleft, botlsubseg);
+    tspivot(botright, botrsubseg);
+    tspivot(topright, toprsubseg);
+    if (toplsubseg.ss == m->dummysub) {
+      tsdissolve(topright);
+    } else {
+      tsbond(topright, toplsubseg);
+    }
+    if (botlsubseg.ss == m->dummysub) {
+      tsdissolve(topleft);
+    } else {
+      tsbond(topleft, botlsubseg);
+    }
+    if (botrsubseg.ss == m->dummysub) {
+      tsdissolve(botleft);
+    } else {
+      tsbond(botleft, botrsubseg);
+    }
+    if (toprsubseg.ss == m->dummysub) {
+      tsdissolve(botright);
+    } else {
+      tsbond(botright, toprsubseg);
+    }
+  }
+
+  /* New vertex assignments for the rotated quadrilateral. */
+  setorg(*flipedge, farvertex);
+  setdest(*flipedge, botvertex);
+  setapex(*flipedge, rightvertex);
+  setorg(top, botvertex);
+  setdest(top, farvertex);
+  setapex(top, leftvertex);
+  if (b->verbose > 2) {
+    printf("  Edge flip results in left ");
+    printtriangle(m, b, &top);
+    printf("  and right ");
+    printtriangle(m, b, flipedge);
+  }
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  unflip()   Transform two triangles to two different triangles by         */
+/*             flipping an edge clockwise within a quadrilateral.  Reverses  */
+/*             the flip() operation so that the data structures representing */
+/*             the triangles are back where they were before the flip().     */
+/*                                                                           */
+/*  Imagine the original triangles, abc and bad, oriented so that the        */
+/*  shared edge ab lies in a horizontal plane, with the vertex b on the left */
+/*  and the vertex a on the right.  The vertex c lies below the edge, and    */
+/*  the vertex d lies above the edge.  The `flipedge' handle holds the edge  */
+/*  ab of triangle abc, and is directed left, from vertex a to vertex b.     */
+/*                                                                           */
+/*  The triangles abc and bad are deleted and replaced by the triangles cdb  */
+/*  and dca.  The triangles that represent abc and bad are NOT deallocated;  */
+/*  they are reused for cdb and dca, respectively.  Hence, any handles that  */
+/*  may have held the original triangles are still valid, although not       */
+/*  directed as they were before.                                            */
+/*                                                                           */
+/*  Upon completion of this routine, the `flipedge' handle holds the edge    */
+/*  cd of triangle cdb, and is directed up, from vertex c to vertex d.       */
+/*  (Hence, the two triangles have rotated clockwise.)                       */
+/*                                                                           */
+/*  WARNING:  This transformation is geometrically valid only if the         */
+/*  quadrilateral adbc is convex.  Furthermore, this transformation is       */
+/*  valid only if there is not a subsegment between the triangles abc and    */
+/*  bad.  This routine does not check either of these preconditions, and     */
+/*  it is the responsibility of the calling routine to ensure that they are  */
+/*  met.  If they are not, the streets shall be filled with wailing and      */
+/*  gnashing of teeth.                                                       */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+void unflip(struct mesh *m, struct behavior *b, struct otri *flipedge)
+#else /* not ANSI_DECLARATORS */
+void unflip(m, b, flipedge)
+struct mesh *m;
+struct behavior *b;
+struct otri *flipedge;                    /* Handle for the triangle abc. */
+#endif /* not ANSI_DECLARATORS */
+
+{
+  struct otri botleft, botright;
+  struct otri topleft, topright;
+  struct otri top;
+  struct otri botlcasing, botrcasing;
+  struct otri toplcasing, toprcasing;
+  struct osub botlsubseg, botrsubseg;
+  struct osub toplsubseg, toprsubseg;
+  vertex leftvertex, rightvertex, botvertex;
+  vertex farvertex;
+  triangle ptr;                         /* Temporary variable used by sym(). */
+  subseg sptr;                      /* Temporary variable used by tspivot(). */
+
+  /* Identify the vertices of the quadrilateral. */
+  org(*flipedge, rightvertex);
+  dest(*flipedge, leftvertex);
+  apex(*flipedge, botvertex);
+  sym(*flipedge, top);
+#ifdef SELF_CHECK
+  if (top.tri == m->dummytri) {
+    printf("Internal error in unflip():  Attempt to flip on boundary.\n");
+    lnextself(*flipedge);
+    return;
+  }
+  if (m->checksegments) {
+    tspivot(*flipedge, toplsubseg);
+    if (toplsubseg.ss != m->dummysub) {
+      printf("Internal error in unflip():  Attempt to flip a subsegment.\n");
+      lnextself(*flipedge);
+      return;
+    }
+  }
+#endif /* SELF_CHECK */
+  apex(top, farvertex);
+
+  /* Identify the casing of the quadrilateral. */
+  lprev(top, topleft);
+  sym(topleft, toplcasing);
+  lnext(top, topright);
+  sym(topright, toprcasing);
+  lnext(*flipedge, botleft);
+  sym(botleft, botlcasing);
+  lprev(*flipedge, botright);
+  sym(botright, botrcasing);
+  /* Rotate the quadrilateral one-quarter turn clockwise. */
+  bond(topleft, toprcasing);
+  bond(botleft, toplcasing);
+  bond(botright, botlcasing);
+  bond(topright, botrcasing);
+
+  if (m->checksegments) {
+    /* Check for subsegments and rebond them to the quadrilateral. */
     tspivot(topleft, toplsubseg);
     tspivot(botleft, botlsubseg);
     tspivot(botright, botrsubseg);
@@ -11744,6 +12298,7 @@ vertex endpoint2;
   split = (ey * etx - ex * ety) / denom;
   /* Create the new vertex. */
   newvertex = (vertex) poolalloc(&m->vertices);
+  lognewvertex(m, newvertex);                                     /* MeshPy */
   /* Interpolate its coordinate and attributes. */
   for (i = 0; i < 2 + m->nextras; i++) {
     newvertex[i] = torg[i] + split * (tdest[i] - torg[i]);
@@ -11934,6 +12489,7 @@ int newmark;
   }
   /* Create a new vertex to insert in the middle of the segment. */
   newvertex = (vertex) poolalloc(&m->vertices);
+  lognewvertex(m, newvertex);                                     /* MeshPy */
   /* Interpolate coordinates and attributes. */
   for (i = 0; i < 2 + m->nextras; i++) {
     newvertex[i] = 0.5 * (endpoint1[i] + endpoint2[i]);
@@ -12294,7 +12850,10 @@ int newmark;
     searchtri1.orient = 0;
     symself(searchtri1);
     /* Search for the segment's first endpoint by point location. */
-    if (locate(m, b, endpoint1, &searchtri1) != ONVERTEX) {
+    /*   (MeshPy: robustlocate() if segments are inserted into a     */
+    /*   mesh whose holes have been carved.)                          */
+    if ((m->carved ? robustlocate(m, b, endpoint1, &searchtri1) :
+         locate(m, b, endpoint1, &searchtri1)) != ONVERTEX) {
       printf(
         "Internal error in insertsegment():  Unable to locate PSLG vertex\n");
       printf("  (%.12g, %.12g) in triangulation.\n",
@@ -12327,7 +12886,8 @@ int newmark;
     searchtri2.orient = 0;
     symself(searchtri2);
     /* Search for the segment's second endpoint by point location. */
-    if (locate(m, b, endpoint2, &searchtri2) != ONVERTEX) {
+    if ((m->carved ? robustlocate(m, b, endpoint2, &searchtri2) :
+         locate(m, b, endpoint2, &searchtri2)) != ONVERTEX) {
       printf(
         "Internal error in insertsegment():  Unable to locate PSLG vertex\n");
       printf("  (%.12g, %.12g) in triangulation.\n",
@@ -13381,6 +13941,7 @@ int triflaws;
 
         /* Create the new vertex. */
         newvertex = (vertex) poolalloc(&m->vertices);
+        lognewvertex(m, newvertex);                               /* MeshPy */
         /* Interpolate its coordinate and attributes. */
         for (i = 0; i < 2 + m->nextras; i++) {
           newvertex[i] = eorg[i] + split * (edest[i] - eorg[i]);
@@ -13528,6 +14089,7 @@ struct badtriang *badtri;
     errorflag = 0;
     /* Create a new vertex at the triangle's circumcenter. */
     newvertex = (vertex) poolalloc(&m->vertices);
+    lognewvertex(m, newvertex);                                   /* MeshPy */
     findcircumcenter(m, b, borg, bdest, bapex, newvertex, &xi, &eta, 1);
 
     /* Check whether the new vertex lies on a triangle vertex. */
@@ -13630,6 +14192,7 @@ struct behavior *b;
 
 {
   struct badtriang *badtri;
+  long steps;
   int i;
 
   if (!b->quiet) {
@@ -13670,7 +14233,20 @@ struct behavior *b;
     if (b->verbose) {
       printf("  Splitting bad triangles.\n");
     }
-    while ((m->badtriangles.items > 0) && (m->steinerleft != 0)) {
+    /* With -uu, user tests are run in a batch whenever the bad triangle */
+    /*   queue runs empty.                                               */
+    /* MeshPy: Every 64 steps, report progress through triprogress(), */
+    /*   which may stop the refinement.                               */
+    steps = 0;
+    while (((m->badtriangles.items > 0) || (flushusertests(m, b) > 0)) &&
+           (m->steinerleft != 0)) {
+      if ((++steps & 63) == 0) {
+        if (triprogress("refinement", m->vertices.items, m->triangles.items,
+                        m->badtriangles.items)) {
+          m->steinerleft = 0;
+          break;
+        }
+      }
       /* Fix one bad triangle by inserting a vertex at its circumcenter. */
       badtri = dequeuebadtriang(m);
       splittriangle(m, b, badtri);
@@ -15649,6 +16225,57 @@ struct behavior *b;
   }
 }
 
+#ifdef TRILIBRARY
+
+/*****************************************************************************/
+/*                                                                           */
+/*  wallclock()   Return the wall clock time in seconds.                     */
+/*                                                                           */
+/*  MeshPy: Used for the phase times in `triangulateio.stats'.               */
+/*                                                                           */
+/*****************************************************************************/
+
+REAL wallclock()
+{
+  return std::chrono::duration<REAL>(
+      std::chrono::steady_clock::now().time_since_epoch()).count();
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  recordphase()   Record the wall clock time of a phase.                   */
+/*                                                                           */
+/*  MeshPy: The phase lasted from `*phasestart' until now, which is also     */
+/*  the start of the next phase.                                             */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+void recordphase(struct triangulateio *out, const char *name,
+                 REAL *phasestart)
+#else /* not ANSI_DECLARATORS */
+void recordphase(out, name, phasestart)
+struct triangulateio *out;
+const char *name;
+REAL *phasestart;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  struct triangulatestats *st;
+  REAL now;
+
+  now = wallclock();
+  st = &out->stats;
+  if (st->numberofphases < TRISTATSMAXPHASES) {
+    st->phasenames[st->numberofphases] = name;
+    st->phaseseconds[st->numberofphases] = now - *phasestart;
+    st->numberofphases++;
+  }
+  *phasestart = now;
+}
+
+#endif /* TRILIBRARY */
+
 /*****************************************************************************/
 /*                                                                           */
 /*  main() or triangulate()   Gosh, do everything.                           */
@@ -15706,6 +16333,8 @@ char **argv;
   REAL *regionarray;   /* Array of regional attributes and area constraints. */
 #ifndef TRILIBRARY
   FILE *polyfile;
+#else /* TRILIBRARY */
+  REAL phasestart;       /* MeshPy: Start of the current phase, for stats. */
 #endif /* not TRILIBRARY */
 #ifndef NO_TIMER
   /* Variables for timing the performance of Triangle.  The types are */
@@ -15717,6 +16346,10 @@ char **argv;
 #ifndef NO_TIMER
   gettimeofday(&tv0, &tz);
 #endif /* not NO_TIMER */
+#ifdef TRILIBRARY
+  memset(&out->stats, 0, sizeof(out->stats));
+  phasestart = wallclock();
+#endif /* TRILIBRARY */
 
   triangleinit(&m);
 #ifdef TRILIBRARY
@@ -15730,6 +16363,7 @@ char **argv;
   transfernodes(&m, &b, in->pointlist, in->pointattributelist,
                 in->pointmarkerlist, in->numberofpoints,
                 in->numberofpointattributes);
+  recordphase(out, "input", &phasestart);
 #else /* not TRILIBRARY */
   readnodes(&m, &b, b.innodefilename, b.inpolyfilename, &polyfile);
 #endif /* not TRILIBRARY */
@@ -15760,6 +16394,9 @@ char **argv;
     m.hullsize = delaunay(&m, &b);              /* Triangulate the vertices. */
   }
 #endif /* not CDT_ONLY */
+#ifdef TRILIBRARY
+  recordphase(out, b.refine ? "reconstruction" : "delaunay", &phasestart);
+#endif /* TRILIBRARY */
 
 #ifndef NO_TIMER
   if (!b.quiet) {
@@ -15787,6 +16424,7 @@ char **argv;
 #ifdef TRILIBRARY
       formskeleton(&m, &b, in->segmentlist,
                    in->segmentmarkerlist, in->numberofsegments);
+      recordphase(out, "segments", &phasestart);
 #else /* not TRILIBRARY */
       formskeleton(&m, &b, polyfile, b.inpolyfilename);
 #endif /* not TRILIBRARY */
@@ -15817,6 +16455,9 @@ char **argv;
     if (!b.refine) {
       /* Carve out holes and concavities. */
       carveholes(&m, &b, holearray, m.holes, regionarray, m.regions);
+#ifdef TRILIBRARY
+      recordphase(out, "hole_carving", &phasestart);
+#endif /* TRILIBRARY */
     }
   } else {
     /* Without a PSLG, there can be no holes or regional attributes   */
@@ -15839,6 +16480,9 @@ char **argv;
 #ifndef CDT_ONLY
   if (b.quality && (m.triangles.items > 0)) {
     enforcequality(&m, &b);           /* Enforce angle and area constraints. */
+#ifdef TRILIBRARY
+    recordphase(out, "refinement", &phasestart);
+#endif /* TRILIBRARY */
   }
 #endif /* not CDT_ONLY */
 
@@ -15989,6 +16633,20 @@ char **argv;
 #endif /* not TRILIBRARY */
   }
 
+#ifdef TRILIBRARY
+  /* MeshPy: Record the counters in out->stats. */
+  recordphase(out, "output", &phasestart);
+  out->stats.steinerpoints = m.vertices.items - m.invertices;
+  out->stats.maxvertices = m.vertices.maxitems;
+  out->stats.maxtriangles = m.triangles.maxitems;
+  out->stats.maxsubsegs = m.subsegs.maxitems;
+  out->stats.maxbadtriangles = m.badtriangles.maxitems;
+  out->stats.vertexbytes = m.vertices.itembytes;
+  out->stats.trianglebytes = m.triangles.itembytes;
+  out->stats.subsegbytes = m.subsegs.itembytes;
+  out->stats.badtrianglebytes = m.badtriangles.itembytes;
+#endif /* TRILIBRARY */
+
   if (!b.quiet) {
 #ifndef NO_TIMER
     gettimeofday(&tv6, &tz);
@@ -16015,3 +16673,945 @@ char **argv;
   return 0;
 #endif /* not TRILIBRARY */
 }
+
+/********* Persistent triangulations begin here (MeshPy)             *********/
+/**                                                                         **/
+/**                                                                         **/
+
+/*****************************************************************************/
+/*                                                                           */
+/*  The functions below keep a mesh alive between calls, so that vertices    */
+/*  and segments can be added to (and vertices removed from) a triangulation */
+/*  without rebuilding it from scratch.                                      */
+/*                                                                           */
+/*  Vertices are numbered (starting at `firstnumber') in the order kept in   */
+/*  `vertexorder'.  New vertices are appended, removed vertices are dropped  */
+/*  and the numbers of the following vertices decrease accordingly.          */
+/*  Vertices that Triangle creates on its own, for instance where a new      */
+/*  segment crosses an old one, are appended as well.                        */
+/*                                                                           */
+/*  So that an update costs time proportional to the change, a removed       */
+/*  vertex leaves a NULL entry in `vertexorder', and `livetree' (a Fenwick   */
+/*  tree over the entries) counts the entries that are not NULL.  It maps a  */
+/*  vertex number to its entry in time logarithmic in the number of entries. */
+/*  The NULL entries are dropped whenever `vertexorder' is reallocated.      */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef TRILIBRARY
+
+struct triangulation {
+  struct mesh m;
+  struct behavior b;
+  vertex *vertexorder;       /* The numbered vertices, NULL where removed. */
+  long *livetree;              /* Counts of non-NULL entries, 1-based. */
+  long vertexcount;                                /* Number of vertices. */
+  long entrycount;                   /* Number of entries in use, <= space. */
+  long vertexspace;                       /* Number of entries allocated. */
+};
+
+/*****************************************************************************/
+/*                                                                           */
+/*  addlive()   Add `delta' to the count of entry `entry' in `livetree'.     */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+void addlive(struct triangulation *t, long entry, long delta)
+#else /* not ANSI_DECLARATORS */
+void addlive(t, entry, delta)
+struct triangulation *t;
+long entry;
+long delta;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  long i;
+
+  for (i = entry + 1; i <= t->vertexspace; i += i & -i) {
+    t->livetree[i] += delta;
+  }
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  numberedentry()   Find the entry of `vertexorder' that holds the vertex  */
+/*                    with the given number (counting from zero).            */
+/*                                                                           */
+/*  The number must be valid.                                                */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+long numberedentry(struct triangulation *t, long number)
+#else /* not ANSI_DECLARATORS */
+long numberedentry(t, number)
+struct triangulation *t;
+long number;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  long entry, step;
+
+  /* Find the last entry before which there are at most `number' live */
+  /*   entries.                                                       */
+  entry = 0;
+  step = 1;
+  while (2 * step <= t->vertexspace) {
+    step *= 2;
+  }
+  for (; step > 0; step /= 2) {
+    if ((entry + step <= t->vertexspace) &&
+        (t->livetree[entry + step] <= number)) {
+      entry += step;
+      number -= t->livetree[entry];
+    }
+  }
+  return entry;
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  compactvertexorder()   Drop the NULL entries of `vertexorder' and        */
+/*                         rebuild `livetree'.                               */
+/*                                                                           */
+/*  Takes time proportional to the number of entries.                        */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+void compactvertexorder(struct triangulation *t)
+#else /* not ANSI_DECLARATORS */
+void compactvertexorder(t)
+struct triangulation *t;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  long i, j;
+
+  j = 0;
+  for (i = 0; i < t->entrycount; i++) {
+    if (t->vertexorder[i] != (vertex) NULL) {
+      t->vertexorder[j++] = t->vertexorder[i];
+    }
+  }
+  t->entrycount = j;
+
+  /* Build the Fenwick tree in linear time. */
+  for (i = 1; i <= t->vertexspace; i++) {
+    t->livetree[i] = (i <= t->entrycount) ? 1 : 0;
+  }
+  for (i = 1; i <= t->vertexspace; i++) {
+    j = i + (i & -i);
+    if (j <= t->vertexspace) {
+      t->livetree[j] += t->livetree[i];
+    }
+  }
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  appendvertex()   Append a vertex to the numbering of a triangulation.    */
+/*                                                                           */
+/*  When `vertexorder' is full, it is reallocated and compacted, which takes */
+/*  time proportional to the number of vertices, but only after as many      */
+/*  appends.                                                                 */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+void appendvertex(struct triangulation *t, vertex newvertex)
+#else /* not ANSI_DECLARATORS */
+void appendvertex(t, newvertex)
+struct triangulation *t;
+vertex newvertex;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  vertex *neworder;
+
+  if (t->entrycount == t->vertexspace) {
+    t->vertexspace = 2 * t->vertexcount + 64;
+    neworder = (vertex *) trimalloc((int) (t->vertexspace * sizeof(vertex)));
+    if (t->vertexorder != (vertex *) NULL) {
+      memcpy(neworder, t->vertexorder, t->entrycount * sizeof(vertex));
+      trifree((VOID *) t->vertexorder);
+      trifree((VOID *) t->livetree);
+    }
+    t->vertexorder = neworder;
+    t->livetree = (long *) trimalloc((int) ((t->vertexspace + 1) *
+                                            sizeof(long)));
+    compactvertexorder(t);
+  }
+  t->vertexorder[t->entrycount] = newvertex;
+  addlive(t, t->entrycount, 1);
+  t->entrycount++;
+  t->vertexcount++;
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  numberedvertex()   The vertex with the given number (counting from       */
+/*                     zero), which must be valid.                           */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+vertex numberedvertex(struct triangulation *t, long number)
+#else /* not ANSI_DECLARATORS */
+vertex numberedvertex(t, number)
+struct triangulation *t;
+long number;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  return t->vertexorder[numberedentry(t, number)];
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  syncvertexorder()   Append vertices that Triangle created on its own to  */
+/*                      the numbering of a triangulation.                    */
+/*                                                                           */
+/*  The vertices are taken from the log kept by lognewvertex(), so this      */
+/*  takes time proportional to the number of vertices created.  Logged       */
+/*  vertices that have been deallocated again are skipped, and a vertex      */
+/*  whose memory was reused is logged twice but appended only once.  Their   */
+/*  `vertex2tri' slots are used to tell them apart and are left NULL.        */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+void syncvertexorder(struct triangulation *t)
+#else /* not ANSI_DECLARATORS */
+void syncvertexorder(t)
+struct triangulation *t;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  struct mesh *m;
+  vertex newvertex;
+  long i;
+
+  m = &t->m;
+  for (i = 0; i < m->newvertexcount; i++) {
+    setvertex2tri(m->newvertices[i], (triangle) NULL);
+  }
+  for (i = 0; i < m->newvertexcount; i++) {
+    newvertex = m->newvertices[i];
+    if ((vertextype(newvertex) != DEADVERTEX) &&
+        (vertextype(newvertex) != UNDEADVERTEX) &&
+        (vertex2tri(newvertex) == (triangle) NULL)) {
+      appendvertex(t, newvertex);
+      /* Any non-NULL value marks the vertex as numbered. */
+      setvertex2tri(newvertex, (triangle) m->dummytri);
+    }
+  }
+  /* The new vertices do not know any triangles yet. */
+  for (i = 0; i < m->newvertexcount; i++) {
+    setvertex2tri(m->newvertices[i], (triangle) NULL);
+  }
+  m->newvertexcount = 0;
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  meshisconnected()   Check whether all triangles can be reached from one  */
+/*                      another across edges.                                */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+int meshisconnected(struct mesh *m)
+#else /* not ANSI_DECLARATORS */
+int meshisconnected(m)
+struct mesh *m;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  struct otri testtri, neighbor;
+  triangle **stack;
+  long stacksize, reached;
+  triangle ptr;                         /* Temporary variable used by sym(). */
+
+  traversalinit(&m->triangles);
+  testtri.tri = triangletraverse(m);
+  if (testtri.tri == (triangle *) NULL) {
+    return 1;
+  }
+
+  stack = (triangle **) trimalloc((int) (m->triangles.items *
+                                         sizeof(triangle *)));
+  infect(testtri);
+  stack[0] = testtri.tri;
+  stacksize = 1;
+  reached = 1;
+  while (stacksize > 0) {
+    testtri.tri = stack[--stacksize];
+    for (testtri.orient = 0; testtri.orient < 3; testtri.orient++) {
+      sym(testtri, neighbor);
+      if ((neighbor.tri != m->dummytri) && !infected(neighbor)) {
+        infect(neighbor);
+        stack[stacksize++] = neighbor.tri;
+        reached++;
+      }
+    }
+  }
+  trifree((VOID *) stack);
+
+  traversalinit(&m->triangles);
+  testtri.tri = triangletraverse(m);
+  while (testtri.tri != (triangle *) NULL) {
+    uninfect(testtri);
+    testtri.tri = triangletraverse(m);
+  }
+
+  return reached == m->triangles.items;
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  findvertex()   Find a triangle whose origin is a given vertex.           */
+/*                                                                           */
+/*  Returns 1 on success, 0 if the vertex is not part of the mesh.           */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+int findvertex(struct mesh *m, struct behavior *b, vertex findv,
+               struct otri *searchtri)
+#else /* not ANSI_DECLARATORS */
+int findvertex(m, b, findv, searchtri)
+struct mesh *m;
+struct behavior *b;
+vertex findv;
+struct otri *searchtri;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  triangle encodedtri;
+  vertex checkvertex;
+
+  /* Try the triangle recorded with the vertex first; it may be stale. */
+  encodedtri = vertex2tri(findv);
+  if (encodedtri != (triangle) NULL) {
+    decode(encodedtri, *searchtri);
+    if (!deadtri(searchtri->tri)) {
+      for (searchtri->orient = 0; searchtri->orient < 3;
+           searchtri->orient++) {
+        org(*searchtri, checkvertex);
+        if (checkvertex == findv) {
+          return 1;
+        }
+      }
+    }
+  }
+
+  if (robustlocate(m, b, findv, searchtri) != ONVERTEX) {
+    return 0;
+  }
+  setvertex2tri(findv, encode(*searchtri));
+  return 1;
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  triangulation_create()   Triangulate the input and keep the resulting    */
+/*                           mesh.                                           */
+/*                                                                           */
+/*  Takes the same switches and input as triangulate(), except that the      */
+/*  `r' (refine) and `o2' (high order) switches are not supported.  Returns  */
+/*  NULL if the input vertices do not span a triangulation.                  */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+struct triangulation *triangulation_create(char *triswitches,
+                                           struct triangulateio *in)
+#else /* not ANSI_DECLARATORS */
+struct triangulation *triangulation_create(triswitches, in)
+char *triswitches;
+struct triangulateio *in;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  struct triangulation *t;
+  struct mesh *m;
+  struct behavior *b;
+  vertex vertexloop;
+  int vararea;
+
+  t = (struct triangulation *) trimalloc((int) sizeof(struct triangulation));
+  t->vertexorder = (vertex *) NULL;
+  t->livetree = (long *) NULL;
+  t->vertexcount = 0;
+  t->entrycount = 0;
+  t->vertexspace = 0;
+  m = &t->m;
+  b = &t->b;
+
+  triangleinit(m);
+  parsecommandline(1, &triswitches, b);
+  m->steinerleft = b->steiner;
+  /* Always keep room for an area bound in each triangle, so that      */
+  /*   triangulation_refine() can set them.  Unset bounds are negative. */
+  vararea = b->vararea;
+  b->vararea = 1;
+
+  transfernodes(m, b, in->pointlist, in->pointattributelist,
+                in->pointmarkerlist, in->numberofpoints,
+                in->numberofpointattributes);
+  m->hullsize = delaunay(m, b);
+
+  /* Ensure that no vertex can be mistaken for a triangular bounding */
+  /*   box vertex in insertvertex().                                 */
+  m->infvertex1 = (vertex) NULL;
+  m->infvertex2 = (vertex) NULL;
+  m->infvertex3 = (vertex) NULL;
+
+  if (b->usesegments) {
+    m->checksegments = 1;
+    formskeleton(m, b, in->segmentlist, in->segmentmarkerlist,
+                 in->numberofsegments);
+  }
+
+  if (b->poly && (m->triangles.items > 0)) {
+    m->holes = in->numberofholes;
+    m->regions = in->numberofregions;
+    /* Only apply regional area constraints if they were asked for. */
+    b->vararea = vararea;
+    carveholes(m, b, in->holelist, m->holes, in->regionlist, m->regions);
+    b->vararea = 1;
+  } else {
+    m->holes = 0;
+    m->regions = 0;
+  }
+
+  if (b->quality && (m->triangles.items > 0)) {
+    enforcequality(m, b);
+  }
+
+  if (m->triangles.items == 0) {
+    /* enforcequality() did not run, so there are no quality pools. */
+    b->quality = 0;
+    triangledeinit(m, b);
+    trifree((VOID *) t);
+    return (struct triangulation *) NULL;
+  }
+
+  traversalinit(&m->vertices);
+  vertexloop = vertextraverse(m);
+  while (vertexloop != (vertex) NULL) {
+    if (vertextype(vertexloop) != UNDEADVERTEX) {
+      appendvertex(t, vertexloop);
+    }
+    vertexloop = vertextraverse(m);
+  }
+  makevertexmap(m, b);
+  /* Number the vertices that Triangle creates from now on as well. */
+  m->lognewvertices = 1;
+  /* From now on, point location must cope with holes and concavities. */
+  /*   Changes to the triangulation do not change its domain, so this   */
+  /*   lets robustlocate() tell points in holes quickly.                */
+  m->carved = 1;
+  m->connected = meshisconnected(m);
+
+  return t;
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  triangulation_destroy()   Free a triangulation.                          */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+void triangulation_destroy(struct triangulation *t)
+#else /* not ANSI_DECLARATORS */
+void triangulation_destroy(t)
+struct triangulation *t;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  triangledeinit(&t->m, &t->b);
+  if (t->m.newvertices != (vertex *) NULL) {
+    trifree((VOID *) t->m.newvertices);
+  }
+  if (t->vertexorder != (vertex *) NULL) {
+    trifree((VOID *) t->vertexorder);
+    trifree((VOID *) t->livetree);
+  }
+  trifree((VOID *) t);
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  triangulation_numberofpoints()   Number of vertices of a triangulation.  */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+int triangulation_numberofpoints(struct triangulation *t)
+#else /* not ANSI_DECLARATORS */
+int triangulation_numberofpoints(t)
+struct triangulation *t;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  syncvertexorder(t);
+  return (int) t->vertexcount;
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  triangulation_numberoftriangles()   Number of triangles of a             */
+/*                                      triangulation.                       */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+int triangulation_numberoftriangles(struct triangulation *t)
+#else /* not ANSI_DECLARATORS */
+int triangulation_numberoftriangles(t)
+struct triangulation *t;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  return (int) t->m.triangles.items;
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  triangulation_refine()   Refine a triangulation in place.                */
+/*                                                                           */
+/*  If `trianglearealist' is not NULL, it holds a new area bound for each    */
+/*  triangle, in the order in which triangulation_output() writes them; a    */
+/*  bound that is not positive means no bound.  Otherwise, the current       */
+/*  bounds are kept.  If `minangle' is not negative, it replaces the minimum */
+/*  angle of the `q' switch.  Triangles are then split, as triangulate()     */
+/*  does with the `q' and `a' switches, until they meet all bounds.          */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+void triangulation_refine(struct triangulation *t, REAL *trianglearealist,
+                          REAL minangle)
+#else /* not ANSI_DECLARATORS */
+void triangulation_refine(t, trianglearealist, minangle)
+struct triangulation *t;
+REAL *trianglearealist;
+REAL minangle;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  struct mesh *m;
+  struct behavior *b;
+  struct otri triangleloop;
+  long i;
+
+  m = &t->m;
+  b = &t->b;
+
+  if (trianglearealist != (REAL *) NULL) {
+    traversalinit(&m->triangles);
+    triangleloop.tri = triangletraverse(m);
+    triangleloop.orient = 0;
+    i = 0;
+    while (triangleloop.tri != (triangle *) NULL) {
+      setareabound(triangleloop, trianglearealist[i++]);
+      triangleloop.tri = triangletraverse(m);
+    }
+  }
+
+  if (minangle >= 0.0) {
+    /* As in parsecommandline(). */
+    b->minangle = minangle;
+    b->goodangle = cos(b->minangle * PI / 180.0);
+    if (b->goodangle == 1.0) {
+      b->offconstant = 0.0;
+    } else {
+      b->offconstant = 0.475 * sqrt((1.0 + b->goodangle) /
+                                    (1.0 - b->goodangle));
+    }
+    b->goodangle *= b->goodangle;
+  }
+
+  if (b->quality) {
+    /* Free the pools of the previous enforcequality(); it sets them up */
+    /*   anew.                                                          */
+    pooldeinit(&m->badsubsegs);
+    pooldeinit(&m->badtriangles);
+    pooldeinit(&m->flipstackers);
+  }
+  b->quality = 1;
+  m->steinerleft = b->steiner;
+  enforcequality(m, b);
+
+  syncvertexorder(t);
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  triangulation_insertpoints()   Insert vertices into a triangulation.     */
+/*                                                                           */
+/*  `pointattriblist' and `pointmarkerlist' may be NULL.  On return,         */
+/*  `indices[i]' is the number of the new vertex, or -1 if point i was not   */
+/*  inserted because it lies outside the mesh, on a segment, or on an        */
+/*  existing vertex.  Returns the number of vertices inserted.               */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+int triangulation_insertpoints(struct triangulation *t, int numberofpoints,
+                               REAL *pointlist, REAL *pointattriblist,
+                               int *pointmarkerlist, int *indices)
+#else /* not ANSI_DECLARATORS */
+int triangulation_insertpoints(t, numberofpoints, pointlist, pointattriblist,
+                               pointmarkerlist, indices)
+struct triangulation *t;
+int numberofpoints;
+REAL *pointlist;
+REAL *pointattriblist;
+int *pointmarkerlist;
+int *indices;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  struct mesh *m;
+  struct behavior *b;
+  struct otri searchtri;
+  enum locateresult intersect;
+  enum insertvertexresult success;
+  vertex newvertex;
+  int inserted;
+  int i, j;
+
+  m = &t->m;
+  b = &t->b;
+  syncvertexorder(t);
+
+  inserted = 0;
+  for (i = 0; i < numberofpoints; i++) {
+    indices[i] = -1;
+    newvertex = (vertex) poolalloc(&m->vertices);
+    newvertex[0] = pointlist[2 * i];
+    newvertex[1] = pointlist[2 * i + 1];
+    for (j = 0; j < m->nextras; j++) {
+      newvertex[2 + j] = (pointattriblist == (REAL *) NULL) ? 0.0 :
+                         pointattriblist[m->nextras * i + j];
+    }
+    setvertexmark(newvertex, (pointmarkerlist == (int *) NULL) ? 0 :
+                             pointmarkerlist[i]);
+    setvertextype(newvertex, INPUTVERTEX);
+    setvertex2tri(newvertex, (triangle) NULL);
+
+    intersect = robustlocate(m, b, newvertex, &searchtri);
+    if ((intersect == OUTSIDE) || (intersect == ONVERTEX)) {
+      vertexdealloc(m, newvertex);
+      continue;
+    }
+    if (intersect == ONEDGE) {
+      /* Meet the preconditions of preciselocate(), which insertvertex() */
+      /*   calls:  the vertex must lie strictly left of `searchtri'.     */
+      lnextself(searchtri);
+    }
+    success = insertvertex(m, b, newvertex, &searchtri, (struct osub *) NULL,
+                           0, 0);
+    if ((success == DUPLICATEVERTEX) || (success == VIOLATINGVERTEX)) {
+      vertexdealloc(m, newvertex);
+      continue;
+    }
+    setvertex2tri(newvertex, encode(searchtri));
+
+    indices[i] = (int) t->vertexcount + b->firstnumber;
+    appendvertex(t, newvertex);
+    inserted++;
+  }
+  return inserted;
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  triangulation_removepoints()   Remove vertices from a triangulation.     */
+/*                                                                           */
+/*  `indices' must hold distinct, valid vertex numbers.  Only vertices in    */
+/*  the interior of the mesh that do not lie on segments may be removed.  If */
+/*  any vertex cannot be removed, nothing is changed and 1 plus its position */
+/*  in `indices' is returned.  Returns 0 on success.                         */
+/*                                                                           */
+/*  The vertices after the removed ones are renumbered.  This only leaves    */
+/*  NULL entries in `vertexorder', so that the cost depends on the number    */
+/*  of vertices removed, not on the size of the mesh.                        */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+int triangulation_removepoints(struct triangulation *t, int count,
+                               int *indices)
+#else /* not ANSI_DECLARATORS */
+int triangulation_removepoints(t, count, indices)
+struct triangulation *t;
+int count;
+int *indices;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  struct mesh *m;
+  struct behavior *b;
+  struct otri deltri, spintri;
+  struct osub checkseg;
+  vertex delvertex;
+  long *entries;
+  int savednobisect;
+  long i;
+  triangle ptr;                         /* Temporary variable used by sym(). */
+  subseg sptr;                      /* Temporary variable used by tspivot(). */
+
+  m = &t->m;
+  b = &t->b;
+  syncvertexorder(t);
+
+  /* Look up the vertices before any of them is removed. */
+  entries = (long *) trimalloc((int) ((count + 1) * sizeof(long)));
+  for (i = 0; i < count; i++) {
+    entries[i] = numberedentry(t, indices[i] - b->firstnumber);
+  }
+
+  /* Check that all vertices are interior and off segments. */
+  for (i = 0; i < count; i++) {
+    delvertex = t->vertexorder[entries[i]];
+    if (!findvertex(m, b, delvertex, &deltri)) {
+      trifree((VOID *) entries);
+      return (int) i + 1;
+    }
+    otricopy(deltri, spintri);
+    do {
+      if (m->checksegments) {
+        tspivot(spintri, checkseg);
+        if (checkseg.ss != m->dummysub) {
+          trifree((VOID *) entries);
+          return (int) i + 1;
+        }
+      }
+      onextself(spintri);
+      if (spintri.tri == m->dummytri) {
+        trifree((VOID *) entries);
+        return (int) i + 1;
+      }
+    } while (!otriequal(spintri, deltri));
+  }
+
+  /* Don't queue the triangles created below for quality refinement. */
+  savednobisect = b->nobisect;
+  b->nobisect = 1;
+  for (i = 0; i < count; i++) {
+    delvertex = t->vertexorder[entries[i]];
+    findvertex(m, b, delvertex, &deltri);
+    deletevertex(m, b, &deltri);
+    t->vertexorder[entries[i]] = (vertex) NULL;
+    addlive(t, entries[i], -1);
+    t->vertexcount--;
+  }
+  b->nobisect = savednobisect;
+  /* The most recently visited triangle may have been deleted. */
+  m->recenttri.tri = (triangle *) NULL;
+
+  trifree((VOID *) entries);
+  return 0;
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  triangulation_insertsegments()   Insert segments into a triangulation.   */
+/*                                                                           */
+/*  The triangulation must have been created with the `p' or `c' switch.     */
+/*  Segments are given by the numbers of their endpoints and must lie in     */
+/*  the mesh.  `segmentmarkerlist' may be NULL.  Returns -1 if the           */
+/*  triangulation has no segments; otherwise, if a segment is invalid,       */
+/*  nothing is changed and 1 plus its position is returned.  Returns 0 on    */
+/*  success.                                                                 */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+int triangulation_insertsegments(struct triangulation *t, int numberofsegments,
+                                 int *segmentlist, int *segmentmarkerlist)
+#else /* not ANSI_DECLARATORS */
+int triangulation_insertsegments(t, numberofsegments, segmentlist,
+                                 segmentmarkerlist)
+struct triangulation *t;
+int numberofsegments;
+int *segmentlist;
+int *segmentmarkerlist;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  struct mesh *m;
+  struct behavior *b;
+  struct otri searchtri;
+  vertex endpoint1, endpoint2;
+  long end1, end2;
+  int i;
+
+  m = &t->m;
+  b = &t->b;
+  if (!b->usesegments) {
+    return -1;
+  }
+  syncvertexorder(t);
+
+  for (i = 0; i < numberofsegments; i++) {
+    end1 = segmentlist[2 * i] - b->firstnumber;
+    end2 = segmentlist[2 * i + 1] - b->firstnumber;
+    if ((end1 < 0) || (end1 >= t->vertexcount) ||
+        (end2 < 0) || (end2 >= t->vertexcount) || (end1 == end2)) {
+      return i + 1;
+    }
+  }
+
+  for (i = 0; i < numberofsegments; i++) {
+    endpoint1 = numberedvertex(t, segmentlist[2 * i] - b->firstnumber);
+    endpoint2 = numberedvertex(t, segmentlist[2 * i + 1] - b->firstnumber);
+    /* Make sure insertsegment() finds both endpoints quickly. */
+    findvertex(m, b, endpoint1, &searchtri);
+    findvertex(m, b, endpoint2, &searchtri);
+    insertsegment(m, b, endpoint1, endpoint2,
+                  (segmentmarkerlist == (int *) NULL) ? 1 :
+                  segmentmarkerlist[i]);
+  }
+
+  syncvertexorder(t);
+  return 0;
+}
+
+/*****************************************************************************/
+/*                                                                           */
+/*  triangulation_output()   Write a triangulation to `out', as             */
+/*                           triangulate() would.                            */
+/*                                                                           */
+/*  The pointers in `out' must be NULL (or point to large enough arrays, as  */
+/*  for triangulate()).  The mesh itself is left unchanged.                  */
+/*                                                                           */
+/*****************************************************************************/
+
+#ifdef ANSI_DECLARATORS
+void triangulation_output(struct triangulation *t, struct triangulateio *out)
+#else /* not ANSI_DECLARATORS */
+void triangulation_output(t, out)
+struct triangulation *t;
+struct triangulateio *out;
+#endif /* not ANSI_DECLARATORS */
+
+{
+  struct mesh *m;
+  struct behavior *b;
+  struct otri triangleloop;
+  triangle *savedslots;
+  int *savedmarks;
+  vertex outvertex;
+  long i;
+  int j;
+
+  m = &t->m;
+  b = &t->b;
+  syncvertexorder(t);
+  /* Number the vertices by their position in `vertexorder'. */
+  if (t->entrycount > t->vertexcount) {
+    compactvertexorder(t);
+  }
+
+  m->edges = (3l * m->triangles.items + m->hullsize) / 2l;
+  out->numberofpoints = (int) t->vertexcount;
+  out->numberofpointattributes = m->nextras;
+  out->numberoftriangles = m->triangles.items;
+  out->numberofcorners = 3;
+  out->numberoftriangleattributes = m->eextras;
+  out->numberofedges = m->edges;
+  if (b->usesegments) {
+    out->numberofsegments = m->subsegs.items;
+  } else {
+    out->numberofsegments = m->hullsize;
+  }
+  out->numberofholes = 0;
+  out->holelist = (REAL *) NULL;
+  out->numberofregions = 0;
+  out->regionlist = (REAL *) NULL;
+
+  /* Write the vertices in their numbered order, and number them through */
+  /*   their markers, as writenodes() does.  The markers are restored at */
+  /*   the end.                                                          */
+  if (out->pointlist == (REAL *) NULL) {
+    out->pointlist = (REAL *) trimalloc((int) (t->vertexcount * 2 *
+                                               sizeof(REAL)));
+  }
+  if ((m->nextras > 0) && (out->pointattributelist == (REAL *) NULL)) {
+    out->pointattributelist = (REAL *) trimalloc((int) (t->vertexcount *
+                                                        m->nextras *
+                                                        sizeof(REAL)));
+  }
+  if (!b->nobound && (out->pointmarkerlist == (int *) NULL)) {
+    out->pointmarkerlist = (int *) trimalloc((int) (t->vertexcount *
+                                                    sizeof(int)));
+  }
+  savedmarks = (int *) trimalloc((int) (t->vertexcount * sizeof(int)));
+  for (i = 0; i < t->vertexcount; i++) {
+    outvertex = t->vertexorder[i];
+    out->pointlist[2 * i] = outvertex[0];
+    out->pointlist[2 * i + 1] = outvertex[1];
+    for (j = 0; j < m->nextras; j++) {
+      out->pointattributelist[m->nextras * i + j] = outvertex[2 + j];
+    }
+    savedmarks[i] = vertexmark(outvertex);
+    if (!b->nobound) {
+      out->pointmarkerlist[i] = savedmarks[i];
+    }
+    setvertexmark(outvertex, (int) i + b->firstnumber);
+  }
+
+  if (!b->noelewritten) {
+    writeelements(m, b, &out->trianglelist, &out->triangleattributelist);
+  }
+  if (b->poly || b->convex) {
+    writepoly(m, b, &out->segmentlist, &out->segmentmarkerlist);
+  }
+  if (b->edgesout) {
+    writeedges(m, b, &out->edgelist, &out->edgemarkerlist);
+  }
+  if (b->neighbors) {
+    /* writeneighbors() numbers the triangles in a slot that holds */
+    /*   subsegments or attributes, so save and restore that slot. */
+    savedslots = (triangle *) trimalloc((int) ((m->triangles.items + 1) *
+                                               sizeof(triangle)));
+    traversalinit(&m->triangles);
+    triangleloop.tri = triangletraverse(m);
+    i = 0;
+    while (triangleloop.tri != (triangle *) NULL) {
+      savedslots[i++] = triangleloop.tri[6];
+      triangleloop.tri = triangletraverse(m);
+    }
+    savedslots[i] = m->dummytri[6];
+
+    writeneighbors(m, b, &out->neighborlist);
+
+    traversalinit(&m->triangles);
+    triangleloop.tri = triangletraverse(m);
+    i = 0;
+    while (triangleloop.tri != (triangle *) NULL) {
+      triangleloop.tri[6] = savedslots[i++];
+      triangleloop.tri = triangletraverse(m);
+    }
+    m->dummytri[6] = savedslots[i];
+    trifree((VOID *) savedslots);
+  }
+
+  for (i = 0; i < t->vertexcount; i++) {
+    setvertexmark(t->vertexorder[i], savedmarks[i]);
+  }
+  trifree((VOID *) savedmarks);
+}
+
+#endif /* TRILIBRARY */
+
+/**                                                                         **/
+/**                                                                         **/
+/********* Persistent triangulations end here                        *********/
@@ -275,6 +275,39 @@ typedef REAL *vertex;
 
 int triunsuitable(vertex triorg, vertex tridest, vertex triapex, REAL area);
 
+/* MeshPy: batched user test, used instead of triunsuitable() with the -uu  */
+/*   switch.  `vertices' holds the origin, destination, and apex of each of */
+/*   the `count' triangles (six REALs per triangle).  Sets unsuitable[i] to */
+/*   1 if triangle i is too large and should be refined; 0 otherwise.       */
+/*   If it returns nonzero, no more Steiner points are inserted.            */
+
+int triunsuitablebatch(int count, REAL *vertices, REAL *areas,
+                       int *unsuitable);
+
+/* MeshPy: progress hook, called periodically from the quality refinement  */
+/*   loop with the name of the current phase and the numbers of vertices,  */
+/*   triangles, and queued bad triangles.  If it returns nonzero, no more   */
+/*   Steiner points are inserted.                                           */
+
+int triprogress(const char *phase, long points, long triangles,
+                long badtriangles);
+
+/* MeshPy: statistics of a triangulate() call: the wall clock time spent   */
+/*   in each phase in seconds, the number of Steiner points, and the        */
+/*   largest numbers of items held by the memory pools along with the       */
+/*   sizes of their items in bytes.                                         */
+
+#define TRISTATSMAXPHASES 8
+
+struct triangulatestats {
+  int numberofphases;
+  const char *phasenames[TRISTATSMAXPHASES];
+  REAL phaseseconds[TRISTATSMAXPHASES];
+  long steinerpoints;
+  long maxvertices, maxtriangles, maxsubsegs, maxbadtriangles;
+  int vertexbytes, trianglebytes, subsegbytes, badtrianglebytes;
+};
+
 struct triangulateio {
   REAL *pointlist;                                               /* In / out */
   REAL *pointattributelist;                                      /* In / out */
@@ -304,6 +337,8 @@ struct triangulateio {
   int *edgemarkerlist;            /* Not used with Voronoi diagram; out only */
   REAL *normlist;                /* Used only with Voronoi diagram; out only */
   int numberofedges;                                             /* Out only */
+
+  struct triangulatestats stats;                        /* MeshPy: out only */
 };
 
 #ifdef ANSI_DECLARATORS
@@ -314,6 +349,35 @@ void trifree(VOID *memptr);
 void triangulate();
 void trifree();
 #endif /* not ANSI_DECLARATORS */
+
+/* MeshPy: a triangulation that is kept alive between calls, so that        */
+/*   vertices and segments can be inserted and vertices removed without     */
+/*   rebuilding the mesh.  See the end of triangle.cpp for details.          */
+
+struct triangulation;
+
+#ifdef ANSI_DECLARATORS
+struct triangulation *triangulation_create(char *, struct triangulateio *);
+void triangulation_destroy(struct triangulation *);
+int triangulation_numberofpoints(struct triangulation *);
+int triangulation_numberoftriangles(struct triangulation *);
+int triangulation_insertpoints(struct triangulation *, int, REAL *, REAL *,
+                               int *, int *);
+int triangulation_removepoints(struct triangulation *, int, int *);
+int triangulation_insertsegments(struct triangulation *, int, int *, int *);
+void triangulation_refine(struct triangulation *, REAL *, REAL);
+void triangulation_output(struct triangulation *, struct triangulateio *);
+#else /* not ANSI_DECLARATORS */
+struct triangulation *triangulation_create();
+void triangulation_destroy();
+int triangulation_numberofpoints();
+int triangulation_numberoftriangles();
+int triangulation_insertpoints();
+int triangulation_removepoints();
+int triangulation_insertsegments();
+void triangulation_refine();
+void triangulation_output();
+#endif /* not ANSI_DECLARATORS */
 #ifdef __cplusplus
 }
 #endif
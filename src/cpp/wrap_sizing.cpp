@@ -0,0 +1,158 @@
+#include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
+#include "sizing.hpp"
+#include "foreign_array_wrap.hpp"
+
+
+
+
+namespace py = pybind11;
+using namespace std;
+
+
+
+
+namespace
+{
+  tGridSizeField *make_grid_size_field(py::object values_obj,
+      py::object origin_obj, py::object spacing_obj)
+  {
+    typedef py::array_t<double, py::array::c_style | py::array::forcecast>
+      real_array_t;
+
+    real_array_t values = py::cast<real_array_t>(values_obj);
+    real_array_t origin = py::cast<real_array_t>(origin_obj);
+    real_array_t spacing = py::cast<real_array_t>(spacing_obj);
+
+    unsigned dims = values.ndim();
+    if (dims != 2 && dims != 3)
+      PYTHON_ERROR(ValueError, "values must be a 2D or 3D array");
+    if (origin.ndim() != 1 || unsigned(origin.shape(0)) != dims)
+      PYTHON_ERROR(ValueError, "origin must have one entry per dimension");
+    if (spacing.ndim() != 1 || unsigned(spacing.shape(0)) != dims)
+      PYTHON_ERROR(ValueError, "spacing must have one entry per dimension");
+
+    long shape[3];
+    for (unsigned d = 0; d < dims; ++d)
+    {
+      shape[d] = values.shape(d);
+      if (shape[d] == 0)
+        PYTHON_ERROR(ValueError, "values must not be empty");
+      if (!(spacing.data()[d] > 0))
+        PYTHON_ERROR(ValueError, "spacing must be positive");
+    }
+
+    return new tGridSizeField(dims, shape,
+        origin.data(), spacing.data(), values.data());
+  }
+
+
+
+
+  py::array_t<double> grid_size_field_call(const tGridSizeField &self,
+      py::object points_obj)
+  {
+    typedef py::array_t<double, py::array::c_style | py::array::forcecast>
+      real_array_t;
+    real_array_t points = py::cast<real_array_t>(points_obj);
+
+    unsigned dims = self.dimensions();
+    if (points.ndim() != 2 || unsigned(points.shape(1)) != dims)
+      PYTHON_ERROR(ValueError, "points must have shape (npoints, dimensions)");
+
+    py::ssize_t npoints = points.shape(0);
+    py::array_t<double> result(npoints);
+    double *result_data = result.mutable_data();
+    const double *points_data = points.data();
+
+    {
+      py::gil_scoped_release release;
+      double x[3] = { 0, 0, 0 };
+      for (py::ssize_t i = 0; i < npoints; ++i)
+      {
+        for (unsigned d = 0; d < dims; ++d)
+          x[d] = points_data[i*dims + d];
+        result_data[i] = self(x);
+      }
+    }
+
+    return result;
+  }
+
+
+
+
+  py::array_t<double> grid_size_field_values(const tGridSizeField &self)
+  {
+    std::vector<py::ssize_t> shape;
+    for (unsigned d = 0; d < self.dimensions(); ++d)
+      shape.push_back(self.shape(d));
+
+    py::array_t<double> result(shape);
+    std::copy(self.values().begin(), self.values().end(),
+        result.mutable_data());
+    return result;
+  }
+
+
+
+
+  tCRefinementFunction *make_c_refinement_function(uintptr_t address,
+      uintptr_t user_data)
+  {
+    if (address == 0)
+      PYTHON_ERROR(ValueError, "refinement function address must not be NULL");
+    return new tCRefinementFunction(address, user_data);
+  }
+
+
+
+
+  py::tuple grid_size_field_origin(const tGridSizeField &self)
+  {
+    py::list result;
+    for (unsigned d = 0; d < self.dimensions(); ++d)
+      result.append(self.origin(d));
+    return py::tuple(result);
+  }
+
+
+
+
+  py::tuple grid_size_field_spacing(const tGridSizeField &self)
+  {
+    py::list result;
+    for (unsigned d = 0; d < self.dimensions(); ++d)
+      result.append(self.spacing(d));
+    return py::tuple(result);
+  }
+}
+
+
+
+
+void expose_sizing(pybind11::module &m)
+{
+  {
+    typedef tGridSizeField cl;
+    py::class_<cl>(m, "GridSizeField")
+      .def(py::init(&make_grid_size_field),
+          py::arg("values"), py::arg("origin"), py::arg("spacing"))
+      .def_property_readonly("dimensions", &cl::dimensions)
+      .def_property_readonly("values", &grid_size_field_values)
+      .def_property_readonly("origin", &grid_size_field_origin)
+      .def_property_readonly("spacing", &grid_size_field_spacing)
+      .def("__call__", &grid_size_field_call, py::arg("points"))
+      ;
+  }
+
+  {
+    typedef tCRefinementFunction cl;
+    py::class_<cl>(m, "CRefinementFunction")
+      .def(py::init(&make_c_refinement_function),
+          py::arg("address"), py::arg("user_data")=0)
+      .def_property_readonly("address", &cl::address)
+      .def_property_readonly("user_data", &cl::user_data)
+      ;
+  }
+}
@@ -1,9 +1,13 @@
 #include "tetgen.h"
 #include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
 #include <vector>
+#include <algorithm>
 #include <stdexcept>
 #include <iostream>
 #include "foreign_array_wrap.hpp"
+#include "sizing.hpp"
+#include "progress.hpp"
 
 
 
@@ -125,6 +129,109 @@ namespace
         numberoftetrahedronattributes = attrs;
       }
 
+      void set_facets_csr(
+          py::array_t<int, py::array::c_style | py::array::forcecast> facet_offsets,
+          py::array_t<int, py::array::c_style | py::array::forcecast> polygon_offsets,
+          py::array_t<int, py::array::c_style | py::array::forcecast> vertex_indices,
+          py::object facet_hole_offsets_obj,
+          py::object facet_holes_obj)
+      {
+        typedef py::array_t<int, py::array::c_style | py::array::forcecast> int_ary_t;
+        typedef py::array_t<REAL, py::array::c_style | py::array::forcecast> real_ary_t;
+
+        if (facet_offsets.ndim() != 1 || facet_offsets.size() < 1)
+          PYTHON_ERROR(ValueError, "facet_offsets must be a non-empty 1D array");
+        if (polygon_offsets.ndim() != 1 || polygon_offsets.size() < 1)
+          PYTHON_ERROR(ValueError, "polygon_offsets must be a non-empty 1D array");
+        if (vertex_indices.ndim() != 1)
+          PYTHON_ERROR(ValueError, "vertex_indices must be a 1D array");
+
+        const int *fofs = facet_offsets.data();
+        const int *pofs = polygon_offsets.data();
+        const py::ssize_t nfacets = facet_offsets.size() - 1;
+        const py::ssize_t npolygons = polygon_offsets.size() - 1;
+
+        if (fofs[0] != 0 || fofs[nfacets] != npolygons)
+          PYTHON_ERROR(ValueError,
+              "facet_offsets must start at 0 and end at the number of polygons");
+        for (py::ssize_t i = 0; i < nfacets; ++i)
+          if (fofs[i] > fofs[i+1])
+            PYTHON_ERROR(ValueError, "facet_offsets must be non-decreasing");
+
+        if (pofs[0] != 0 || pofs[npolygons] != vertex_indices.size())
+          PYTHON_ERROR(ValueError,
+              "polygon_offsets must start at 0 and end at the number of vertex indices");
+        for (py::ssize_t i = 0; i < npolygons; ++i)
+          if (pofs[i] > pofs[i+1])
+            PYTHON_ERROR(ValueError, "polygon_offsets must be non-decreasing");
+
+        {
+          const int *vertices = vertex_indices.data();
+          for (py::ssize_t i = 0; i < vertex_indices.size(); ++i)
+            if (vertices[i] < firstnumber
+                || vertices[i] >= numberofpoints + firstnumber)
+              PYTHON_ERROR(ValueError, "vertex index out of range");
+        }
+
+        int_ary_t facet_hole_offsets;
+        real_ary_t facet_holes;
+        const int *hofs = nullptr;
+        if (!facet_holes_obj.is_none())
+        {
+          if (facet_hole_offsets_obj.is_none())
+            PYTHON_ERROR(ValueError,
+                "facet_hole_offsets must be given along with facet_holes");
+
+          facet_hole_offsets = py::cast<int_ary_t>(facet_hole_offsets_obj);
+          facet_holes = py::cast<real_ary_t>(facet_holes_obj);
+
+          if (facet_hole_offsets.ndim() != 1 || facet_hole_offsets.size() != nfacets + 1)
+            PYTHON_ERROR(ValueError,
+                "facet_hole_offsets must have one more entry than there are facets");
+          if (facet_holes.ndim() != 2 || facet_holes.shape(1) != 3)
+            PYTHON_ERROR(ValueError, "facet_holes must have shape (nholes, 3)");
+
+          hofs = facet_hole_offsets.data();
+          if (hofs[0] != 0 || hofs[nfacets] != facet_holes.shape(0))
+            PYTHON_ERROR(ValueError,
+                "facet_hole_offsets must start at 0 and end at the number of holes");
+          for (py::ssize_t i = 0; i < nfacets; ++i)
+            if (hofs[i] > hofs[i+1])
+              PYTHON_ERROR(ValueError, "facet_hole_offsets must be non-decreasing");
+        }
+
+        const int *vertices = vertex_indices.data();
+        const REAL *holes = hofs ? facet_holes.data() : nullptr;
+
+        // facets and polygons own (and delete[]) their storage
+        Facets.deallocate();
+        Facets.setSize(nfacets);
+        for (py::ssize_t i = 0; i < nfacets; ++i)
+        {
+          tetgenio::facet &f = facetlist[i];
+
+          f.numberofpolygons = fofs[i+1] - fofs[i];
+          f.polygonlist = new tetgenio::polygon[f.numberofpolygons];
+          for (int j = 0; j < f.numberofpolygons; ++j)
+          {
+            tetgenio::polygon &poly = f.polygonlist[j];
+            const int i_poly = fofs[i] + j;
+
+            poly.numberofvertices = pofs[i_poly+1] - pofs[i_poly];
+            poly.vertexlist = new int[poly.numberofvertices];
+            std::copy(vertices + pofs[i_poly], vertices + pofs[i_poly+1],
+                poly.vertexlist);
+          }
+
+          if (hofs && hofs[i+1] > hofs[i])
+          {
+            f.numberofholes = hofs[i+1] - hofs[i];
+            f.holelist = new REAL[3*f.numberofholes];
+            std::copy(holes + 3*hofs[i], holes + 3*hofs[i+1], f.holelist);
+          }
+        }
+      }
+
 #define OVERRIDE_LOAD_WITH_ERROR_CHECK(WHAT, POSTPROC) \
       void load_##WHAT(char* filename) \
       { \
@@ -208,15 +315,218 @@ namespace
 
 
 
-  void tetrahedralizeWrapper(tetgenbehavior &bhv, tMeshInfo &in, tMeshInfo &out,
-      tMeshInfo *addin)
+  /* State of one tetrahedralize() call.
+   *
+   * TetGen's tetunsuitable() hook does not receive any user data, so the
+   * call in progress on the current thread is found through CurrentCall.
+   *
+   * If SizeField is set, refinement queries are answered from it without
+   * calling into Python. Progress is reported and limits are checked
+   * through TetGen's tetprogress() hook.
+   */
+  struct tTetrahedralizeCall
+  {
+    py::object RefinementFunction;
+    const tGridSizeField *SizeField;
+    tMeshingMonitor Monitor;
+
+    tTetrahedralizeCall(py::object deadline, py::object max_elements,
+        py::object progress)
+      : SizeField(NULL), Monitor(deadline, max_elements, progress)
+    { }
+  };
+
+  thread_local tTetrahedralizeCall *CurrentCall = NULL;
+
+  class tCurrentCallScope : public noncopyable
+  {
+    private:
+      tTetrahedralizeCall *Previous;
+      tetgenio &Input;
+      tetgenio::TetSizeFunc PreviousSizeFunc;
+      tetgenio::TetSizeBatchFunc PreviousSizeBatchFunc;
+      tetgenio::TetProgressFunc PreviousProgressFunc;
+
+    public:
+      tCurrentCallScope(tTetrahedralizeCall *call, tetgenio &input,
+          tetgenio::TetSizeFunc size_func,
+          tetgenio::TetSizeBatchFunc size_batch_func,
+          tetgenio::TetProgressFunc progress_func)
+        : Previous(CurrentCall), Input(input),
+        PreviousSizeFunc(input.tetunsuitable),
+        PreviousSizeBatchFunc(input.tetunsuitablebatch),
+        PreviousProgressFunc(input.tetprogress)
+      {
+        CurrentCall = call;
+        Input.tetunsuitable = size_func;
+        Input.tetunsuitablebatch = size_batch_func;
+        Input.tetprogress = progress_func;
+      }
+
+      ~tCurrentCallScope()
+      {
+        Input.tetunsuitable = PreviousSizeFunc;
+        Input.tetunsuitablebatch = PreviousSizeBatchFunc;
+        Input.tetprogress = PreviousProgressFunc;
+        CurrentCall = Previous;
+      }
+  };
+
+
+
+
+  bool tetunsuitable(REAL *pa, REAL *pb, REAL *pc, REAL *pd,
+      REAL *elen, REAL volume)
+  {
+    // return true if tet is too large, false otherwise
+    if (CurrentCall->SizeField)
+    {
+      REAL centroid[3];
+      for (unsigned i = 0; i < 3; ++i)
+        centroid[i] = (pa[i] + pb[i] + pc[i] + pd[i])/4;
+      return volume > (*CurrentCall->SizeField)(centroid);
+    }
+
+    // Python exceptions propagate through TetGen, which cleans up its
+    // mesh as the stack unwinds.
+    py::tuple vertices(4);
+    REAL *tet_vertices[] = { pa, pb, pc, pd };
+    for (unsigned i = 0; i < 4; ++i)
+      vertices[i] = py::make_tuple(
+          tet_vertices[i][0], tet_vertices[i][1], tet_vertices[i][2]);
+
+    return py::cast<bool>(CurrentCall->RefinementFunction(vertices, volume));
+  }
+
+
+
+
+  void tetunsuitablebatch(int count, REAL *vertices, REAL *volumes,
+      int *unsuitable)
+  {
+    // set unsuitable[i] to 1 for each tet that is too large
+    py::array_t<REAL> py_vertices({count, 4, 3});
+    py::array_t<REAL> py_volumes(count);
+    std::copy(vertices, vertices+12*count, py_vertices.mutable_data());
+    std::copy(volumes, volumes+count, py_volumes.mutable_data());
+
+    typedef py::array_t<bool, py::array::c_style | py::array::forcecast> result_t;
+    result_t result = py::cast<result_t>(
+        CurrentCall->RefinementFunction(py_vertices, py_volumes));
+
+    if (result.ndim() != 1 || result.shape(0) != count)
+      PYTHON_ERROR(ValueError,
+          "batched refinement function must return one flag per tetrahedron");
+
+    const bool *flags = result.data();
+    for (int i = 0; i < count; ++i)
+      unsuitable[i] = flags[i];
+  }
+
+
+
+
+  int tetprogress(const char *phase, long points, long tets, long bad_tets)
   {
+    // return nonzero to stop TetGen
+    return CurrentCall->Monitor.check(phase, points, tets, bad_tets);
+  }
+
+
+
+
+  py::dict buildStats(const tMeshInfo &out)
+  {
+    const tetgenio::buildstats &st = out.stats;
+
+    py::dict phase_times;
+    for (int i = 0; i < st.numberofphases; ++i)
+      phase_times[st.phasenames[i]] = st.phaseseconds[i];
+
+    py::dict counts;
+    counts["points"] = out.numberofpoints;
+    counts["elements"] = out.numberoftetrahedra;
+    counts["steiner_points"] = st.steinerpointsonsegments
+      + st.steinerpointsonfacets + st.steinerpointsinvolume;
+    counts["steiner_points_on_segments"] = st.steinerpointsonsegments;
+    counts["steiner_points_on_facets"] = st.steinerpointsonfacets;
+    counts["steiner_points_in_volume"] = st.steinerpointsinvolume;
+    counts["flips_23"] = st.flip23count;
+    counts["flips_32"] = st.flip32count;
+    counts["flips_44"] = st.flip44count;
+
+    py::dict peak_pool_items;
+    peak_pool_items["points"] = st.maxpoints;
+    peak_pool_items["tetrahedrons"] = st.maxtetrahedra;
+    peak_pool_items["subfaces"] = st.maxsubfaces;
+    peak_pool_items["subsegs"] = st.maxsubsegs;
+    peak_pool_items["flippool"] = st.maxflips;
+
+    py::dict peak_pool_bytes;
+    peak_pool_bytes["points"] = st.maxpoints * st.pointbytes;
+    peak_pool_bytes["tetrahedrons"] = st.maxtetrahedra * st.tetrahedronbytes;
+    peak_pool_bytes["subfaces"] = st.maxsubfaces * st.subfacebytes;
+    peak_pool_bytes["subsegs"] = st.maxsubsegs * st.subsegbytes;
+    peak_pool_bytes["flippool"] = st.maxflips * st.flipbytes;
+
+    py::dict result;
+    result["phase_times"] = phase_times;
+    result["counts"] = counts;
+    result["peak_pool_items"] = peak_pool_items;
+    result["peak_pool_bytes"] = peak_pool_bytes;
+    return result;
+  }
+
+
+
+
+  py::dict tetrahedralizeWrapper(tetgenbehavior &bhv, tMeshInfo &in, tMeshInfo &out,
+      tMeshInfo *addin, py::object refinement_func, bool batched_refinement,
+      tMeshInfo *bgmin, py::object deadline, py::object max_elements,
+      py::object progress)
+  {
+    tTetrahedralizeCall call(deadline, max_elements, progress);
+    tetgenio::TetSizeFunc size_func = NULL;
+    tetgenio::TetSizeBatchFunc size_batch_func = NULL;
+    tetgenio::TetProgressFunc progress_func = NULL;
+
+    if (call.Monitor.active())
+      progress_func = tetprogress;
+
+    if (py::isinstance<tGridSizeField>(refinement_func))
+    {
+      const tGridSizeField &field = py::cast<const tGridSizeField &>(
+          refinement_func);
+      if (field.dimensions() != 3)
+        PYTHON_ERROR(ValueError, "size field must be three-dimensional");
+      call.SizeField = &field;
+      size_func = tetunsuitable;
+    }
+    else if (!refinement_func.is_none())
+    {
+      call.RefinementFunction = refinement_func;
+      if (batched_refinement)
+        size_batch_func = tetunsuitablebatch;
+      else
+        size_func = tetunsuitable;
+    }
+
     try
     {
-      tetrahedralize(&bhv, &in, &out, addin);
+      tCurrentCallScope scope(&call, in, size_func, size_batch_func,
+          progress_func);
+
+      if (call.RefinementFunction.is_none())
+      {
+        py::gil_scoped_release release;
+        tetrahedralize(&bhv, &in, &out, addin, bgmin);
+      }
+      else
+        tetrahedralize(&bhv, &in, &out, addin, bgmin);
     }
     catch (int &i)
     {
+      call.Monitor.raiseIfAborted();
       throw runtime_error("TetGen runtime error code "+std::to_string(i));
     }
 
@@ -224,6 +534,32 @@ namespace
     out.PointAttributes.fixUnit(out.numberofpointattributes);
     out.PointMetricTensors.fixUnit(out.numberofpointmtrs);
     out.ElementAttributes.fixUnit(out.numberoftetrahedronattributes);
+
+    return buildStats(out);
+  }
+
+
+
+
+  template <>
+  size_t ownedNBytes(const tetgenio::polygon &self)
+  {
+    return self.vertexlist ? sizeof(int) * self.numberofvertices : 0;
+  }
+
+
+
+
+  template <>
+  size_t ownedNBytes(const tetgenio::facet &self)
+  {
+    size_t result = 0;
+    if (self.polygonlist)
+      for (int i = 0; i < self.numberofpolygons; ++i)
+        result += sizeof(tetgenio::polygon) + ownedNBytes(self.polygonlist[i]);
+    if (self.holelist)
+      result += sizeof(REAL) * 3 * self.numberofholes;
+    return result;
   }
 
 
@@ -266,7 +602,13 @@ void expose_tetgen(pybind11::module &m)
 {
   m.def("tetrahedralize", tetrahedralizeWrapper,
       py::arg("behavior"), py::arg("in"), py::arg("out"),
-      py::arg("addin").none(true)=py::none());
+      py::arg("addin").none(true)=py::none(),
+      py::arg("refinement_func").none(true)=py::none(),
+      py::arg("batched_refinement")=false,
+      py::arg("bgmin").none(true)=py::none(),
+      py::arg("deadline").none(true)=py::none(),
+      py::arg("max_elements").none(true)=py::none(),
+      py::arg("progress").none(true)=py::none());
 
   {
     typedef tMeshInfo cl;
@@ -304,6 +646,9 @@ void expose_tetgen(pybind11::module &m)
       .def_property("number_of_point_attributes",
           &cl::numberOfPointAttributes,
           &cl::setNumberOfPointAttributes)
+      .def_property("number_of_point_metric_tensors",
+          &cl::numberOfPointMetricTensors,
+          &cl::setNumberOfPointMetricTensors)
       .def_property("number_of_element_vertices",
           &cl::numberOfElementVertices,
           &cl::setNumberOfElementVertices)
@@ -311,6 +656,12 @@ void expose_tetgen(pybind11::module &m)
           &cl::numberOfElementAttributes,
           &cl::setNumberOfElementAttributes)
 
+      .def("set_facets_csr", &cl::set_facets_csr,
+          py::arg("facet_offsets"), py::arg("polygon_offsets"),
+          py::arg("vertex_indices"),
+          py::arg("facet_hole_offsets").none(true)=py::none(),
+          py::arg("facet_holes").none(true)=py::none())
+
       .DEF_METHOD(save_nodes)
       .DEF_METHOD(save_elements)
       .DEF_METHOD(save_faces)
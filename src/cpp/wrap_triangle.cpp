@@ -1,9 +1,17 @@
 #include "triangle.h"
+#include <algorithm>
 #include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
+#include <cstring>
 #include <stdexcept>
 #include <iostream>
 #include <memory>
+#include <mutex>
+#include <string>
+#include <vector>
 #include "foreign_array_wrap.hpp"
+#include "sizing.hpp"
+#include "progress.hpp"
 
 namespace py = pybind11;
 
@@ -85,6 +93,42 @@ struct tMeshInfo : public triangulateio, public noncopyable
       numberoftriangleattributes = attrs;
     }
 
+    /* Triangle allocates the output arrays it fills in with malloc() if
+     * they are unallocated. Their storage is handed to the foreign arrays
+     * by calling adoptMallocedArrays() with the result of
+     * unallocatedArrays() from before the call.
+     */
+    std::vector<bool> unallocatedArrays() const
+    {
+      return {
+        pointlist == NULL, pointattributelist == NULL,
+        pointmarkerlist == NULL,
+        trianglelist == NULL, triangleattributelist == NULL,
+        trianglearealist == NULL, neighborlist == NULL,
+        segmentlist == NULL, segmentmarkerlist == NULL,
+        holelist == NULL, regionlist == NULL,
+        edgelist == NULL, edgemarkerlist == NULL, normlist == NULL
+      };
+    }
+
+    void adoptMallocedArrays(const std::vector<bool> &unallocated)
+    {
+      if (unallocated[0]) Points.setMalloced();
+      if (unallocated[1]) PointAttributes.setMalloced();
+      if (unallocated[2]) PointMarkers.setMalloced();
+      if (unallocated[3]) Elements.setMalloced();
+      if (unallocated[4]) ElementAttributes.setMalloced();
+      if (unallocated[5]) ElementVolumes.setMalloced();
+      if (unallocated[6]) Neighbors.setMalloced();
+      if (unallocated[7]) Facets.setMalloced();
+      if (unallocated[8]) FacetMarkers.setMalloced();
+      if (unallocated[9]) Holes.setMalloced();
+      if (unallocated[10]) Regions.setMalloced();
+      if (unallocated[11]) Faces.setMalloced();
+      if (unallocated[12]) FaceMarkers.setMalloced();
+      if (unallocated[13]) Normals.setMalloced();
+    }
+
     tMeshInfo &operator=(const tMeshInfo &src)
     {
       numberofpointattributes = src.numberofpointattributes ;
@@ -128,7 +172,53 @@ tMeshInfo *copyMesh(const tMeshInfo &src)
 
 
 
-PyObject *RefinementFunction;
+namespace
+{
+  /* State of one triangulate() call.
+   *
+   * Triangle's triunsuitable() hook does not receive any user data, so the
+   * call in progress on the current thread is found through CurrentCall.
+   * This keeps triangulate() reentrant and lets separate threads triangulate
+   * independently.
+   *
+   * If SizeField or CFunction is set, refinement queries are answered
+   * from it without calling into Python. Progress is reported and limits
+   * are checked through Triangle's triprogress() hook.
+   */
+  struct tTriangulateCall
+  {
+    py::object RefinementFunction;
+    const tGridSizeField *SizeField;
+    const tCRefinementFunction *CFunction;
+    tMeshingMonitor Monitor;
+
+    tTriangulateCall(py::object deadline, py::object max_elements,
+        py::object progress)
+      : SizeField(NULL), CFunction(NULL),
+      Monitor(deadline, max_elements, progress)
+    { }
+  };
+
+  thread_local tTriangulateCall *CurrentCall = NULL;
+
+  class tCurrentCallScope : public noncopyable
+  {
+    private:
+      tTriangulateCall *Previous;
+
+    public:
+      tCurrentCallScope(tTriangulateCall *call)
+        : Previous(CurrentCall)
+      {
+        CurrentCall = call;
+      }
+
+      ~tCurrentCallScope()
+      {
+        CurrentCall = Previous;
+      }
+  };
+}
 
 
 
@@ -166,11 +256,22 @@ class tVertex : public noncopyable
 int triunsuitable(vertex triorg, vertex tridest, vertex triapex, REAL area)
 {
   // return 1 if triangle is too large, 0 otherwise
+  if (CurrentCall->SizeField)
+  {
+    REAL centroid[2];
+    for (unsigned i = 0; i < 2; ++i)
+      centroid[i] = (triorg[i] + tridest[i] + triapex[i])/3;
+    return area > (*CurrentCall->SizeField)(centroid);
+  }
+
+  if (CurrentCall->CFunction)
+    return (*CurrentCall->CFunction)(triorg, tridest, triapex, area);
+
   tVertex org(triorg);
   tVertex dest(tridest);
   tVertex apex(triapex);
 
-  py::handle refine_func = py::reinterpret_borrow<py::object>(RefinementFunction);
+  py::handle refine_func = CurrentCall->RefinementFunction;
 
   try
   {
@@ -201,13 +302,164 @@ int triunsuitable(vertex triorg, vertex tridest, vertex triapex, REAL area)
 
 
 
-void triangulateWrapper(char *options, tMeshInfo &in,
+int triunsuitablebatch(int count, REAL *vertices, REAL *areas, int *unsuitable)
+{
+  // set unsuitable[i] to 1 for each triangle that is too large,
+  // return 1 to stop refinement, 0 otherwise
+  if (CurrentCall->SizeField)
+  {
+    for (int i = 0; i < count; ++i)
+    {
+      REAL *tri_vertices = vertices + 6*i;
+      REAL centroid[2];
+      for (unsigned j = 0; j < 2; ++j)
+        centroid[j] = (tri_vertices[j] + tri_vertices[2+j]
+            + tri_vertices[4+j])/3;
+      unsuitable[i] = areas[i] > (*CurrentCall->SizeField)(centroid);
+    }
+    return 0;
+  }
+
+  if (CurrentCall->CFunction)
+  {
+    for (int i = 0; i < count; ++i)
+    {
+      REAL *tri_vertices = vertices + 6*i;
+      unsuitable[i] = (*CurrentCall->CFunction)(
+          tri_vertices, tri_vertices+2, tri_vertices+4, areas[i]);
+    }
+    return 0;
+  }
+
+  // Triangle does not clean up its mesh if an exception propagates
+  // through it, so a Python exception is kept until triangulate() has
+  // returned and refinement is stopped.
+  try
+  {
+    py::array_t<REAL> py_vertices({count, 3, 2});
+    py::array_t<REAL> py_areas(count);
+    memcpy(py_vertices.mutable_data(), vertices, sizeof(REAL)*count*6);
+    memcpy(py_areas.mutable_data(), areas, sizeof(REAL)*count);
+
+    typedef py::array_t<bool, py::array::c_style | py::array::forcecast> result_t;
+    result_t result = py::cast<result_t>(
+        CurrentCall->RefinementFunction(py_vertices, py_areas));
+
+    if (result.ndim() != 1 || result.shape(0) != count)
+      PYTHON_ERROR(ValueError,
+          "batched refinement function must return one flag per triangle");
+
+    const bool *flags = result.data();
+    for (int i = 0; i < count; ++i)
+      unsuitable[i] = flags[i];
+    return 0;
+  }
+  catch (py::builtin_exception &e)
+  {
+    e.set_error();
+    py::error_already_set error;
+    CurrentCall->Monitor.fail(error);
+  }
+  catch (py::error_already_set &e)
+  {
+    CurrentCall->Monitor.fail(e);
+  }
+
+  for (int i = 0; i < count; ++i)
+    unsuitable[i] = 0;
+  return 1;
+}
+
+
+
+
+int triprogress(const char *phase, long points, long triangles,
+    long badtriangles)
+{
+  // return 1 to stop refinement, 0 otherwise
+
+  // Triangulation.refine() runs without a call in progress.
+  if (!CurrentCall || !CurrentCall->Monitor.active())
+    return 0;
+
+  return CurrentCall->Monitor.check(phase, points, triangles, badtriangles);
+}
+
+
+
+
+py::dict buildStats(const tMeshInfo &out)
+{
+  const triangulatestats &st = out.stats;
+
+  py::dict phase_times;
+  for (int i = 0; i < st.numberofphases; ++i)
+    phase_times[st.phasenames[i]] = st.phaseseconds[i];
+
+  py::dict counts;
+  counts["points"] = out.numberofpoints;
+  counts["elements"] = out.numberoftriangles;
+  counts["steiner_points"] = st.steinerpoints;
+
+  py::dict peak_pool_items;
+  peak_pool_items["vertices"] = st.maxvertices;
+  peak_pool_items["triangles"] = st.maxtriangles;
+  peak_pool_items["subsegs"] = st.maxsubsegs;
+  peak_pool_items["badtriangles"] = st.maxbadtriangles;
+
+  py::dict peak_pool_bytes;
+  peak_pool_bytes["vertices"] = st.maxvertices * st.vertexbytes;
+  peak_pool_bytes["triangles"] = st.maxtriangles * st.trianglebytes;
+  peak_pool_bytes["subsegs"] = st.maxsubsegs * st.subsegbytes;
+  peak_pool_bytes["badtriangles"] = st.maxbadtriangles * st.badtrianglebytes;
+
+  py::dict result;
+  result["phase_times"] = phase_times;
+  result["counts"] = counts;
+  result["peak_pool_items"] = peak_pool_items;
+  result["peak_pool_bytes"] = peak_pool_bytes;
+  return result;
+}
+
+
+
+
+py::dict triangulateWrapper(char *options, tMeshInfo &in,
     tMeshInfo &out,
     tMeshInfo &voronoi,
-    py::object refinement_func)
+    py::object refinement_func,
+    py::object deadline,
+    py::object max_elements,
+    py::object progress)
 {
-  RefinementFunction = refinement_func.ptr();
-  triangulate(options, &in, &out, &voronoi);
+  tTriangulateCall call(deadline, max_elements, progress);
+  if (py::isinstance<tGridSizeField>(refinement_func))
+  {
+    const tGridSizeField &field = py::cast<const tGridSizeField &>(
+        refinement_func);
+    if (field.dimensions() != 2)
+      PYTHON_ERROR(ValueError, "size field must be two-dimensional");
+    call.SizeField = &field;
+  }
+  else if (py::isinstance<tCRefinementFunction>(refinement_func))
+    call.CFunction = &py::cast<const tCRefinementFunction &>(refinement_func);
+  else
+    call.RefinementFunction = refinement_func;
+
+  std::vector<bool> out_unallocated = out.unallocatedArrays();
+  std::vector<bool> voronoi_unallocated = voronoi.unallocatedArrays();
+
+  {
+    tCurrentCallScope scope(&call);
+
+    if (refinement_func.is_none() || call.SizeField || call.CFunction)
+    {
+      py::gil_scoped_release release;
+      triangulate(options, &in, &out, &voronoi);
+    }
+    else
+      triangulate(options, &in, &out, &voronoi);
+  }
 
   out.holelist = NULL;
   out.numberofholes = 0;
@@ -215,17 +467,225 @@ void triangulateWrapper(char *options, tMeshInfo &in,
   out.regionlist = NULL;
   out.numberofregions = 0;
 
+  out.adoptMallocedArrays(out_unallocated);
+  voronoi.adoptMallocedArrays(voronoi_unallocated);
+
   out.Elements.fixUnit(out.numberofcorners);
   out.PointAttributes.fixUnit(out.numberofpointattributes);
   out.ElementAttributes.fixUnit(out.numberoftriangleattributes);
+
+  voronoi.PointAttributes.fixUnit(voronoi.numberofpointattributes);
+
+  call.Monitor.raiseIfAborted();
+
+  return buildStats(out);
 }
 
 
 
 
+class tTriangulation : public noncopyable
+{
+  private:
+    triangulation *Triangulation;
+    int NumberOfPointAttributes;
+
+    // Held while Triangulation is used, since refine() releases the GIL.
+    mutable std::mutex Mutex;
+
+    // Lock Mutex, releasing the GIL while waiting for it, so that a thread
+    // that holds Mutex and needs the GIL cannot deadlock with us.
+    std::unique_lock<std::mutex> lock() const
+    {
+      std::unique_lock<std::mutex> result(Mutex, std::try_to_lock);
+      if (!result.owns_lock())
+      {
+        py::gil_scoped_release release;
+        result.lock();
+      }
+      return result;
+    }
+
+    typedef py::array_t<REAL, py::array::c_style | py::array::forcecast>
+      real_array_t;
+    typedef py::array_t<int, py::array::c_style | py::array::forcecast>
+      int_array_t;
+
+  public:
+    tTriangulation(std::string options, tMeshInfo &in)
+      : NumberOfPointAttributes(in.numberofpointattributes)
+    {
+      std::vector<char> options_buf(options.begin(), options.end());
+      options_buf.push_back('\0');
+
+      {
+        py::gil_scoped_release release;
+        Triangulation = triangulation_create(options_buf.data(), &in);
+      }
+
+      if (!Triangulation)
+        PYTHON_ERROR(ValueError, "input points do not span a triangulation");
+    }
+
+    ~tTriangulation()
+    {
+      triangulation_destroy(Triangulation);
+    }
+
+    int numberOfPoints() const
+    {
+      std::unique_lock<std::mutex> held = lock();
+      return triangulation_numberofpoints(Triangulation);
+    }
+
+    int numberOfTriangles() const
+    {
+      std::unique_lock<std::mutex> held = lock();
+      return triangulation_numberoftriangles(Triangulation);
+    }
+
+    void refine(py::object areas_obj, py::object min_angle_obj)
+    {
+      std::unique_lock<std::mutex> held = lock();
+
+      REAL *areas_data = NULL;
+      real_array_t areas;
+      if (!areas_obj.is_none())
+      {
+        areas = py::cast<real_array_t>(areas_obj);
+        if (areas.ndim() != 1
+            || areas.shape(0) != triangulation_numberoftriangles(Triangulation))
+          PYTHON_ERROR(ValueError, "max_areas must have one entry per triangle");
+        areas_data = const_cast<REAL *>(areas.data());
+      }
+
+      REAL min_angle = -1;
+      if (!min_angle_obj.is_none())
+      {
+        min_angle = py::cast<REAL>(min_angle_obj);
+        if (!(min_angle >= 0))
+          PYTHON_ERROR(ValueError, "min_angle must not be negative");
+      }
+
+      py::gil_scoped_release release;
+      triangulation_refine(Triangulation, areas_data, min_angle);
+    }
+
+    py::array_t<int> insertPoints(py::object points_obj,
+        py::object attributes_obj, py::object markers_obj)
+    {
+      real_array_t points = py::cast<real_array_t>(points_obj);
+      if (points.ndim() != 2 || points.shape(1) != 2)
+        PYTHON_ERROR(ValueError, "points must have shape (npoints, 2)");
+      py::ssize_t npoints = points.shape(0);
+
+      REAL *attributes_data = NULL;
+      real_array_t attributes;
+      if (!attributes_obj.is_none())
+      {
+        attributes = py::cast<real_array_t>(attributes_obj);
+        if (attributes.ndim() != 2 || attributes.shape(0) != npoints
+            || attributes.shape(1) != NumberOfPointAttributes)
+          PYTHON_ERROR(ValueError,
+              "attributes must have shape (npoints, nattributes)");
+        attributes_data = const_cast<REAL *>(attributes.data());
+      }
+
+      int *markers_data = NULL;
+      int_array_t markers;
+      if (!markers_obj.is_none())
+      {
+        markers = py::cast<int_array_t>(markers_obj);
+        if (markers.ndim() != 1 || markers.shape(0) != npoints)
+          PYTHON_ERROR(ValueError, "markers must have shape (npoints,)");
+        markers_data = const_cast<int *>(markers.data());
+      }
+
+      py::array_t<int> indices(npoints);
+      std::unique_lock<std::mutex> held = lock();
+      triangulation_insertpoints(Triangulation, int(npoints),
+          const_cast<REAL *>(points.data()), attributes_data, markers_data,
+          indices.mutable_data());
+      return indices;
+    }
+
+    void removePoints(py::object indices_obj)
+    {
+      int_array_t indices = py::cast<int_array_t>(indices_obj);
+      if (indices.ndim() != 1)
+        PYTHON_ERROR(ValueError, "indices must be one-dimensional");
+
+      std::unique_lock<std::mutex> held = lock();
+      int npoints = triangulation_numberofpoints(Triangulation);
+      const int *indices_data = indices.data();
+      std::vector<int> sorted(indices_data, indices_data + indices.shape(0));
+      std::sort(sorted.begin(), sorted.end());
+      if (!sorted.empty() && (sorted.front() < 0 || sorted.back() >= npoints))
+        PYTHON_ERROR(IndexError, "point index out of bounds");
+      if (std::adjacent_find(sorted.begin(), sorted.end()) != sorted.end())
+        PYTHON_ERROR(ValueError, "point indices must be distinct");
+
+      int failed = triangulation_removepoints(Triangulation,
+          int(indices.shape(0)), const_cast<int *>(indices.data()));
+      if (failed)
+        throw py::value_error(
+            "point " + std::to_string(indices_data[failed-1])
+            + " cannot be removed: only interior points that do not lie "
+            "on a segment can be removed");
+    }
+
+    void insertSegments(py::object segments_obj, py::object markers_obj)
+    {
+      int_array_t segments = py::cast<int_array_t>(segments_obj);
+      if (segments.ndim() != 2 || segments.shape(1) != 2)
+        PYTHON_ERROR(ValueError, "segments must have shape (nsegments, 2)");
+      py::ssize_t nsegments = segments.shape(0);
+
+      int *markers_data = NULL;
+      int_array_t markers;
+      if (!markers_obj.is_none())
+      {
+        markers = py::cast<int_array_t>(markers_obj);
+        if (markers.ndim() != 1 || markers.shape(0) != nsegments)
+          PYTHON_ERROR(ValueError, "markers must have shape (nsegments,)");
+        markers_data = const_cast<int *>(markers.data());
+      }
+
+      std::unique_lock<std::mutex> held = lock();
+      int failed = triangulation_insertsegments(Triangulation,
+          int(nsegments), const_cast<int *>(segments.data()), markers_data);
+      if (failed < 0)
+        PYTHON_ERROR(RuntimeError, "triangulation does not support segments");
+      if (failed)
+        throw py::value_error(
+            "segment " + std::to_string(failed-1) + " is invalid: "
+            "its endpoints must be distinct, valid point indices");
+    }
+
+    void output(tMeshInfo &out)
+    {
+      std::vector<bool> unallocated = out.unallocatedArrays();
+      std::unique_lock<std::mutex> held = lock();
+      triangulation_output(Triangulation, &out);
+      out.adoptMallocedArrays(unallocated);
+
+      out.Elements.fixUnit(out.numberofcorners);
+      out.PointAttributes.fixUnit(out.numberofpointattributes);
+      out.ElementAttributes.fixUnit(out.numberoftriangleattributes);
+    }
+};
+
+
+
+
 void expose_triangle(pybind11::module &m)
 {
-  m.def("triangulate", triangulateWrapper);
+  m.def("triangulate", triangulateWrapper,
+      py::arg("options"), py::arg("in"), py::arg("out"), py::arg("voronoi"),
+      py::arg("refinement_func").none(true)=py::none(),
+      py::arg("deadline").none(true)=py::none(),
+      py::arg("max_elements").none(true)=py::none(),
+      py::arg("progress").none(true)=py::none());
 
   {
     typedef tMeshInfo cl;
@@ -264,6 +724,25 @@ void expose_triangle(pybind11::module &m)
       ;
   }
 
+  {
+    typedef tTriangulation cl;
+    py::class_<cl>(m, "Triangulation")
+      .def(py::init<std::string, tMeshInfo &>(),
+          py::arg("options"), py::arg("mesh_info"))
+      .def_property_readonly("number_of_points", &cl::numberOfPoints)
+      .def_property_readonly("number_of_elements", &cl::numberOfTriangles)
+      .def("insert_points", &cl::insertPoints,
+          py::arg("points"), py::arg("attributes")=py::none(),
+          py::arg("markers")=py::none())
+      .def("remove_points", &cl::removePoints, py::arg("indices"))
+      .def("insert_segments", &cl::insertSegments,
+          py::arg("segments"), py::arg("markers")=py::none())
+      .def("refine", &cl::refine,
+          py::arg("max_areas")=py::none(), py::arg("min_angle")=py::none())
+      .def("output", &cl::output, py::arg("mesh_info"))
+      ;
+  }
+
   {
     typedef tVertex cl;
     py::class_<cl>(m, "Vertex")
@@ -3,12 +3,27 @@
 
 void expose_triangle(pybind11::module &m);
 void expose_tetgen(pybind11::module &m);
+void expose_sizing(pybind11::module &m);
 
 PYBIND11_MODULE(_internals, m)
 {
+  pybind11::register_exception_translator([](std::exception_ptr p)
+      {
+        try
+        {
+          if (p)
+            std::rethrow_exception(p);
+        }
+        catch (const tExportedArrayError &e)
+        {
+          PyErr_SetString(PyExc_BufferError, e.what());
+        }
+      });
+
   exposePODForeignArray<double>(m, "RealArray");
   exposePODForeignArray<int>(m, "IntArray");
 
+  expose_sizing(m);
   expose_triangle(m);
   expose_tetgen(m);
 }
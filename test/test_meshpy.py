@@ -23,6 +23,14 @@ THE SOFTWARE.
 import math
 
 
+def _signed_areas(vertices):
+    """Signed areas of triangles with *vertices* of shape *(N, 3, 2)*,
+    positive for counterclockwise triangles."""
+    edge1 = vertices[:, 1] - vertices[:, 0]
+    edge2 = vertices[:, 2] - vertices[:, 0]
+    return 0.5 * (edge1[:, 0]*edge2[:, 1] - edge1[:, 1]*edge2[:, 0])
+
+
 # {{{ triangle
 
 def test_triangle_refine():
@@ -72,6 +80,995 @@ def test_triangle_refine():
     mesh = triangle.refine(mesh)
 
 
+def test_triangle_batched_refinement():
+    import numpy as np
+    import pytest
+
+    from meshpy import triangle
+
+    def max_area(x, y):
+        return 0.001 + 0.01 * (x**2 + y**2)
+
+    def needs_refinement(vertices, areas):
+        assert vertices.shape == (len(areas), 3, 2)
+        bary = vertices.mean(axis=1)
+        return areas > max_area(bary[:, 0], bary[:, 1])
+
+    info = triangle.MeshInfo()
+    info.set_points([(-1, -1), (1, -1), (1, 1), (-1, 1)])
+    info.set_facets([(0, 1), (1, 2), (2, 3), (3, 0)])
+
+    mesh = triangle.build(info, refinement_func=needs_refinement,
+            batched_refinement=True)
+
+    vertices = np.asarray(mesh.points)[np.asarray(mesh.elements)]
+    areas = np.abs(_signed_areas(vertices))
+    bary = vertices.mean(axis=1)
+
+    assert len(areas) > 100
+    assert (areas <= max_area(bary[:, 0], bary[:, 1])).all()
+
+    # exceptions stop refinement and are re-raised
+    class RefinementError(Exception):
+        pass
+
+    calls = []
+
+    def failing_refinement(vertices, areas):
+        calls.append(len(areas))
+        if len(calls) > 1:
+            raise RefinementError
+        return needs_refinement(vertices, areas)
+
+    with pytest.raises(RefinementError):
+        triangle.build(info, refinement_func=failing_refinement,
+                batched_refinement=True)
+    assert len(calls) == 2
+
+    with pytest.raises(ValueError):
+        triangle.build(info, refinement_func=lambda vertices, areas: [True],
+                batched_refinement=True)
+
+
+def test_grid_size_field():
+    import numpy as np
+
+    from meshpy import tet, triangle
+    from meshpy.geometry import make_box
+    from meshpy.sizing import GridSizeField
+
+    # finer on the left, coarser on the right
+    field = GridSizeField([[1e-3, 1e-3], [1e-2, 1e-2]], origin=(0, 0), spacing=1)
+    assert np.allclose(field(np.array([[0.5, 0.3], [2, 2]])), [5.5e-3, 1e-2])
+
+    info = triangle.MeshInfo()
+    info.set_points([(0, 0), (1, 0), (1, 1), (0, 1)])
+    info.set_facets([(0, 1), (1, 2), (2, 3), (3, 0)])
+    mesh = triangle.build(info, refinement_func=field)
+
+    vertices = np.asarray(mesh.points)[np.asarray(mesh.elements)]
+    areas = np.abs(_signed_areas(vertices))
+    assert (areas <= field(vertices.mean(axis=1))).all()
+
+    field = GridSizeField(np.full((2, 2, 2), 1e-3), origin=(0, 0, 0), spacing=1)
+    points, facets, _, _ = make_box((0, 0, 0), (1, 1, 1))
+    info = tet.MeshInfo()
+    info.set_points(points)
+    info.set_facets(facets)
+    mesh = tet.build(info, refinement_func=field)
+
+    vertices = np.asarray(mesh.points)[np.asarray(mesh.elements)]
+    edges = vertices[:, 1:] - vertices[:, :1]
+    volumes = np.abs(np.linalg.det(edges)) / 6
+    assert (volumes <= 1e-3).all()
+
+
+def test_c_refinement_function():
+    import ctypes
+
+    import numpy as np
+
+    from meshpy import triangle
+    from meshpy.sizing import CRefinementFunction
+
+    c_double_p = ctypes.POINTER(ctypes.c_double)
+
+    @ctypes.CFUNCTYPE(ctypes.c_int,
+            c_double_p, c_double_p, c_double_p, ctypes.c_double, ctypes.c_void_p)
+    def needs_refinement(org, dest, apex, area, user_data):
+        return area > ctypes.cast(user_data, c_double_p)[0]
+
+    info = triangle.MeshInfo()
+    info.set_points([(0, 0), (1, 0), (1, 1), (0, 1)])
+    info.set_facets([(0, 1), (1, 2), (2, 3), (3, 0)])
+
+    max_area = np.array([2e-3])
+    mesh = triangle.build(info,
+            refinement_func=CRefinementFunction(needs_refinement, max_area))
+
+    vertices = np.asarray(mesh.points)[np.asarray(mesh.elements)]
+    areas = np.abs(_signed_areas(vertices))
+    assert len(areas) >= 500
+    assert (areas <= max_area[0]).all()
+
+
+def test_cffi_refinement_function():
+    import numpy as np
+    import pytest
+
+    from meshpy import triangle
+    from meshpy.sizing import CRefinementFunction
+
+    cffi = pytest.importorskip("cffi")
+    ffi = cffi.FFI()
+    max_area = ffi.new("double[1]", [2e-3])
+
+    @ffi.callback("int(double *, double *, double *, double, void *)")
+    def needs_refinement(org, dest, apex, area, user_data):
+        return area > ffi.cast("double *", user_data)[0]
+
+    info = triangle.MeshInfo()
+    info.set_points([(0, 0), (1, 0), (1, 1), (0, 1)])
+    info.set_facets([(0, 1), (1, 2), (2, 3), (3, 0)])
+
+    func = CRefinementFunction(needs_refinement, max_area)
+    assert func.address == int(ffi.cast("uintptr_t", needs_refinement))
+    mesh = triangle.build(info, refinement_func=func)
+    assert len(mesh.elements) >= 500
+
+    # cffi function pointers are also wrapped automatically, but then
+    # receive no user data
+    @ffi.callback("int(double *, double *, double *, double, void *)")
+    def needs_refinement_fixed(org, dest, apex, area, user_data):
+        return area > 2e-3
+
+    mesh = triangle.build(info, refinement_func=needs_refinement_fixed)
+    vertices = np.asarray(mesh.points)[np.asarray(mesh.elements)]
+    areas = np.abs(_signed_areas(vertices))
+    assert len(areas) >= 500
+    assert (areas <= 2e-3).all()
+
+
+def test_tetgen_refinement_func():
+    import numpy as np
+    import pytest
+
+    from meshpy import tet
+    from meshpy.geometry import make_box
+
+    def max_volume(centroids):
+        return 1e-4 + 1e-2 * centroids[..., 0]
+
+    def needs_refinement(vertices, volume):
+        return volume > max_volume(np.mean(vertices, axis=0))
+
+    def needs_refinement_batched(vertices, volumes):
+        assert vertices.shape == (len(volumes), 4, 3)
+        return volumes > max_volume(vertices.mean(axis=1))
+
+    points, facets, _, _ = make_box((0, 0, 0), (1, 1, 1))
+    info = tet.MeshInfo()
+    info.set_points(points)
+    info.set_facets(facets)
+
+    for refinement_func, batched in [
+            (needs_refinement, False),
+            (needs_refinement_batched, True)]:
+        mesh = tet.build(info, refinement_func=refinement_func,
+                batched_refinement=batched)
+
+        vertices = np.asarray(mesh.points)[np.asarray(mesh.elements)]
+        volumes = np.abs(np.linalg.det(vertices[:, 1:] - vertices[:, :1])) / 6
+        assert len(volumes) > 100
+        assert (volumes <= max_volume(vertices.mean(axis=1)) * (1 + 1e-12)).all()
+
+    def failing_refinement(vertices, volumes):
+        raise KeyError("refinement")
+
+    with pytest.raises(KeyError):
+        tet.build(info, refinement_func=failing_refinement,
+                batched_refinement=True)
+
+
+def test_tetgen_point_metric():
+    import numpy as np
+    import pytest
+
+    from meshpy import tet
+    from meshpy.geometry import make_box
+
+    points, facets, _, _ = make_box((0, 0, 0), (1, 1, 1))
+    info = tet.MeshInfo()
+    info.set_points(points)
+    info.set_facets(facets)
+
+    # fine at x=0, coarse at x=1
+    sizes = np.where(np.array(points)[:, 0] == 0, 0.05, 0.5)
+    info.set_point_metric_tensors(sizes)
+    assert info.number_of_point_metric_tensors == 1
+    assert np.allclose(np.asarray(info.point_metric_tensors), sizes)
+
+    mesh = tet.build(info, metric=True)
+    centroids = np.asarray(mesh.points)[np.asarray(mesh.elements)].mean(axis=1)
+    assert (centroids[:, 0] < 0.5).sum() > 5 * (centroids[:, 0] > 0.5).sum()
+
+    # the same sizes as isotropic metric tensors
+    metrics = np.zeros((len(points), 6))
+    metrics[:, [0, 3, 5]] = 1/sizes[:, np.newaxis]**2
+    info.set_point_metric_tensors(metrics)
+    assert np.allclose(np.asarray(info.point_metric_tensors), sizes)
+
+    # metrics that are not positive definite prescribe no size
+    for bad_metric in [(-1, 0, 0, -1, 0, -1), (1, 0, 0, 1, 0, 0),
+            (1, 2, 0, 1, 0, 1), (np.nan, 0, 0, 1, 0, 1)]:
+        metrics[0] = bad_metric
+        with pytest.raises(ValueError):
+            info.set_point_metric_tensors(metrics)
+
+
+def test_tetgen_background_mesh():
+    import numpy as np
+
+    from meshpy import tet
+    from meshpy.geometry import make_box
+
+    points, facets, _, _ = make_box((0, 0, 0), (1, 1, 1))
+    info = tet.MeshInfo()
+    info.set_points(points)
+    info.set_facets(facets)
+
+    background = tet.build(info, max_volume=0.01)
+    background.set_point_metric_tensors(
+            0.05 + 0.5 * np.asarray(background.points)[:, 0])
+
+    mesh = tet.build(info, background_mesh=background)
+    centroids = np.asarray(mesh.points)[np.asarray(mesh.elements)].mean(axis=1)
+    assert (centroids[:, 0] < 0.5).sum() > 5 * (centroids[:, 0] > 0.5).sum()
+
+
+def test_tetgen_insert_points():
+    import numpy as np
+
+    from meshpy import tet
+    from meshpy.geometry import make_box
+
+    points, facets, _, _ = make_box((0, 0, 0), (1, 1, 1))
+    info = tet.MeshInfo()
+    info.set_points(points)
+    info.set_facets(facets)
+
+    rng = np.random.default_rng(17)
+    insert_points = rng.uniform(0.1, 0.9, (500, 3))
+
+    mesh = tet.build(info, options=tet.Options("p"), insert_points=insert_points)
+    mesh_points = np.asarray(mesh.points)
+    assert len(mesh_points) == len(points) + len(insert_points)
+
+    dist = np.linalg.norm(
+            mesh_points[:, np.newaxis] - insert_points[np.newaxis], axis=-1)
+    assert (dist.min(axis=0) < 1e-12).all()
+
+
+def test_delaunay():
+    import numpy as np
+
+    from meshpy import tet, triangle
+
+    rng = np.random.default_rng(17)
+    for module, dim in [(triangle, 2), (tet, 3)]:
+        points = rng.random((1000, dim))
+        simplices, neighbors = module.delaunay(points)
+
+        assert simplices.shape == neighbors.shape == (len(simplices), dim+1)
+
+        # the simplices cover the convex hull of the points
+        vertices = points[simplices]
+        volumes = np.abs(np.linalg.det(vertices[:, 1:] - vertices[:, :1]))
+        hull_volume = np.sum(volumes) / (2 if dim == 2 else 6)
+        assert 0.9 < hull_volume <= 1
+
+        # neighbor j is opposite vertex j
+        for i in range(0, len(simplices), 97):
+            for j in range(dim+1):
+                if neighbors[i, j] >= 0:
+                    shared = set(simplices[i]) & set(simplices[neighbors[i, j]])
+                    assert shared == set(simplices[i]) - {simplices[i, j]}
+
+
+def test_triangle_voronoi():
+    import numpy as np
+
+    from meshpy import triangle
+
+    info = triangle.MeshInfo()
+    info.set_points([(0, 0), (1, 0), (1, 1), (0, 1)])
+    info.set_facets([(0, 1), (1, 2), (2, 3), (3, 0)])
+    mesh, voronoi = triangle.build(info, max_volume=0.01, voronoi=True)
+
+    points = np.asarray(mesh.points)
+    elements = np.asarray(mesh.elements)
+    vor_points = np.asarray(voronoi.points)
+    vor_edges = np.asarray(voronoi.faces)
+    vor_normals = np.asarray(voronoi.normals)
+
+    # Voronoi vertices are the triangles' circumcenters
+    assert vor_points.shape == (len(elements), 2)
+    dists = np.linalg.norm(points[elements] - vor_points[:, np.newaxis], axis=-1)
+    assert np.allclose(dists, dists[:, :1])
+
+    # rays have a direction, finite edges do not
+    rays = vor_edges[:, 1] == -1
+    assert rays.any()
+    assert (np.linalg.norm(vor_normals[rays], axis=1) > 0).all()
+    assert (vor_normals[~rays] == 0).all()
+
+
+def test_incremental_triangulation():
+    import numpy as np
+    import pytest
+
+    from meshpy import triangle
+
+    info = triangle.MeshInfo()
+    info.set_points([(0, 0), (4, 0), (4, 4), (0, 4),
+        (1, 1), (3, 1), (3, 3), (1, 3)])
+    info.set_facets([(0, 1), (1, 2), (2, 3), (3, 0),
+        (4, 5), (5, 6), (6, 7), (7, 4)])
+    info.holes.resize(1)
+    info.holes[0] = (2, 2)
+
+    tri = triangle.Triangulation(info)
+    assert tri.number_of_points == 8
+
+    rng = np.random.default_rng(17)
+    expected = np.array(info.points)
+    for _ in range(5):
+        points = 4*rng.random((50, 2))
+        indices = tri.insert_points(points)
+
+        # points in the hole are rejected
+        inserted = indices[indices >= 0]
+        assert 0 < len(inserted) < 50
+        assert (inserted == np.arange(len(inserted)) + inserted[0]).all()
+        expected = np.vstack([expected, points[indices >= 0]])
+
+        tri.remove_points(inserted[:len(inserted)//2])
+        expected = np.delete(expected, inserted[:len(inserted)//2], axis=0)
+
+        areas = _signed_areas(tri.points[tri.elements])
+        assert (areas > 0).all()
+        assert np.isclose(areas.sum(), 12)
+        assert np.array_equal(tri.points, expected)
+
+    # many small updates between exports keep the numbering
+    for _ in range(20):
+        points = 4*rng.random((10, 2))
+        indices = tri.insert_points(points)
+        expected = np.vstack([expected, points[indices >= 0]])
+        victim = indices[indices >= 0][0] - 3
+        tri.remove_points([victim])
+        expected = np.delete(expected, victim, axis=0)
+    assert tri.number_of_points == len(expected)
+    assert np.array_equal(tri.points, expected)
+
+    # points on the boundary cannot be removed
+    with pytest.raises(ValueError):
+        tri.remove_points([0])
+
+    new = tri.insert_points([(0.5, 0.5), (0.5, 3.5), (0.5, 0.5)])
+    assert new[2] == -1
+    tri.insert_segments([new[:2]], markers=[7])
+    assert 7 in np.asarray(tri.mesh.facet_markers)
+    with pytest.raises(ValueError):
+        tri.remove_points([new[0]])
+
+    neighbors = tri.neighbors
+    assert neighbors.shape == tri.elements.shape
+    assert (neighbors >= -1).all()
+
+
+def test_triangulation_point_location():
+    import numpy as np
+
+    from meshpy import triangle
+
+    # a comb-shaped hole, which the walks toward new points must get around
+    outer = [(0, 0), (1, 0), (1, 1), (0, 1)]
+    hole = [(0.1, 0.1), (0.9, 0.1), (0.9, 0.9), (0.8, 0.9), (0.8, 0.3),
+            (0.7, 0.3), (0.7, 0.9), (0.6, 0.9), (0.6, 0.3), (0.5, 0.3),
+            (0.5, 0.9), (0.1, 0.9)]
+    # two separate squares
+    left = [(0, 0), (0.4, 0), (0.4, 1), (0, 1)]
+    right = [(0.6, 0), (1, 0), (1, 1), (0.6, 1)]
+
+    def contains(loop, points):
+        x, y = points.T
+        result = np.zeros(len(points), dtype=bool)
+        for (x1, y1), (x2, y2) in zip(loop, loop[1:] + loop[:1], strict=True):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                crosses = ((y1 > y) != (y2 > y)) & (
+                        x < x1 + (y - y1) * (x2 - x1) / (y2 - y1))
+            result ^= crosses
+        return result
+
+    rng = np.random.default_rng(5)
+    for loops, holes in [([outer, hole], [(0.3, 0.5)]), ([left, right], [])]:
+        info = triangle.MeshInfo()
+        info.set_points([pt for loop in loops for pt in loop])
+        facets = []
+        for loop in loops:
+            start = len(facets)
+            facets += [(start + i, start + (i + 1) % len(loop))
+                    for i in range(len(loop))]
+        info.set_facets(facets)
+        if holes:
+            info.set_holes(holes)
+        tri = triangle.Triangulation(info, max_volume=1e-3,
+                quality_meshing=True)
+
+        points = 1.2 * rng.random((200, 2)) - 0.1
+        inside = np.zeros(len(points), dtype=bool)
+        for loop in loops:
+            inside ^= contains(loop, points)
+
+        # one at a time, so that each walk starts where the last one ended
+        indices = np.array([tri.insert_points(pt[None, :])[0] for pt in points])
+        assert ((indices >= 0) == inside).all()
+
+
+def test_triangulation_refine():
+    import numpy as np
+    import pytest
+
+    from meshpy import triangle
+
+    info = triangle.MeshInfo()
+    info.set_points([(0, 0), (1, 0), (1, 1), (0, 1)])
+    info.set_facets([(0, 1), (1, 2), (2, 3), (3, 0)])
+    tri = triangle.Triangulation(info)
+
+    def max_area(centroids):
+        return 1e-4 + 1e-2 * np.sum((centroids - 0.5)**2, axis=-1)
+
+    for _ in range(5):
+        vertices = tri.points[tri.elements]
+        tri.refine(max_area(vertices.mean(axis=1)), min_angle=25)
+
+    vertices = tri.points[tri.elements]
+    areas = _signed_areas(vertices)
+    assert tri.number_of_elements == len(areas) > 1000
+    assert (areas > 0).all()
+    assert np.isclose(areas.sum(), 1)
+    # bounds were given at the centroids of the coarser parent triangles
+    assert (areas <= 2*max_area(vertices.mean(axis=1))).all()
+
+    with pytest.raises(ValueError):
+        tri.refine(np.ones(3))
+
+    # refinement, which releases the GIL, and insertions from other threads
+    # take turns
+    from concurrent.futures import ThreadPoolExecutor
+
+    tri = triangle.Triangulation(info)
+    rng = np.random.default_rng(17)
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(tri.refine, None, 30) for _ in range(4)]
+        futures += [pool.submit(tri.insert_points, rng.random((100, 2)))
+                for _ in range(4)]
+        for future in futures:
+            future.result()
+
+    areas = _signed_areas(tri.points[tri.elements])
+    assert (areas > 0).all()
+    assert np.isclose(areas.sum(), 1)
+
+
+def test_tet_adaptive_refiner():
+    import numpy as np
+    import pytest
+
+    from meshpy.tet import AdaptiveRefiner, MeshInfo, build
+
+    mesh_info = MeshInfo()
+    mesh_info.set_points([
+        (0, 0, 0), (2, 0, 0), (2, 2, 0), (0, 2, 0),
+        (0, 0, 12), (2, 0, 12), (2, 2, 12), (0, 2, 12),
+        ])
+    mesh_info.set_facets([
+        [0, 1, 2, 3], [4, 5, 6, 7], [0, 4, 5, 1],
+        [1, 5, 6, 2], [2, 6, 7, 3], [3, 7, 4, 0],
+        ])
+    mesh = build(mesh_info, max_volume=1)
+
+    def centroids(mesh):
+        return np.array(mesh.points)[np.array(mesh.elements)].mean(axis=1)
+
+    def volumes(mesh):
+        a, b, c, d = np.array(mesh.points)[np.array(mesh.elements)] \
+                .transpose(1, 0, 2)
+        return np.abs(np.einsum("ij,ij->i", np.cross(b - a, c - a), d - a))/6
+
+    max_volumes = np.where(centroids(mesh)[:, 2] < 6, 0.05, -1)
+    old_points = np.array(mesh.points)
+    old_elements = np.array(mesh.elements)
+    new_mesh, parents = AdaptiveRefiner().refine(mesh, max_volumes)
+
+    assert len(new_mesh.elements) > len(mesh.elements)
+    assert parents.shape == (len(new_mesh.elements),)
+    assert 0 <= parents.min() and parents.max() < len(mesh.elements)
+    # each parent contains the centroid of its child
+    old_vertices = np.array(mesh.points)[np.array(mesh.elements)[parents]]
+    bary = np.linalg.solve(
+            (old_vertices[:, 1:] - old_vertices[:, :1]).transpose(0, 2, 1),
+            (centroids(new_mesh) - old_vertices[:, 0])[:, :, np.newaxis])[:, :, 0]
+    assert (bary >= -1e-10).all() and (bary.sum(axis=1) <= 1 + 1e-10).all()
+    assert np.isclose(volumes(new_mesh).sum(), 48)
+    assert (volumes(new_mesh)[centroids(new_mesh)[:, 2] < 5] <= 0.05).all()
+    assert new_mesh.number_of_element_attributes == 0
+
+    # the input mesh is left as it was
+    assert np.array_equal(mesh.points, old_points)
+    assert np.array_equal(mesh.elements, old_elements)
+    assert mesh.number_of_element_attributes == 0
+    assert not mesh.element_volumes.allocated
+
+    with pytest.raises(ValueError):
+        AdaptiveRefiner().refine(mesh, np.ones(3))
+
+
+def test_tet_point_location():
+    import numpy as np
+
+    from meshpy.tet import MeshInfo, _locate_points, build
+
+    def cube(lower, upper, first):
+        points = [(x, y, z) for z in (lower, upper) for y in (lower, upper)
+                for x in (lower, upper)]
+        facets = [[0, 1, 3, 2], [4, 5, 7, 6], [0, 1, 5, 4],
+                [2, 3, 7, 6], [0, 2, 6, 4], [1, 3, 7, 5]]
+        return points, [[first + i for i in facet] for facet in facets]
+
+    # a cube with a cubic hole, which the walks toward the points must get
+    # around
+    outer_points, outer_facets = cube(0, 3, 0)
+    inner_points, inner_facets = cube(1, 2, 8)
+    mesh_info = MeshInfo()
+    mesh_info.set_points(outer_points + inner_points)
+    mesh_info.set_facets(outer_facets + inner_facets)
+    mesh_info.set_holes([(1.5, 1.5, 1.5)])
+    mesh = build(mesh_info, max_volume=0.1)
+
+    mesh_points = np.array(mesh.points)
+    elements = np.array(mesh.elements)
+    vertices = mesh_points[elements]
+    points = vertices.mean(axis=1)
+    # start all walks on the far side of the hole
+    guesses = np.full(len(elements), np.argmin(points[:, 0]), dtype=np.int32)
+    located = _locate_points(mesh_points, elements, points, guesses,
+            max_steps=3)
+    assert (located == np.arange(len(elements))).all()
+
+
+def test_uniform_refine():
+    import numpy as np
+
+    from meshpy.tools import uniform_refine, uniform_refine_triangles
+
+    def signed_volumes(points, elements):
+        vertices = points[elements]
+        return np.linalg.det(vertices[:, 1:] - vertices[:, :1])
+
+    rng = np.random.default_rng(17)
+    for dim, factor in [(2, 1), (2, 2), (2, 3), (2, 5), (3, 2)]:
+        if dim == 2:
+            points = rng.random((4, 2))
+            elements = np.array([(0, 1, 2), (0, 2, 3)])
+        else:
+            from meshpy.tet import delaunay
+            points = rng.random((8, 3))
+            elements, _ = delaunay(points)
+
+        refinement = uniform_refine(points, elements, factor)
+        fine_points = refinement.points
+        fine_elements = refinement.elements
+        nchildren = factor**dim
+        assert len(fine_elements) == nchildren*len(elements)
+        assert (fine_points[:len(points)] == points).all()
+
+        # children subdivide their parents and keep their orientation
+        coarse_volumes = signed_volumes(points, elements)
+        fine_volumes = signed_volumes(fine_points, fine_elements)
+        assert np.allclose(coarse_volumes[refinement.parents],
+                nchildren*fine_volumes)
+
+        # shared edges are split only once
+        assert (len(np.unique(np.round(fine_points, 12), axis=0))
+                == len(fine_points))
+
+        # prolongation reproduces linear functions
+        coefficients = np.arange(1, dim+1)
+        interpolated = np.sum(refinement.interpolation_weights
+                * (points @ coefficients)[refinement.interpolation_indices],
+                axis=1)
+        assert np.allclose(interpolated, fine_points @ coefficients)
+
+        try:
+            import scipy  # ruff: ignore[unused-import]
+        except ImportError:
+            continue
+        prolongation = refinement.prolongation()
+        assert prolongation.shape == (len(fine_points), len(points))
+        assert np.allclose(prolongation @ (points @ coefficients),
+                fine_points @ coefficients)
+        assert (refinement.restriction() != prolongation.T).nnz == 0
+
+    new_points, new_elements, old_face_to_new_faces = \
+            uniform_refine_triangles(points[:4, :2], [(0, 1, 2), (0, 2, 3)], 3)
+    assert len(new_points) == 16
+    assert len(new_elements) == 18
+    assert len(old_face_to_new_faces) == 5
+    # the types returned before uniform_refine was vectorized
+    assert isinstance(new_points, list) and isinstance(new_elements, list)
+    assert isinstance(old_face_to_new_faces, dict)
+    assert all(isinstance(element, tuple) for element in new_elements)
+    fine_edges = old_face_to_new_faces[frozenset([2, 0])]
+    assert len(fine_edges) == 3
+    assert fine_edges[0][0] == 0 and fine_edges[-1][1] == 2
+    assert np.allclose(new_points[fine_edges[0][1]],
+            (2*points[0, :2] + points[2, :2])/3)
+
+
+def _exit_refinement_func(vertices, area):
+    import os
+    os._exit(3)
+
+
+def _hang_refinement_func(vertices, area):
+    import time
+    time.sleep(60)
+
+
+def test_build_many():
+    import numpy as np
+
+    from meshpy.batch import BuildJob, WorkerCrashedError, build_many
+    from meshpy.geometry import make_box
+
+    square = [(0, 0), (1, 0), (1, 1), (0, 1)]
+    square_segments = [(0, 1), (1, 2), (2, 3), (3, 0)]
+    box_points, box_facets, _, _ = make_box((0, 0, 0), (1, 1, 1))
+
+    jobs = [
+            BuildJob(square, square_segments, max_volume=1e-3),
+            BuildJob(box_points, box_facets, options="pqa0.01"),
+            BuildJob(square, square_segments,
+                refinement_func=_exit_refinement_func),
+            BuildJob(square, square_segments,
+                refinement_func=_hang_refinement_func),
+            BuildJob(square, square_segments, max_volume=1e-2),
+            ]
+    results = {result.index: result
+            for result in build_many(jobs, max_workers=2, timeout=3)}
+    assert sorted(results) == list(range(len(jobs)))
+
+    for index in [0, 1, 4]:
+        result = results[index]
+        assert result.error is None
+        reference = jobs[index].build()
+        for name in ["points", "elements"]:
+            assert np.array_equal(result.arrays[name],
+                    np.array(getattr(reference, name)))
+
+    assert isinstance(results[2].error, WorkerCrashedError)
+    assert isinstance(results[3].error, TimeoutError)
+
+
+def test_build_many_timeout_excludes_startup():
+    import multiprocessing
+
+    from meshpy.batch import BuildJob, build_many
+
+    square = [(0, 0), (1, 0), (1, 1), (0, 1)]
+    square_segments = [(0, 1), (1, 2), (2, 3), (3, 0)]
+
+    # Spawning a worker and importing meshpy in it takes longer than the
+    # time limit, which only applies to the job itself.
+    jobs = [BuildJob(square, square_segments, max_volume=1e-2)
+            for _ in range(2)]
+    results = list(build_many(jobs, max_workers=1, timeout=0.3,
+            mp_context=multiprocessing.get_context("spawn")))
+    assert len(results) == len(jobs)
+    assert all(result.error is None for result in results)
+
+
+def test_aio_build():
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    import numpy as np
+    import pytest
+
+    from meshpy import aio, tet, triangle
+    from meshpy.geometry import make_box
+
+    tri_info = triangle.MeshInfo()
+    tri_info.set_points([(0, 0), (1, 0), (1, 1), (0, 1)])
+    tri_info.set_facets([(0, 1), (1, 2), (2, 3), (3, 0)])
+
+    points, facets, _, _ = make_box((0, 0, 0), (1, 1, 1))
+    tet_info = tet.MeshInfo()
+    tet_info.set_points(points)
+    tet_info.set_facets(facets)
+
+    async def main():
+        meshes = await asyncio.gather(
+                aio.build(tet_info, max_volume=1e-3),
+                *[aio.build(tri_info, max_volume=1e-3)
+                    for _ in range(2*aio.get_max_workers())])
+
+        # cancelled calls give back their slots
+        tasks = [asyncio.ensure_future(aio.build(tet_info, max_volume=1e-4))
+                for _ in range(2*aio.get_max_workers())]
+        await asyncio.sleep(0)
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        await asyncio.wait_for(asyncio.gather(
+                *[aio.build(tri_info) for _ in range(aio.get_max_workers())]),
+                timeout=60)
+
+        # a cancelled call that is running is stopped, rather than left to
+        # finish a mesh that takes many seconds
+        with ThreadPoolExecutor(1) as executor:
+            task = asyncio.ensure_future(
+                    aio.build(tet_info, executor=executor, max_volume=1e-6))
+            await asyncio.sleep(0.3)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            await asyncio.wait_for(
+                    asyncio.wrap_future(executor.submit(lambda: None)),
+                    timeout=5)
+
+        with pytest.raises(TypeError):
+            await aio.build(points)
+
+        return meshes
+
+    meshes = asyncio.run(main())
+    for mesh_info, mesh in [(tet_info, meshes[0]), (tri_info, meshes[-1])]:
+        build = tet.build if mesh_info is tet_info else triangle.build
+        reference = build(mesh_info, max_volume=1e-3)
+        assert np.array_equal(np.array(mesh.elements),
+                np.array(reference.elements))
+
+
+def test_meshing_limits():
+    import pytest
+
+    from meshpy import tet, triangle
+    from meshpy.geometry import make_box
+
+    tri_info = triangle.MeshInfo()
+    tri_info.set_points([(0, 0), (1, 0), (1, 1), (0, 1)])
+    tri_info.set_facets([(0, 1), (1, 2), (2, 3), (3, 0)])
+
+    points, facets, _, _ = make_box((0, 0, 0), (1, 1, 1))
+    tet_info = tet.MeshInfo()
+    tet_info.set_points(points)
+    tet_info.set_facets(facets)
+
+    with pytest.raises(triangle.MeshingAbortedError) as exc_info:
+        triangle.build(tri_info, max_volume=1e-6, max_elements=1000)
+    assert exc_info.value.reason == "max_elements"
+    assert exc_info.value.progress["phase"] == "refinement"
+    assert exc_info.value.progress["elements"] > 1000
+
+    with pytest.raises(triangle.MeshingAbortedError) as exc_info:
+        triangle.build(tri_info, max_volume=1e-8, deadline=0)
+    assert exc_info.value.reason == "deadline"
+
+    with pytest.raises(tet.MeshingAbortedError) as exc_info:
+        tet.build(tet_info, max_volume=1e-5, max_elements=1000)
+    assert exc_info.value.reason == "max_elements"
+    assert exc_info.value.progress["elements"] > 1000
+
+    with pytest.raises(tet.MeshingAbortedError) as exc_info:
+        tet.build(tet_info, max_volume=1e-5, deadline=0)
+    assert exc_info.value.reason == "deadline"
+
+    # within the limits
+    mesh = tet.build(tet_info, max_volume=1e-2, deadline=60,
+            max_elements=10**6)
+    assert len(mesh.elements) > 0
+
+    with pytest.raises(ValueError):
+        triangle.build(tri_info, deadline=-1)
+
+
+def test_progress_callback():
+    import pytest
+
+    from meshpy import tet, triangle
+    from meshpy.geometry import make_box
+
+    tri_info = triangle.MeshInfo()
+    tri_info.set_points([(0, 0), (1, 0), (1, 1), (0, 1)])
+    tri_info.set_facets([(0, 1), (1, 2), (2, 3), (3, 0)])
+
+    points, facets, _, _ = make_box((0, 0, 0), (1, 1, 1))
+    tet_info = tet.MeshInfo()
+    tet_info.set_points(points)
+    tet_info.set_facets(facets)
+
+    reports = []
+    triangle.build(tri_info, max_volume=1e-4,
+            progress=lambda *args: reports.append(args))
+    assert reports
+    assert all(phase == "refinement" for phase, _, _, _ in reports)
+
+    reports = []
+    tet.build(tet_info, max_volume=1e-4,
+            progress=lambda *args: reports.append(args))
+    assert reports
+    phase, npoints, ntets, nbad = reports[0]
+    assert phase in ["delaunay", "recovery", "refinement", "optimization"]
+    assert npoints > 0 and ntets > 0 and nbad >= 0
+
+    class StopMeshingError(Exception):
+        pass
+
+    def stop(phase, npoints, nelements, nbad):
+        raise StopMeshingError
+
+    with pytest.raises(StopMeshingError):
+        triangle.build(tri_info, max_volume=1e-4, progress=stop)
+    with pytest.raises(StopMeshingError):
+        tet.build(tet_info, max_volume=1e-4, progress=stop)
+
+
+def test_progress_after_refinement():
+    from meshpy import tet
+    from meshpy.geometry import make_box
+
+    points, facets, _, _ = make_box((0, 0, 0), (1, 1, 1))
+    info = tet.MeshInfo()
+    info.set_points(points)
+    info.set_facets(facets)
+
+    reports = []
+    tet.build(info, options=tet.Options("pq1.2"), max_volume=1e-4,
+            progress=lambda *args: reports.append(args))
+
+    phases = [phase for phase, _, _, _ in reports]
+    assert "refinement" in phases and "optimization" in phases
+    assert all(nbad == 0
+            for phase, _, _, nbad in reports if phase == "optimization")
+
+
+def test_build_stats():
+    from meshpy import tet, triangle
+    from meshpy.geometry import make_box
+
+    info = triangle.MeshInfo()
+    info.set_points([(0, 0), (1, 0), (1, 1), (0, 1)])
+    info.set_facets([(0, 1), (1, 2), (2, 3), (3, 0)])
+    mesh = triangle.build(info, max_volume=1e-3)
+
+    stats = mesh.stats
+    assert "refinement" in stats.phase_times
+    assert stats.total_time >= stats.phase_times["refinement"] >= 0
+    assert stats.counts["points"] == len(mesh.points)
+    assert stats.counts["elements"] == len(mesh.elements)
+    assert stats.counts["steiner_points"] == len(mesh.points) - 4
+    assert stats.peak_pool_items["triangles"] >= len(mesh.elements)
+
+    points, facets, _, _ = make_box((0, 0, 0), (1, 1, 1))
+    info = tet.MeshInfo()
+    info.set_points(points)
+    info.set_facets(facets)
+    mesh = tet.build(info, max_volume=1e-3)
+
+    stats = mesh.stats
+    phases = list(stats.phase_times)
+    assert phases[0] == "input" and phases[-1] == "output"
+    assert "refinement" in stats.phase_times
+    assert stats.counts["elements"] == len(mesh.elements)
+    assert stats.counts["steiner_points"] == len(mesh.points) - len(points)
+    assert stats.counts["steiner_points"] == (
+            stats.counts["steiner_points_on_segments"]
+            + stats.counts["steiner_points_on_facets"]
+            + stats.counts["steiner_points_in_volume"])
+    assert stats.peak_pool_items["tetrahedrons"] >= len(mesh.elements)
+
+    assert triangle.MeshInfo().stats is None
+
+
+def test_memory_accounting():
+    import numpy as np
+
+    from meshpy import tet, triangle
+    from meshpy.geometry import make_box
+
+    info = triangle.MeshInfo()
+    info.set_points([(0, 0), (1, 0), (1, 1), (0, 1)])
+    info.set_facets([(0, 1), (1, 2), (2, 3), (3, 0)])
+    mesh = triangle.build(info, max_volume=1e-3)
+
+    by_array = mesh.nbytes_by_array()
+    assert set(by_array) == set(triangle.MeshInfo._constituents)
+    assert by_array["points"] == np.asarray(mesh.points).nbytes
+    assert by_array["elements"] == np.asarray(mesh.elements).nbytes
+    assert mesh.nbytes == sum(by_array.values())
+    assert triangle.MeshInfo().nbytes == 0
+
+    pool_bytes = mesh.stats.peak_pool_bytes
+    assert set(pool_bytes) == set(mesh.stats.peak_pool_items)
+    assert pool_bytes["triangles"] > 0
+
+    points, facets, _, _ = make_box((0, 0, 0), (1, 1, 1))
+    info = tet.MeshInfo()
+    info.set_points(points)
+    info.set_facets(facets)
+    # facets include the memory held by their polygons
+    assert info.facets.nbytes > 0
+    mesh = tet.build(info, max_volume=1e-3)
+
+    by_array = mesh.nbytes_by_array()
+    assert by_array["points"] == np.asarray(mesh.points).nbytes
+    assert by_array["elements"] == np.asarray(mesh.elements).nbytes
+    assert mesh.nbytes == sum(by_array.values())
+
+    pool_bytes = mesh.stats.peak_pool_bytes
+    assert set(pool_bytes) == {
+            "points", "tetrahedrons", "subfaces", "subsegs", "flippool"}
+    assert pool_bytes["tetrahedrons"] >= (
+            mesh.stats.peak_pool_items["tetrahedrons"] * 4 * np.dtype(np.intp).itemsize)
+
+
+def test_dual_control_volumes():
+    import numpy as np
+
+    from meshpy import tet, triangle
+    from meshpy.geometry import make_box
+    from meshpy.tools import dual_control_volumes
+
+    info = triangle.MeshInfo()
+    info.set_points([(0, 0), (1, 0), (1, 1), (0, 1)])
+    info.set_facets([(0, 1), (1, 2), (2, 3), (3, 0)])
+    mesh_2d = triangle.build(info, max_volume=1e-3)
+
+    points, facets, _, _ = make_box((0, 0, 0), (1, 1, 1))
+    info = tet.MeshInfo()
+    info.set_points(points)
+    info.set_facets(facets)
+    mesh_3d = tet.build(info, max_volume=1e-3)
+
+    for mesh, kind in [
+            (mesh_2d, "median"), (mesh_2d, "voronoi"), (mesh_3d, "median")]:
+        points = np.asarray(mesh.points)
+        dual = dual_control_volumes(points, np.asarray(mesh.elements), kind)
+
+        assert np.isclose(dual.volumes.sum(), 1)
+        assert (dual.volumes > 0).all()
+
+        if kind == "median":
+            # normals point along their edges
+            edge_vectors = points[dual.edges[:, 1]] - points[dual.edges[:, 0]]
+            assert (np.sum(dual.normals * edge_vectors, axis=1) > 0).all()
+
+        # control volumes of interior points are closed
+        rows = np.repeat(np.arange(len(points)), np.diff(dual.offsets))
+        net_normals = np.zeros_like(points)
+        np.add.at(net_normals, rows, dual.outward_normals())
+        interior = np.all((points > 1e-10) & (points < 1 - 1e-10), axis=1)
+        assert interior.any()
+        assert np.allclose(net_normals[interior], 0)
+
+
 def test_point_attributes():
     from meshpy import triangle
 
@@ -88,6 +1085,127 @@ def test_point_attributes():
 
     triangle.build(info)
 
+
+def test_foreign_array_buffer():
+    import numpy as np
+    import pytest
+
+    from meshpy import triangle
+
+    info = triangle.MeshInfo()
+    info.set_points([(0, 0), (1, 0), (1, 1), (0, 1)])
+    info.set_facets([(0, 1), (1, 2), (2, 3), (3, 0)])
+
+    mesh = triangle.build(info, max_volume=0.1)
+
+    points = np.asarray(mesh.points)
+    elements = np.asarray(mesh.elements)
+    point_markers = np.asarray(mesh.point_markers)
+
+    assert points.shape == (len(mesh.points), 2)
+    assert elements.shape == (len(mesh.elements), 3)
+    assert point_markers.shape == (len(mesh.points),)
+    assert elements.dtype == np.int32
+
+    for i in range(len(mesh.elements)):
+        assert list(elements[i]) == mesh.elements[i]
+
+    # views share memory with the mesh
+    points[0, 0] = 17
+    assert mesh.points[0][0] == 17
+
+    assert np.asarray(mesh.holes).shape == (0, 2)
+
+    # arrays with live views, or arrays tied to them, keep their storage
+    with pytest.raises(BufferError):
+        mesh.points.resize(3)
+    with pytest.raises(BufferError):
+        mesh.set_points(np.zeros((3, 2)))
+    with pytest.raises(BufferError):
+        mesh.point_markers.deallocate()
+    assert len(mesh.points) == len(points)
+
+    del points, point_markers
+    mesh.set_points(np.zeros((3, 2)))
+    assert len(mesh.points) == 3
+
+
+def test_bulk_setters():
+    import numpy as np
+    import pytest
+
+    from meshpy import triangle
+
+    points = np.array([(0, 0), (1, 0), (1, 1), (0, 1)], dtype=np.float64)
+    facets = np.array([(0, 1), (1, 2), (2, 3), (3, 0)], dtype=np.int32)
+
+    info = triangle.MeshInfo()
+    info.set_points(points, point_markers=np.arange(4))
+    info.set_facets(facets, facet_markers=[1, 2, 3, 4])
+
+    assert np.array_equal(np.asarray(info.points), points)
+    assert np.array_equal(np.asarray(info.facets), facets)
+    assert list(np.asarray(info.facet_markers)) == [1, 2, 3, 4]
+
+    with pytest.raises(ValueError):
+        info.set_points(np.zeros((3, 3)))
+    with pytest.raises(TypeError):
+        info.set_facets(facets + 0.5)
+    with pytest.raises(ValueError):
+        info.point_markers.assign([1, 2])
+
+    mesh = triangle.build(info, max_volume=0.1)
+    assert len(mesh.elements) > 0
+
+    # arrays allocated by Triangle can be replaced
+    mesh.set_points(points)
+    mesh.elements.resize(2)
+    mesh.set_facets(facets)
+    assert np.array_equal(np.asarray(mesh.points), points)
+    assert len(mesh.neighbors) == 2
+
+
+def test_concurrent_builds():
+    from concurrent.futures import ThreadPoolExecutor
+
+    import numpy as np
+
+    from meshpy import tet, triangle
+
+    def build_square(max_area):
+        info = triangle.MeshInfo()
+        info.set_points([(0, 0), (1, 0), (1, 1), (0, 1)])
+        info.set_facets([(0, 1), (1, 2), (2, 3), (3, 0)])
+        mesh = triangle.build(info, max_volume=max_area)
+        return np.array(mesh.elements)
+
+    def build_box(size):
+        info = tet.MeshInfo()
+        info.set_points([
+            (0, 0, 0), (size, 0, 0), (size, size, 0), (0, size, 0),
+            (0, 0, 1), (size, 0, 1), (size, size, 1), (0, size, 1),
+            ])
+        info.set_facets([
+            [0, 1, 2, 3], [4, 5, 6, 7], [0, 4, 5, 1],
+            [1, 5, 6, 2], [2, 6, 7, 3], [3, 7, 4, 0],
+            ])
+        mesh = tet.build(info, max_volume=0.01)
+        return np.array(mesh.elements)
+
+    areas = [1e-3, 2e-3, 3e-3, 4e-3] * 2
+    sizes = [1, 2, 3, 4] * 2
+
+    serial_tri = [build_square(a) for a in areas]
+    serial_tet = [build_box(s) for s in sizes]
+
+    with ThreadPoolExecutor(4) as pool:
+        parallel_tri = list(pool.map(build_square, areas))
+        parallel_tet = list(pool.map(build_box, sizes))
+
+    for a, b in zip(serial_tri + serial_tet, parallel_tri + parallel_tet,
+            strict=True):
+        assert np.array_equal(a, b)
+
 # }}}
 
 
@@ -120,6 +1238,57 @@ def test_tetgen():
     build(mesh_info)
 
 
+def test_tetgen_facets_csr():
+    import numpy as np
+    import pytest
+
+    from meshpy.tet import MeshInfo, build
+
+    points = np.array([
+        (0, 0, 0), (2, 0, 0), (2, 2, 0), (0, 2, 0),
+        (0, 0, 12), (2, 0, 12), (2, 2, 12), (0, 2, 12),
+        ], dtype=np.float64)
+    quads = np.array([
+        [0, 1, 2, 3],
+        [4, 5, 6, 7],
+        [0, 4, 5, 1],
+        [1, 5, 6, 2],
+        [2, 6, 7, 3],
+        [3, 7, 4, 0],
+        ])
+
+    # (M, 3) triangle soup
+    triangles = np.concatenate([quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]])
+    mesh_info = MeshInfo()
+    mesh_info.set_points(points)
+    mesh_info.set_facets(triangles, markers=np.arange(1, len(triangles) + 1))
+
+    assert len(mesh_info.facets) == len(triangles)
+    assert list(mesh_info.facets[3].polygons[0].vertices) == list(triangles[3])
+    assert len(build(mesh_info).elements) > 0
+
+    # two triangles per facet
+    triangles = np.stack(
+            [quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]], axis=1).reshape(-1, 3)
+    mesh_info = MeshInfo()
+    mesh_info.set_points(points)
+    mesh_info.set_facets_csr(
+            triangles.reshape(-1),
+            np.arange(0, triangles.size + 1, 3),
+            facet_offsets=np.arange(0, len(triangles) + 1, 2),
+            markers=np.arange(len(quads)))
+
+    assert len(mesh_info.facets) == len(quads)
+    assert [list(poly.vertices) for poly in mesh_info.facets[1].polygons] \
+            == [list(tri) for tri in triangles[2:4]]
+    assert len(build(mesh_info).elements) > 0
+
+    with pytest.raises(ValueError):
+        mesh_info.set_facets_csr([0, 1, len(points)], [0, 3])
+    with pytest.raises(ValueError):
+        mesh_info.set_facets_csr([0, 1, -1], [0, 3])
+
+
 def test_torus():
     from math import cos, pi, sin
 